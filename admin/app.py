@@ -1,19 +1,42 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, stream_with_context, jsonify
 import sqlite3
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 import hashlib
+import argparse
+import sys
+
+# Modules used by both web apps live in ../shared; event_log (which they log
+# through, with the metrics module it counts drops in) and job_queue's schema
+# come from the runners in ../cron
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../shared"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../cron"))
+
+import event_hub
+import history_archive
+import history_export
+import job_queue_client
+import prefork
+import shared_cache
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE = os.path.join(BASE_DIR, "../cronjobs.db")
+# High-churn log tables (cron_history, updateprice_logs, ...) live in their own
+# file so runner log writes never take the config database's write lock
+LOG_DATABASE = os.path.join(BASE_DIR, "../cronjobs_logs.db")
+# Bangladesh time (no DST), used to display and filter history timestamps
+BD_TZ = timezone(timedelta(hours=6))
+# Dashboard counts are cached (shared_cache.py) for at most this long; admin
+# edits invalidate them straight away, the TTL covers runner/userpanel writes
+DASHBOARD_CACHE_TTL = 30
 
 def init_db():
-    if not os.path.exists(DB_FILE):
-        conn = sqlite3.connect(DB_FILE)
+    if not os.path.exists(DATABASE):
+        conn = sqlite3.connect(DATABASE)
         conn.execute("""
             CREATE TABLE users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -62,8 +85,11 @@ def init_db():
         conn.close()
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
+    # Unqualified log table names resolve to the attached log database
+    if LOG_DATABASE != DATABASE:
+        conn.execute("ATTACH DATABASE ? AS logs", (LOG_DATABASE,))
     return conn
 
 def login_required(f):
@@ -175,6 +201,13 @@ def dashboard():
     if session.get("role") != "admin":
         return "Access Denied", 403
 
+    counts = shared_cache.get("dashboard", "counts", load_dashboard_counts, ttl=DASHBOARD_CACHE_TTL)
+
+    # Now render dashboard.html
+    return render_template("dashboard.html", **counts)
+
+
+def load_dashboard_counts():
     conn = get_db_connection()
 
     # Total Domains (unique non-empty domains)
@@ -220,16 +253,14 @@ def dashboard():
 
     conn.close()
 
-    # Now render dashboard.html
-    return render_template("dashboard.html", 
-                           total_domains=total_domains, 
-                           total_users=total_users,
-                           online_domains=online_domains,
-                           offline_domains=offline_domains,
-                           total_urls=total_urls,
-                           active_users=active_users,
-                           inactive_users=inactive_users,
-                           expired_accounts=expired_accounts)
+    return dict(total_domains=total_domains,
+                total_users=total_users,
+                online_domains=online_domains,
+                offline_domains=offline_domains,
+                total_urls=total_urls,
+                active_users=active_users,
+                inactive_users=inactive_users,
+                expired_accounts=expired_accounts)
 
 
 @app.route("/add", methods=["GET", "POST"])
@@ -256,17 +287,153 @@ def add_cron():
         )
         conn.commit()
         conn.close()
+        shared_cache.invalidate("dashboard")
         return redirect(url_for("cron_list"))
     return render_template("add_cron.html")
 
 
+# Indexes behind the filtered, keyset-paginated list pages and the user
+# search; created once per process on first use
+LIST_INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_cron_jobs_domain_id ON cron_jobs (domain COLLATE NOCASE, id)",
+    "CREATE INDEX IF NOT EXISTS idx_cron_jobs_status_id ON cron_jobs (status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_domain_id ON users (domain COLLATE NOCASE, id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_status_id ON users (status, id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_package_id ON users (active_package, id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_email_nocase ON users (email COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_users_name_nocase ON users (name COLLATE NOCASE)",
+]
+# Latest result per job; the table only exists once cron_updateprice has run
+LOG_LIST_INDEX_SQL = "CREATE INDEX IF NOT EXISTS {schema}idx_updateprice_logs_job_id ON updateprice_logs (cron_job_id, id)"
+USER_SEARCH_LIMIT = 20
+INTERVAL_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+list_indexes_ready = False
+
+def ensure_list_indexes(conn):
+    global list_indexes_ready
+    if list_indexes_ready:
+        return
+    for sql in LIST_INDEX_SQL:
+        conn.execute(sql)
+    try:
+        conn.execute(LOG_LIST_INDEX_SQL.format(schema="logs." if LOG_DATABASE != DATABASE else ""))
+    except sqlite3.OperationalError:
+        conn.commit()
+        return
+    conn.commit()
+    list_indexes_ready = True
+
+def parse_id_cursor(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def keyset_page(conn, select, conditions, params, per_page, after=None, before=None, descending=False):
+    # One page of `select` (aliased "t") in id order. `after` is the id of the
+    # last row of the previous page, `before` the first row of the next one;
+    # returns (rows, prev_cursor, next_cursor)
+    forward = before is None
+    pivot = after if forward else before
+    conditions = list(conditions)
+    params = list(params)
+    scan_desc = forward == descending
+    if pivot is not None:
+        conditions.append("t.id < ?" if scan_desc else "t.id > ?")
+        params.append(pivot)
+    where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+    rows = conn.execute(
+        f"{select}{where} ORDER BY t.id {'DESC' if scan_desc else 'ASC'} LIMIT ?", (*params, per_page + 1)
+    ).fetchall()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+    if forward:
+        return rows, (rows[0]["id"] if pivot is not None else None), (rows[-1]["id"] if more else None)
+    return rows, (rows[0]["id"] if more else None), rows[-1]["id"]
+
+def interval_seconds(value):
+    # cron_jobs.interval is seconds; packages.interval is "5 minutes" from the package forms
+    parts = str(value or "").split()
+    try:
+        count = int(parts[0])
+    except (IndexError, ValueError):
+        return None
+    unit = parts[1].lower().rstrip("s") if len(parts) > 1 else "second"
+    return count * INTERVAL_UNITS.get(unit, 1)
+
+def to_ts(value):
+    # updateprice_logs.ran_at is a UTC "YYYY-MM-DD HH:MM:SS" string
+    try:
+        return int(datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+    except (TypeError, ValueError):
+        return None
+
 @app.route("/cron-list")
 @login_required
 def cron_list():
+    per_page = 25
+    domain = request.args.get("domain", default="", type=str).strip()
+    status = request.args.get("status", default="", type=str).strip().lower()
+    if status not in ("online", "offline"):
+        status = ""
+
+    conditions = []
+    params = []
+    if domain:
+        conditions.append("t.domain = ? COLLATE NOCASE")
+        params.append(domain)
+    if status:
+        conditions.append("t.status = ?")
+        params.append(status)
+
     conn = get_db_connection()
-    jobs = conn.execute("SELECT * FROM cron_jobs").fetchall()
+    ensure_list_indexes(conn)
+    rows, prev_cursor, next_cursor = keyset_page(
+        conn, "SELECT * FROM cron_jobs t", conditions, params, per_page,
+        after=parse_id_cursor(request.args.get("after")), before=parse_id_cursor(request.args.get("before"))
+    )
+    where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+    total = conn.execute(f"SELECT COUNT(*) FROM cron_jobs t{where}", params).fetchone()[0]
+
+    # Last result per row is one probe of the (cron_job_id, id) index each;
+    # next_run only for jobs the runner picks up (status enable or online)
+    jobs = []
+    for row in rows:
+        job = dict(row)
+        last = None
+        try:
+            last = conn.execute("""
+                SELECT status_code, response_time, result, ran_at FROM updateprice_logs
+                WHERE cron_job_id = ? ORDER BY id DESC LIMIT 1
+            """, (job["id"],)).fetchone()
+        except sqlite3.OperationalError:
+            pass
+        last_run = job.get("last_run") or (to_ts(last["ran_at"]) if last else None)
+        interval = interval_seconds(job["interval"])
+        job["last_run"] = last_run
+        job["next_run"] = (last_run or 0) + interval if interval and job["status"] in ("enable", "online") else None
+        job["last_result"] = dict(last) if last else None
+        jobs.append(job)
     conn.close()
-    return render_template("job_list.html", jobs=jobs)
+
+    queued = job_queue_client.pending(LOG_DATABASE, "cron_job")
+    return render_template(
+        "job_list.html", jobs=jobs, queued=queued, total=total, now=int(datetime.now().timestamp()),
+        domain=domain, status=status, prev_cursor=prev_cursor, next_cursor=next_cursor
+    )
+
+@app.route("/run-now/<int:job_id>", methods=["POST"])
+@login_required
+def run_now(job_id):
+    # Hand the run to the runner's queue worker and return straight away;
+    # the result lands in manual_history / updateprice_logs
+    job_queue_client.enqueue(LOG_DATABASE, "cron_job", job_id, {"manual": True}, max_attempts=1)
+    flash(f"Job #{job_id} queued to run now.")
+    return redirect(url_for("cron_list"))
 
 @app.route("/delete/<int:job_id>")
 @login_required
@@ -275,6 +442,7 @@ def delete_cron(job_id):
     conn.execute("DELETE FROM cron_jobs WHERE id = ?", (job_id,))
     conn.commit()
     conn.close()
+    shared_cache.invalidate("dashboard")
     return redirect(url_for("cron_list"))
 
 @app.route("/edit/<int:job_id>", methods=["GET", "POST"])
@@ -305,64 +473,214 @@ def toggle_status(job_id):
     conn.execute("UPDATE cron_jobs SET status = ? WHERE id = ?", (new_status, job_id))
     conn.commit()
     conn.close()
+    event_hub.send({"type": "status", "id": job_id, "status": new_status})
     return redirect(url_for("cron_list"))
 
+@app.route("/events")
+@login_required
+def events():
+    # Server-Sent Events feed of runner job events for the live pages; every
+    # open page shares the hub's single feed, see event_hub.py
+    event_hub.hub.ensure_started()
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    return Response(stream_with_context(event_hub.hub.stream(last_id)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def to_epoch(value, end_of_day=False):
+    # Accepts "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS" in Bangladesh time
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        if len(value) <= 10:
+            parsed = datetime.strptime(value, "%Y-%m-%d")
+            if end_of_day:
+                parsed += timedelta(days=1, seconds=-1)
+        else:
+            parsed = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+    return int(parsed.replace(tzinfo=BD_TZ).timestamp())
+
+def parse_history_filters(conn, args):
+    filters = {
+        "user": args.get('q', default="", type=str).strip().lower() or args.get('job', default="", type=str).strip().lower(),
+        "email": args.get('email', default="", type=str).strip(),
+        "kind": args.get('kind', default="", type=str).strip().lower(),
+        "status": args.get('status', default="", type=str).strip().lower(),
+        "start": to_epoch(args.get('from', default="", type=str)),
+        "end": to_epoch(args.get('to', default="", type=str), end_of_day=True),
+        "user_ids": None,
+        "emails": None,
+    }
+    if filters["kind"] not in ("order", "file", "price", "dhru"):
+        filters["kind"] = ""
+    # Resolved once so archived rows can be matched without the users table
+    if filters["user"]:
+        matched = conn.execute(
+            "SELECT id, email FROM users WHERE LOWER(email) = ? OR LOWER(domain) = ?",
+            (filters["user"], filters["user"])
+        ).fetchall()
+        filters["user_ids"] = {row["id"] for row in matched}
+        filters["emails"] = {row["email"] for row in matched}
+    if filters["email"]:
+        filters["emails"] = (filters["emails"] & {filters["email"]}) if filters["emails"] is not None else {filters["email"]}
+    return filters
+
+def build_history_filters(filters):
+    # Every filter is an equality or range on an indexed column;
+    # free-text LIKE matching over formatted strings is gone.
+    conditions = []
+    params = []
+
+    if filters["user_ids"] is not None:
+        conditions.append("h.user_id IN (%s)" % ",".join("?" * len(filters["user_ids"])) if filters["user_ids"] else "0")
+        params.extend(filters["user_ids"])
+    if filters["email"]:
+        conditions.append("h.email = ?")
+        params.append(filters["email"])
+    if filters["kind"]:
+        conditions.append("h.kind = ?")
+        params.append(filters["kind"])
+
+    status = filters["status"]
+    if status == "ok":
+        conditions.append("h.status_code BETWEEN 200 AND 299")
+    elif status == "error":
+        conditions.append("(h.status_code IS NULL OR h.status_code NOT BETWEEN 200 AND 299)")
+    elif status.isdigit():
+        conditions.append("h.status_code = ?")
+        params.append(int(status))
+
+    if filters["start"] is not None:
+        conditions.append("h.ts >= ?")
+        params.append(filters["start"])
+    if filters["end"] is not None:
+        conditions.append("h.ts <= ?")
+        params.append(filters["end"])
+
+    where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+    return where, params
+
+def archived_history_rows(filters, newest_first=True):
+    # Same filters as build_history_filters, applied to archive segments
+    status = filters["status"]
+    for row in history_archive.iter_rows("cron_history", filters["start"], filters["end"],
+                                         keys=filters["emails"], newest_first=newest_first):
+        code = row.get("status_code")
+        if filters["user_ids"] is not None and row.get("user_id") not in filters["user_ids"]:
+            continue
+        if filters["email"] and row.get("email") != filters["email"]:
+            continue
+        if filters["kind"] and row.get("kind") != filters["kind"]:
+            continue
+        if status == "ok" and not (code and 200 <= code <= 299):
+            continue
+        if status == "error" and code and 200 <= code <= 299:
+            continue
+        if status.isdigit() and code != int(status):
+            continue
+        if filters["start"] is not None and row["ts"] < filters["start"]:
+            continue
+        if filters["end"] is not None and row["ts"] > filters["end"]:
+            continue
+        yield row
+
+@app.template_filter("bd_time")
+def bd_time(ts):
+    if not ts:
+        return "-"
+    return datetime.fromtimestamp(ts, BD_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
 @app.route('/history')
 @login_required
 def history():
     page = request.args.get('page', default=1, type=int)
-    query = request.args.get('q', default="", type=str).strip().lower()
     per_page = 10
     offset = (page - 1) * per_page
 
     conn = get_db_connection()
-
-    # First, check if email field exists → If your cron_history table has 'email' column
-    # You can verify: SELECT email FROM cron_history LIMIT 1;
-
-    if query:
-        like_query = f"%{query}%"
-        results = conn.execute("""
-            SELECT id, job_id, email, result, timestamp
-            FROM cron_history
-            WHERE CAST(job_id AS TEXT) LIKE ?
-               OR LOWER(email) LIKE ?
-               OR LOWER(result) LIKE ?
-               OR LOWER(timestamp) LIKE ?
-            ORDER BY timestamp DESC
-            LIMIT ? OFFSET ?
-        """, (like_query, like_query, like_query, like_query, per_page, offset)).fetchall()
-
-        total = conn.execute("""
-            SELECT COUNT(*)
-            FROM cron_history
-            WHERE CAST(job_id AS TEXT) LIKE ?
-               OR LOWER(email) LIKE ?
-               OR LOWER(result) LIKE ?
-               OR LOWER(timestamp) LIKE ?
-        """, (like_query, like_query, like_query, like_query)).fetchone()[0]
-    else:
-        results = conn.execute("""
-            SELECT id, job_id, email, result, timestamp
-            FROM cron_history
-            ORDER BY timestamp DESC
-            LIMIT ? OFFSET ?
-        """, (per_page, offset)).fetchall()
-
-        total = conn.execute("SELECT COUNT(*) FROM cron_history").fetchone()[0]
-
+    filters = parse_history_filters(conn, request.args)
+    where, params = build_history_filters(filters)
+    results = conn.execute(f"""
+        SELECT h.id, h.user_id, h.email, u.domain, h.kind, h.method,
+               h.status_code, h.latency_ms, h.error_class, h.ts
+        FROM cron_history h
+        LEFT JOIN users u ON u.id = h.user_id
+        {where}
+        ORDER BY h.ts DESC, h.id DESC
+        LIMIT ? OFFSET ?
+    """, (*params, per_page + 1, offset)).fetchall()
+    total = conn.execute(f"SELECT COUNT(*) FROM cron_history h{where}", params).fetchone()[0]
+
+    # Once the hot table runs out, keep paging into the archive segments
+    if len(results) <= per_page:
+        results = list(results)
+        skip = max(offset - total, 0)
+        for row in archived_history_rows(filters):
+            if skip:
+                skip -= 1
+                continue
+            results.append(row)
+            if len(results) > per_page:
+                break
+        user_ids = {row["user_id"] for row in results if isinstance(row, dict) and row.get("user_id")}
+        if user_ids:
+            domains = dict(conn.execute(
+                "SELECT id, domain FROM users WHERE id IN (%s)" % ",".join("?" * len(user_ids)), list(user_ids)
+            ).fetchall())
+            for row in results:
+                if isinstance(row, dict):
+                    row["domain"] = domains.get(row.get("user_id"))
     conn.close()
 
     return render_template(
         'history.html',
-        history=results,
+        history=results[:per_page],
+        has_more=len(results) > per_page,
         page=page,
         total=total,
-        query=query,
+        query=request.args.get('q', default="", type=str).strip(),
+        kind=filters["kind"],
+        status=filters["status"],
+        date_from=request.args.get('from', default="", type=str),
+        date_to=request.args.get('to', default="", type=str),
         per_page=per_page
     )
 
+@app.route('/history/export')
+@login_required
+def export_history():
+    fmt = request.args.get('format', default="csv", type=str).lower()
+    if fmt not in ("csv", "ndjson"):
+        return "Unsupported export format", 400
+    use_gzip = request.args.get('gzip', default="", type=str) in ("1", "true", "yes")
 
+    conn = get_db_connection()
+    filters = parse_history_filters(conn, request.args)
+    conn.close()
+    where, params = build_history_filters(filters)
+
+    sql = f"""
+        SELECT h.id, h.user_id, h.email, u.domain, h.kind, h.method,
+               h.status_code, h.latency_ms, h.error_class, h.ts,
+               datetime(h.ts, 'unixepoch', '+6 hours') AS time_bd
+        FROM cron_history h
+        LEFT JOIN users u ON u.id = h.user_id
+        {where}
+        ORDER BY h.ts DESC, h.id DESC
+    """
+
+    # Archived rows follow the hot ones, newest first like them (one day
+    # segment is buffered at a time)
+    def archived(conn):
+        domains = dict(conn.execute("SELECT id, domain FROM users").fetchall())
+        for row in archived_history_rows(filters, newest_first=True):
+            row["domain"] = domains.get(row.get("user_id"))
+            row["time_bd"] = bd_time(row["ts"])
+            yield row
+
+    return history_export.response(get_db_connection, sql, params, fmt, use_gzip, "cron_history", extra_rows=archived)
 
 
 @app.route("/settings")
@@ -373,20 +691,84 @@ def settings():
 @app.route("/manage-clients")
 @login_required
 def manage_clients():
-    page = int(request.args.get("page", 1))
     per_page = 10
-    offset = (page - 1) * per_page
+    domain = request.args.get("domain", default="", type=str).strip()
+    status = request.args.get("status", default="", type=str).strip()
+    package_id = request.args.get("package", default=None, type=int)
+    if status not in ("Enable", "Disable"):
+        status = ""
+
+    packages = shared_cache.get("packages", "all", load_packages)
+    conditions = []
+    params = []
+    if domain:
+        conditions.append("t.domain = ? COLLATE NOCASE")
+        params.append(domain)
+    if status:
+        conditions.append("t.status = ?")
+        params.append(status)
+    # active_package holds the package id from /active-package, or a name on older rows
+    selected = next((p for p in packages if p["id"] == package_id), None)
+    if selected:
+        conditions.append("t.active_package IN (?, ?)")
+        params.extend([str(selected["id"]), selected["name"]])
 
     conn = get_db_connection()
-    total = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
-    clients = conn.execute("""
-        SELECT * FROM users
-        ORDER BY id DESC
-        LIMIT ? OFFSET ?
-    """, (per_page, offset)).fetchall()
+    ensure_list_indexes(conn)
+    rows, prev_cursor, next_cursor = keyset_page(
+        conn, "SELECT * FROM users t", conditions, params, per_page,
+        after=parse_id_cursor(request.args.get("after")), before=parse_id_cursor(request.args.get("before")),
+        descending=True
+    )
+    where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+    total = conn.execute(f"SELECT COUNT(*) FROM users t{where}", params).fetchone()[0]
+
+    by_key = {str(p["id"]): p for p in packages}
+    by_key.update({p["name"]: p for p in packages})
+    clients = []
+    for row in rows:
+        client = dict(row)
+        # Newest history row for the client via the (user_id, ts) index
+        last = conn.execute("""
+            SELECT kind, status_code, error_class, ts FROM cron_history
+            WHERE user_id = ? ORDER BY ts DESC, id DESC LIMIT 1
+        """, (client["id"],)).fetchone()
+        pkg = by_key.get(str(client.get("active_package")))
+        interval = interval_seconds(pkg["interval"]) if pkg else None
+        client["package_name"] = pkg["name"] if pkg else client.get("active_package")
+        client["last_result"] = dict(last) if last else None
+        client["last_run"] = last["ts"] if last else None
+        client["next_run"] = (last["ts"] if last else 0) + interval if interval and client.get("status") == "Enable" else None
+        clients.append(client)
     conn.close()
 
-    return render_template("manage_clients.html", clients=clients, page=page, per_page=per_page, total=total)
+    return render_template(
+        "manage_clients.html", clients=clients, total=total, packages=packages, now=int(datetime.now().timestamp()),
+        domain=domain, status=status, package_id=selected["id"] if selected else None,
+        prev_cursor=prev_cursor, next_cursor=next_cursor
+    )
+
+@app.route("/users/search")
+@login_required
+def search_users():
+    # Typeahead for the user pickers: prefix match on email, name or domain
+    # (each a NOCASE index range), or an exact id
+    q = request.args.get("q", default="", type=str).strip()
+    if not q:
+        return jsonify([])
+    pattern = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    conn = get_db_connection()
+    ensure_list_indexes(conn)
+    rows = conn.execute("""
+        SELECT * FROM (SELECT id, name, email, domain FROM users WHERE id = ?)
+        UNION SELECT * FROM (SELECT id, name, email, domain FROM users WHERE email LIKE ? ESCAPE '\\' LIMIT ?)
+        UNION SELECT * FROM (SELECT id, name, email, domain FROM users WHERE name LIKE ? ESCAPE '\\' LIMIT ?)
+        UNION SELECT * FROM (SELECT id, name, email, domain FROM users WHERE domain LIKE ? ESCAPE '\\' LIMIT ?)
+        ORDER BY email LIMIT ?
+    """, (int(q) if q.isdigit() else None, pattern, USER_SEARCH_LIMIT, pattern, USER_SEARCH_LIMIT,
+          pattern, USER_SEARCH_LIMIT, USER_SEARCH_LIMIT)).fetchall()
+    conn.close()
+    return jsonify([dict(row) for row in rows])
 
 
 @app.route('/edit-client/<int:client_id>', methods=['GET', 'POST'])
@@ -414,6 +796,7 @@ def edit_client(client_id):
         
         conn.commit()
         conn.close()
+        shared_cache.invalidate("users", "dashboard")
         return redirect(url_for('manage_clients'))
 
     # GET request → show the form
@@ -434,35 +817,43 @@ def delete_user(user_id):
     conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
     conn.commit()
     conn.close()
+    shared_cache.invalidate("users", "dashboard")
     return redirect(url_for("manage_clients"))
 
 
 @app.route("/packages")
 @login_required
 def package():
+    packages = shared_cache.get("packages", "all", load_packages)
+    return render_template("package.html", packages=packages)
+
+def load_packages():
     conn = get_db_connection()
-    packages = conn.execute("SELECT * FROM packages").fetchall()
+    packages = [dict(row) for row in conn.execute("SELECT * FROM packages")]
     conn.close()
-    return render_template("package.html", packages=packages)
+    return packages
 
 @app.route("/active-package", methods=["GET", "POST"])
 @login_required
 def active_package():
     conn = get_db_connection()
-    users = conn.execute("SELECT id, name, email FROM users").fetchall()
+    # The user is picked through the /users/search typeahead, not a full list
     packages = conn.execute("SELECT * FROM packages WHERE status = 'enabled'").fetchall()
     message = ""
-    selected_user_id = selected_package_id = None
+    selected_user = selected_package_id = None
 
     if request.method == "POST":
-        user_id = int(request.form["user_id"])
+        user_id = request.form.get("user_id", type=int)
         package_id = int(request.form["package_id"])
-        selected_user_id = user_id
         selected_package_id = package_id
+        if user_id:
+            selected_user = conn.execute("SELECT id, name, email FROM users WHERE id = ?", (user_id,)).fetchone()
 
         # Get selected package validity
         pkg = conn.execute("SELECT validity FROM packages WHERE id = ?", (package_id,)).fetchone()
-        if pkg:
+        if not selected_user:
+            message = "Pick a user from the search results."
+        elif pkg:
             # Calculate expiry date
             expire_date = (datetime.now() + timedelta(days=pkg["validity"])).strftime("%Y-%m-%d")
 
@@ -473,15 +864,15 @@ def active_package():
                 WHERE id = ?
             """, (package_id, expire_date, user_id))
             conn.commit()
+            shared_cache.invalidate("users", "dashboard")
             message = "Package assigned successfully."
 
     conn.close()
     return render_template(
         "active_package.html",
-        users=users,
         packages=packages,
         message=message,
-        selected_user_id=selected_user_id,
+        selected_user=selected_user,
         selected_package_id=selected_package_id
     )
 
@@ -502,6 +893,7 @@ def upgrade_users_schema():
         pass
     conn.commit()
     conn.close()
+    shared_cache.invalidate("users", "dashboard")
     return "Users table upgraded!"
 
 
@@ -522,6 +914,7 @@ def add_package():
         )
         conn.commit()
         conn.close()
+        shared_cache.invalidate("packages")
         return redirect(url_for("package"))
     return render_template("add_package.html")
 
@@ -545,6 +938,7 @@ def edit_package(package_id):
         )
         conn.commit()
         conn.close()
+        shared_cache.invalidate("packages")
         return redirect(url_for("package"))
 
     conn.close()
@@ -557,6 +951,7 @@ def delete_package(package_id):
     conn.execute("DELETE FROM packages WHERE id = ?", (package_id,))
     conn.commit()
     conn.close()
+    shared_cache.invalidate("packages")
     return redirect(url_for("package"))
 
 @app.route("/toggle-package/<int:package_id>")
@@ -568,23 +963,39 @@ def toggle_package(package_id):
     conn.execute("UPDATE packages SET status = ? WHERE id = ?", (new_status, package_id))
     conn.commit()
     conn.close()
+    shared_cache.invalidate("packages")
     return redirect(url_for("package"))
 
 @app.route("/manage-package")
 @login_required
 def manage_package():
-    conn = get_db_connection()
-    packages = conn.execute("SELECT * FROM packages").fetchall()
-    conn.close()
+    packages = shared_cache.get("packages", "all", load_packages)
     return render_template("manage_package.html", packages=packages)
 
 @app.route("/updateprice_logs")
 @login_required
 def updateprice_logs():
+    # Optional UTC date range; ranges older than the hot table read the archive too
+    date_from = request.args.get("from", default="", type=str).strip()
+    date_to = request.args.get("to", default="", type=str).strip()
+    start = f"{date_from} 00:00:00" if date_from else None
+    end = f"{date_to} 23:59:59" if date_to else None
+
     conn = get_db_connection()
-    logs = conn.execute("SELECT * FROM updateprice_logs ORDER BY id DESC").fetchall()
+    if start or end:
+        logs = conn.execute("""
+            SELECT * FROM updateprice_logs
+            WHERE ran_at >= ? AND ran_at <= ?
+            ORDER BY id DESC
+        """, (start or "", end or "9999")).fetchall()
+        logs = list(logs) + [
+            row for row in history_archive.iter_rows("updateprice_logs", start, end)
+            if (not start or row["ran_at"] >= start) and (not end or row["ran_at"] <= end)
+        ]
+    else:
+        logs = conn.execute("SELECT * FROM updateprice_logs ORDER BY id DESC").fetchall()
     conn.close()
-    return render_template("updateprice_logs.html", logs=logs)
+    return render_template("updateprice_logs.html", logs=logs, date_from=date_from, date_to=date_to)
     
 @app.route("/clear_updateprice_logs", methods=["POST"])
 @login_required
@@ -598,5 +1009,14 @@ def clear_updateprice_logs():
 
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5001)
+    parser = argparse.ArgumentParser(description="Admin panel")
+    parser.add_argument("--workers", type=int, default=0, help="serve with N worker processes (production)")
+    parser.add_argument("--port", type=int, default=5001)
+    args = parser.parse_args()
+    if args.workers:
+        # Runner events arrive on one port; the parent copies them to each worker
+        event_hub.relay(args.workers)
+        prefork.serve(app, "0.0.0.0", args.port, args.workers, on_worker_start=event_hub.use_worker_port)
+    else:
+        app.run(host='0.0.0.0', port=args.port)
 
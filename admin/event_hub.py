@@ -0,0 +1,171 @@
+import itertools
+import json
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+import event_log
+
+# In-memory fan-out for the live dashboard. One listener thread receives the
+# runners' job events (cron/job_events.py, JSON datagrams on EVENTS_ADDR) and
+# copies each one into every subscriber's queue; /events streams a queue as
+# Server-Sent Events. However many dashboards are open, the runners send one
+# feed and nothing here touches the database.
+#
+# A subscriber that stops reading loses its oldest events rather than
+# holding up the others. The last REPLAY events are kept so a reconnecting
+# browser (Last-Event-ID) picks up what it missed.
+#
+# With several worker processes (prefork.py) only one socket can own
+# EVENTS_ADDR, so the parent runs relay(), copying each datagram to every
+# worker's own port (EVENTS_ADDR port + 1 + worker index).
+
+EVENTS_ADDR = ("127.0.0.1", 9110)
+SUBSCRIBER_QUEUE = 500
+REPLAY = 200
+# Running totals over this many seconds are sent with each event
+STATS_WINDOW = 60
+
+
+class EventHub:
+    def __init__(self, addr=EVENTS_ADDR):
+        self.addr = addr
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.recent = deque(maxlen=REPLAY)
+        self.finished = deque()  # (ts, ok, lag) of finished runs within STATS_WINDOW
+        self.running = 0
+        self.ids = itertools.count(1)
+        self.started = False
+
+    def ensure_started(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(self.addr)
+        except OSError as e:
+            event_log.warning("live_events_unavailable", "⚠️ Live events listener not started on {host}:{port}: {error}",
+                              host=self.addr[0], port=self.addr[1], error=str(e))
+            return
+        threading.Thread(target=self._listen, args=(sock,), daemon=True).start()
+
+    def _listen(self, sock):
+        while True:
+            data = sock.recv(65536)
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                self.publish(event)
+
+    def publish(self, event):
+        now = time.time()
+        with self.lock:
+            if event.get("type") == "started":
+                self.running += 1
+            elif event.get("type") == "finished":
+                self.running = max(self.running - 1, 0)
+                self.finished.append((now, bool(event.get("ok")), event.get("lag")))
+            while self.finished and now - self.finished[0][0] > STATS_WINDOW:
+                self.finished.popleft()
+            event["stats"] = self._stats()
+            item = (next(self.ids), event)
+            self.recent.append(item)
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _stats(self):
+        lags = [lag for _, _, lag in self.finished if lag is not None]
+        return {
+            "running": self.running,
+            "finished_per_min": len(self.finished) * 60 // STATS_WINDOW,
+            "failed_per_min": sum(1 for _, ok, _ in self.finished if not ok) * 60 // STATS_WINDOW,
+            "avg_lag": round(sum(lags) / len(lags), 2) if lags else None,
+        }
+
+    def subscribe(self, last_id=None):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        with self.lock:
+            if last_id is not None:
+                for item in self.recent:
+                    if item[0] > last_id:
+                        q.put_nowait(item)
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def stream(self, last_id=None, heartbeat=15):
+        # SSE text for one client; a comment line every `heartbeat` seconds
+        # keeps proxies from closing an idle connection
+        q = self.subscribe(last_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event_id, event = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event_id}\nevent: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(q)
+
+
+def send(event):
+    # Publish from the web app itself (e.g. a status toggle) through the same
+    # path as the runners, so every worker process gets it
+    event.setdefault("ts", round(time.time(), 3))
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(json.dumps(event).encode(), EVENTS_ADDR)
+    except OSError as e:
+        event_log.warning("live_event_send_failed", "⚠️ Could not send live event: {error}", error=str(e))
+
+
+def worker_addr(index):
+    return EVENTS_ADDR[0], EVENTS_ADDR[1] + 1 + index
+
+
+def use_worker_port(index):
+    # prefork.py on_worker_start hook
+    hub.addr = worker_addr(index)
+
+
+def relay(workers):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(EVENTS_ADDR)
+    targets = [worker_addr(index) for index in range(workers)]
+
+    def loop():
+        out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        out.setblocking(False)
+        while True:
+            data = sock.recv(65536)
+            for target in targets:
+                try:
+                    out.sendto(data, target)
+                except OSError:
+                    pass
+
+    threading.Thread(target=loop, daemon=True).start()
+
+
+hub = EventHub()
@@ -0,0 +1,59 @@
+import gzip
+import json
+import os
+
+import event_log
+
+# Read side of the cold log archive written by cron/history_archiver.py.
+# Segments are one gzip'd NDJSON file per table per day with a small
+# .idx.json sidecar ({"min", "max", "rows", "keys"}) used to skip segments
+# that cannot match a query.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(BASE_DIR, "../archive")
+
+
+def list_segments(table, archive_dir=None):
+    table_dir = os.path.join(archive_dir or ARCHIVE_DIR, table)
+    if not os.path.isdir(table_dir):
+        return []
+    days = sorted(
+        (name[:-len(".ndjson.gz")] for name in os.listdir(table_dir) if name.endswith(".ndjson.gz")),
+        reverse=True
+    )
+    segments = []
+    for day in days:
+        try:
+            with open(os.path.join(table_dir, f"{day}.idx.json")) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        segments.append((day, os.path.join(table_dir, f"{day}.ndjson.gz"), index))
+    return segments
+
+
+def iter_rows(table, start=None, end=None, keys=None, newest_first=True, archive_dir=None):
+    # Yields archived rows (dicts) from segments that may overlap [start, end]
+    # and contain one of `keys`, newest day first. Inside a segment rows come
+    # in write order, or reversed when newest_first is set (buffers one day).
+    # Callers still apply their own row filters.
+    for day, path, index in list_segments(table, archive_dir):
+        if index:
+            if start is not None and index["max"] is not None and index["max"] < start:
+                continue
+            if end is not None and index["min"] is not None and index["min"] > end:
+                continue
+            if keys is not None and not set(keys) & set(index.get("keys", [])):
+                continue
+        try:
+            with gzip.open(path, "rt") as f:
+                if newest_first:
+                    rows = [json.loads(line) for line in f if line.strip()]
+                    yield from reversed(rows)
+                else:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+        except (OSError, EOFError) as e:
+            event_log.warning("archive_segment_unreadable", "⚠️ Skipping unreadable archive segment {path}: {error}",
+                              path=path, error=str(e))
@@ -0,0 +1,41 @@
+import json
+import sqlite3
+import time
+
+from job_queue import QUEUE_INDEX_SQL, QUEUE_TABLE_SQL
+
+# Enqueue side of the job_queue table worked by cron/job_queue.py (imported
+# from ../cron, which admin/app.py puts on sys.path), so both sides create
+# the table from the same schema.
+
+
+def enqueue(db_path, kind, target_id, payload=None, max_attempts=3):
+    now = time.time()
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        conn.execute(QUEUE_TABLE_SQL)
+        conn.execute(QUEUE_INDEX_SQL)
+        item_id = conn.execute("""
+            INSERT INTO job_queue (kind, target_id, payload, max_attempts, run_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (kind, target_id, json.dumps(payload or {}), max_attempts, now, now)).lastrowid
+        conn.commit()
+    finally:
+        conn.close()
+    return item_id
+
+
+def pending(db_path, kind):
+    # {target_id: 'queued' | 'running'} for items not finished yet
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        rows = conn.execute(
+            "SELECT target_id, status FROM job_queue WHERE kind = ? AND status IN ('queued', 'running')",
+            (kind,)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # Table not created yet: nothing was ever queued
+        return {}
+    finally:
+        conn.close()
+    return {target_id: status for target_id, status in rows}
@@ -0,0 +1,135 @@
+import sqlite3
+import os
+import re
+import sys
+
+# parse_legacy_result() / parse_legacy_timestamp() come from the runner
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../cron"))
+
+import cron_runner
+
+# Moves the high-churn log tables out of cronjobs.db into cronjobs_logs.db.
+# Both web apps attach the log file as "logs" and the runners write to it
+# directly, so log inserts and config edits stop sharing one write lock.
+#
+# Usage: python migrate_logs_db.py [config_db] [log_db]
+# Safe to re-run: missing tables are ignored. A table is only dropped from
+# the config database once every one of its rows made it into the log
+# database; otherwise that table's move is rolled back and reported.
+#
+# If the runner started first it has already created the typed cron_history
+# (kind, method, ts, ...) in the log database. Old-layout rows (free-text
+# result / timestamp) are then converted the way cron_runner converts them
+# in place, keeping their id unless the runner has already used it.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE = os.path.join(BASE_DIR, "../cronjobs.db")
+LOG_DATABASE = os.path.join(BASE_DIR, "../cronjobs_logs.db")
+
+LOG_TABLES = [
+    "cron_history",
+    "cron_history_counts",
+    "cron_url_stats",
+    "cron_url_latency",
+    "updateprice_logs",
+]
+
+
+def copy_legacy_history(conn):
+    # Old cron_history rows (email, result, timestamp) into the typed layout
+    user_ids = {email: user_id for user_id, email in conn.execute("SELECT id, email FROM main.users")}
+    taken = {row_id for row_id, in conn.execute("SELECT id FROM logs.cron_history")}
+    rows = []
+    for row_id, email, result, timestamp in conn.execute(
+        "SELECT id, email, result, timestamp FROM main.cron_history ORDER BY id"
+    ).fetchall():
+        kind, method, status_code, error_class = cron_runner.parse_legacy_result(result)
+        rows.append((row_id, user_ids.get(email), email, kind, method, status_code, error_class,
+                     cron_runner.parse_legacy_timestamp(timestamp)))
+    # Rows whose id the runner already used go last, with fresh ids
+    rows = [row for row in rows if row[0] not in taken] + [(None,) + row[1:] for row in rows if row[0] in taken]
+    copied = 0
+    for row in rows:
+        copied += conn.execute("""
+            INSERT INTO logs.cron_history (id, user_id, email, kind, method, status_code, error_class, ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, row).rowcount
+    # The runner's per-user counters only cover the rows it wrote itself
+    if conn.execute("SELECT 1 FROM logs.sqlite_master WHERE type = 'table' AND name = 'cron_history_counts'").fetchone():
+        conn.execute("""
+            INSERT INTO logs.cron_history_counts (email, total)
+            SELECT email, COUNT(*) FROM main.cron_history WHERE email IS NOT NULL GROUP BY email
+            ON CONFLICT(email) DO UPDATE SET total = total + excluded.total
+        """)
+    return copied
+
+
+def migrate(config_path=DATABASE, log_path=LOG_DATABASE):
+    conn = sqlite3.connect(config_path, timeout=30, isolation_level=None)
+    conn.execute("ATTACH DATABASE ? AS logs", (log_path,))
+
+    # WAL lets the web apps keep reading while the runners write
+    conn.execute("PRAGMA main.journal_mode = WAL")
+    conn.execute("PRAGMA logs.journal_mode = WAL")
+
+    for table in LOG_TABLES:
+        row = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if not row:
+            print(f"- {table}: not in config database, skipping")
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exists = conn.execute(
+                "SELECT name FROM logs.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            if not exists:
+                create_sql = re.sub(r"^CREATE TABLE\s+\"?%s\"?" % table, f"CREATE TABLE logs.{table}", row[0], count=1)
+                conn.execute(create_sql)
+
+            main_cols = [col[1] for col in conn.execute(f"PRAGMA main.table_info({table})")]
+            log_cols = [col[1] for col in conn.execute(f"PRAGMA logs.table_info({table})")]
+            source = conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0]
+            legacy = table == "cron_history" and "result" in main_cols and "kind" in log_cols
+            if legacy:
+                copied = copy_legacy_history(conn)
+            else:
+                # Copy only the columns both sides have, in case the runner
+                # already created a newer layout in the log database
+                cols = ", ".join(col for col in main_cols if col in log_cols)
+                copied = conn.execute(
+                    f"INSERT OR IGNORE INTO logs.{table} ({cols}) SELECT {cols} FROM main.{table}"
+                ).rowcount
+            if copied != source:
+                conn.execute("ROLLBACK")
+                print(f"⚠️ {table}: only {copied} of {source} rows fit the log database layout, left in place")
+                continue
+
+            # Old-layout indexes name columns the typed table does not have;
+            # the runner creates its own (ensure_history_schema)
+            index_rows = [] if legacy else conn.execute(
+                "SELECT sql FROM main.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+            ).fetchall()
+            for (index_sql,) in index_rows:
+                index_sql = re.sub(r"^CREATE (UNIQUE )?INDEX\s+(IF NOT EXISTS\s+)?", r"CREATE \1INDEX IF NOT EXISTS logs.", index_sql, count=1)
+                conn.execute(index_sql)
+
+            conn.execute(f"DROP TABLE main.{table}")
+            conn.execute("COMMIT")
+            print(f"✅ {table}: moved {copied} rows")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    conn.execute("DETACH DATABASE logs")
+    conn.execute("VACUUM")
+    conn.close()
+
+
+if __name__ == "__main__":
+    config_path = sys.argv[1] if len(sys.argv) > 1 else DATABASE
+    log_path = sys.argv[2] if len(sys.argv) > 2 else LOG_DATABASE
+    migrate(config_path, log_path)
+    print(f"Log tables now live in '{log_path}'.")
@@ -0,0 +1,82 @@
+import importlib.util
+import io
+import os
+import sys
+import threading
+import time
+
+# Shared helpers for the benchmark scripts in this directory.
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(ROOT, "cron"))
+sys.path.insert(0, os.path.join(ROOT, "admin"))
+
+
+def load_app(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Flask finds templates through sys.modules[import_name]
+    sys.modules[name] = module
+    sys.path.insert(0, os.path.dirname(path))
+    spec.loader.exec_module(module)
+    module.app.config["TESTING"] = True
+    return module
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+class LineCounter(io.TextIOBase):
+    # Counts runner warnings printed from any thread while the load runs
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locked = 0
+        self.failed = 0
+        self.lines = 0
+
+    def write(self, text):
+        with self.lock:
+            self.lines += text.count("\n")
+            if "DB locked" in text:
+                self.locked += 1
+            if "failed" in text or "Error logging" in text:
+                self.failed += 1
+        return len(text)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def timed(self, name, func):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            with self.lock:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.samples.setdefault(name, []).append(elapsed)
+
+    def summary(self, duration):
+        result = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples.get(name, []))
+            count = len(values)
+            result[name] = {
+                "ops": count,
+                "ops_per_sec": round(count / duration, 1),
+                "errors": self.errors.get(name, 0),
+                "p50_ms": round(percentile(values, 50), 2) if count else None,
+                "p95_ms": round(percentile(values, 95), 2) if count else None,
+                "max_ms": round(values[-1], 2) if count else None,
+            }
+        return result
@@ -0,0 +1,167 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Write-lock contention benchmark: runner log writes vs. admin/customer
+# config writes, with the log tables in cronjobs.db ("single") and in a
+# separate attached cronjobs_logs.db ("split").
+#
+# Usage: python benchmarks/db_contention.py [--duration 10] [--mode both]
+
+from common import ROOT, LineCounter, Recorder, load_app
+import cron_runner
+import cron_updateprice
+import event_log
+import migrate_logs_db
+
+
+admin_app = load_app("admin_app", os.path.join(ROOT, "admin", "app.py"))
+user_app = load_app("user_app", os.path.join(ROOT, "userpanel", "app.py"))
+
+
+def prepare(mode, workdir):
+    config_db = os.path.join(workdir, f"{mode}_cronjobs.db")
+    log_db = os.path.join(workdir, f"{mode}_cronjobs_logs.db") if mode == "split" else config_db
+    shutil.copy(os.path.join(ROOT, "cronjobs.db"), config_db)
+
+    conn = sqlite3.connect(config_db)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+    if mode == "split":
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrate_logs_db.migrate(config_db, log_db)
+
+    for module in (cron_runner, cron_updateprice, admin_app, user_app):
+        module.DATABASE = config_db
+        module.LOG_DATABASE = log_db
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cron_runner.ensure_history_schema()
+        cron_updateprice.ensure_last_run_column()
+        cron_updateprice.ensure_log_table()
+
+    conn = sqlite3.connect(config_db)
+    conn.row_factory = sqlite3.Row
+    users = [dict(row) for row in conn.execute("SELECT id, email FROM users")]
+    jobs = [row["id"] for row in conn.execute("SELECT id FROM cron_jobs")]
+    conn.close()
+    return users, jobs or [1]
+
+
+def run_mode(mode, duration, workdir, threads):
+    users, jobs = prepare(mode, workdir)
+    recorder = Recorder()
+    counter = LineCounter()
+    stop = threading.Event()
+
+    def runner_writer(i):
+        user = users[i % len(users)]
+        while not stop.is_set():
+            recorder.timed("runner.log_history", lambda: cron_runner.log_history(
+                user, "order", "GET", status_code=200, latency_ms=120, url=f"http://bench/{i}"))
+
+    def updateprice_writer(i):
+        job_id = jobs[i % len(jobs)]
+        while not stop.is_set():
+            recorder.timed("updateprice.log_history", lambda: cron_updateprice.log_history(
+                job_id, f"http://bench/{job_id}", 200, 0.1, "ok"))
+            recorder.timed("updateprice.update_last_run", lambda: cron_updateprice.update_last_run(
+                job_id, int(time.time())))
+
+    def admin_client(i):
+        client = admin_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = 1
+        job_id = jobs[i % len(jobs)]
+
+        def edit():
+            response = client.post(f"/edit/{job_id}", data={
+                "domain": "bench.example", "url": "http://bench/", "interval": "60"})
+            if response.status_code != 302:
+                raise RuntimeError(response.status_code)
+
+        while not stop.is_set():
+            recorder.timed("admin.edit_cron", edit)
+
+    def user_client(i):
+        client = user_app.app.test_client()
+        user = users[i % len(users)]
+        with client.session_transaction() as sess:
+            sess["user_id"] = user["id"]
+            sess["email"] = user["email"]
+
+        def toggle():
+            if client.post("/domain").status_code != 200:
+                raise RuntimeError("toggle failed")
+
+        while not stop.is_set():
+            recorder.timed("userpanel.toggle_domain", toggle)
+
+    workers = []
+    for kind, target in (("runner", runner_writer), ("updateprice", updateprice_writer),
+                         ("admin", admin_client), ("userpanel", user_client)):
+        for i in range(threads[kind]):
+            workers.append(threading.Thread(target=target, args=(i,), daemon=True))
+
+    with contextlib.redirect_stdout(counter):
+        for worker in workers:
+            worker.start()
+        time.sleep(duration)
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=30)
+        event_log.flush()
+
+    return {
+        "mode": mode,
+        "duration_s": duration,
+        "threads": threads,
+        "db_lock_retries": counter.locked,
+        "failed_writes": counter.failed,
+        "operations": recorder.summary(duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite write-lock contention benchmark")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--mode", choices=["single", "split", "both"], default="both")
+    parser.add_argument("--runner-threads", type=int, default=4)
+    parser.add_argument("--updateprice-threads", type=int, default=4)
+    parser.add_argument("--admin-threads", type=int, default=2)
+    parser.add_argument("--user-threads", type=int, default=2)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    threads = {
+        "runner": args.runner_threads,
+        "updateprice": args.updateprice_threads,
+        "admin": args.admin_threads,
+        "userpanel": args.user_threads,
+    }
+    modes = ["single", "split"] if args.mode == "both" else [args.mode]
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in modes:
+            result = run_mode(mode, args.duration, workdir, threads)
+            results.append(result)
+            print(f"\n== {mode}: {result['db_lock_retries']} lock retries, {result['failed_writes']} failed writes")
+            for name, stats in result["operations"].items():
+                print(f"  {name:32} {stats['ops_per_sec']:>8} ops/s  p50 {stats['p50_ms']} ms  "
+                      f"p95 {stats['p95_ms']} ms  max {stats['max_ms']} ms  errors {stats['errors']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
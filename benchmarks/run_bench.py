@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from common import ROOT, LineCounter, Recorder, load_app, percentile
+import synthetic_db
+from stub_server import StubServer
+
+# Capacity benchmark: synthetic database + local stub HTTP server, then
+#   1. cron_runner.run_jobs() for --duration seconds (child process)
+#   2. cron_updateprice.run_due_cron_jobs() loop for --duration seconds (child process)
+#   3. scheduler.py running both job sources, when "scheduler" is in --phases
+#   4. admin / userpanel hot pages under concurrent load (in process)
+# Reports throughput, schedule drift, DB lock retries, peak threads and RSS.
+# With --dns-hosts N the URLs use N hostnames answered by dns_cache's stub
+# resolver (--dns-ms lookup latency), and each phase reports DNS cache hits.
+#
+# Usage: python benchmarks/run_bench.py --users 200 --jobs 200 --duration 30 --json out.json
+#        python benchmarks/run_bench.py ... --compare baseline.json
+
+# Stub paths each runner phase is responsible for
+PHASE_PREFIX = {"runner": "/u/", "updateprice": "/j/", "scheduler": "/"}
+
+WEB_PAGES = {
+    "admin": ["/dashboard", "/cron-list", "/history"],
+    "userpanel": ["/", "/cronjob_history", "/stats"],
+}
+
+
+# --- Child process side ---
+
+def run_child(phase, db, duration, result_path, cycle, host_rate, host_concurrency, dns_ms):
+    # Every stub URL is on 127.0.0.1, so the per-host limiter would cap the
+    # whole run; --host-rate / --host-concurrency set it for the benchmark
+    import dns_cache
+    import event_log
+    import http_client
+    import metrics
+    http_client.HOST_RATE = http_client.HOST_BURST = host_rate
+    http_client.HOST_MAX_CONCURRENT = host_concurrency
+    resolver = dns_cache.use_stub_resolver({"*.bench.test": "127.0.0.1"}, delay=dns_ms / 1000)
+
+    counter = LineCounter()
+    sys.stdout = counter
+    peak = {"threads": 0}
+
+    def sample():
+        while True:
+            peak["threads"] = max(peak["threads"], threading.active_count())
+            time.sleep(0.1)
+
+    def finish():
+        time.sleep(duration)
+        event_log.flush()
+        dns_lookups = {dict(labels)["result"]: value
+                       for (name, labels), value in metrics.snapshot()["counters"].items()
+                       if name == "cron_dns_lookups_total"}
+        with open(result_path, "w") as f:
+            json.dump({
+                "peak_threads": peak["threads"],
+                "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "db_lock_retries": counter.locked,
+                "failed_writes": counter.failed,
+                "log_lines": counter.lines,
+                "dns_lookups": dns_lookups,
+                "dns_resolver_calls": resolver.calls,
+            }, f)
+        os._exit(0)
+
+    threading.Thread(target=sample, daemon=True).start()
+    threading.Thread(target=finish, daemon=True).start()
+
+    if phase == "runner":
+        import cron_runner
+        cron_runner.DATABASE = cron_runner.LOG_DATABASE = db
+        cron_runner.run_jobs()
+    elif phase == "scheduler":
+        import cron_runner
+        import cron_updateprice
+        import job_queue
+        import scheduler
+        cron_runner.DATABASE = cron_runner.LOG_DATABASE = db
+        cron_updateprice.DATABASE = cron_updateprice.LOG_DATABASE = job_queue.QUEUE_DATABASE = db
+        cron_runner.ensure_history_schema()
+        cron_updateprice.ensure_log_table()
+        job_queue.ensure_queue_table()
+        import schedule_state
+        state = schedule_state.ScheduleState("scheduler", db)
+        scheduler.Scheduler(scheduler.default_sources(), state=state).run()
+    else:
+        import cron_updateprice
+        import job_queue
+        cron_updateprice.DATABASE = cron_updateprice.LOG_DATABASE = job_queue.QUEUE_DATABASE = db
+        job_queue.ensure_queue_table()
+        while True:
+            cron_updateprice.run_due_cron_jobs()
+            time.sleep(cycle)
+
+
+# --- Parent side ---
+
+def intended_intervals(db):
+    import cron_runner
+    cron_runner.DATABASE = cron_runner.LOG_DATABASE = db
+    conn = sqlite3.connect(db)
+    conn.row_factory = sqlite3.Row
+    intervals = {}
+    for user in conn.execute("SELECT id, active_package FROM users"):
+        interval = cron_runner.get_package_interval(user["active_package"])
+        intervals[f"/u/{user['id']}/order"] = interval
+        intervals[f"/u/{user['id']}/file"] = interval
+    for job in conn.execute("SELECT id, interval FROM cron_jobs"):
+        intervals[f"/j/{job['id']}"] = job["interval"]
+    conn.close()
+    return intervals
+
+
+def drift_report(hits, intervals, prefix):
+    # Lateness of each run against the previous one: actual gap - intended interval
+    lateness = []
+    for path, times in hits.items():
+        if not path.startswith(prefix) or path not in intervals:
+            continue
+        times.sort()
+        lateness.extend(b - a - intervals[path] for a, b in zip(times, times[1:]))
+    return {
+        "samples": len(lateness),
+        "mean_s": round(sum(lateness) / len(lateness), 3) if lateness else None,
+        "p50_s": round(percentile(lateness, 50), 3) if lateness else None,
+        "p95_s": round(percentile(lateness, 95), 3) if lateness else None,
+        "max_s": round(max(lateness), 3) if lateness else None,
+    }
+
+
+def run_phase(phase, db, stub, duration, cycle, intervals, workdir, host_rate, host_concurrency, dns_ms):
+    result_path = os.path.join(workdir, f"{phase}.json")
+    with stub.lock:
+        stub.hits = {}
+        stub.responses = {"ok": 0, "error": 0, "hang": 0}
+        stub.peak_in_flight = 0
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", phase, "--db", db,
+           "--duration", str(duration), "--result", result_path, "--cycle", str(cycle),
+           "--host-rate", str(host_rate), "--host-concurrency", str(host_concurrency), "--dns-ms", str(dns_ms)]
+    proc = subprocess.Popen(cmd, cwd=os.path.join(ROOT, "cron"))
+    proc.wait(timeout=duration + 60)
+
+    with open(result_path) as f:
+        result = json.load(f)
+    hits, responses = stub.snapshot()
+    prefix = PHASE_PREFIX[phase]
+    requests_sent = sum(len(times) for path, times in hits.items() if path.startswith(prefix))
+    result.update({
+        "requests": requests_sent,
+        "requests_per_sec": round(requests_sent / duration, 2),
+        "responses": responses,
+        "peak_in_flight": stub.peak_in_flight,
+        "schedule_drift": drift_report(hits, intervals, prefix),
+    })
+    return result
+
+
+def run_web(db, duration, threads):
+    results = {}
+    for app_name, pages in WEB_PAGES.items():
+        module = load_app(f"bench_{app_name}", os.path.join(ROOT, app_name, "app.py"))
+        module.DATABASE = module.LOG_DATABASE = db
+        module.shared_cache.CACHE_DATABASE = os.path.join(os.path.dirname(db), "app_cache.db")
+        module.shared_cache.VERSIONS_FILE = os.path.join(os.path.dirname(db), "app_cache.versions")
+        recorder = Recorder()
+        stop = threading.Event()
+
+        def worker(i):
+            client = module.app.test_client()
+            with client.session_transaction() as sess:
+                sess["user_id"] = i + 1
+                sess["email"] = f"user{i + 1}@bench.local"
+                sess["role"] = "admin"
+            while not stop.is_set():
+                for page in pages:
+                    def get(page=page):
+                        response = client.get(page)
+                        if response.status_code >= 400:
+                            raise RuntimeError(response.status_code)
+                    recorder.timed(f"{app_name} {page}", get)
+
+        workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+        for w in workers:
+            w.start()
+        time.sleep(duration)
+        stop.set()
+        for w in workers:
+            w.join(timeout=30)
+        results.update(recorder.summary(duration))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    print(f"\n== Compared with {baseline.get('commit')} ({baseline_path})")
+    for name in sorted(set(old) & set(new)):
+        if old[name] == new[name]:
+            continue
+        change = f"{(new[name] - old[name]) / old[name] * 100:+.1f}%" if old[name] else "n/a"
+        print(f"  {name:55} {old[name]:>12} -> {new[name]:<12} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runner and web capacity benchmark")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--job-interval", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--cycle", type=float, default=30, help="sleep between run_due_cron_jobs() calls")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-s", type=float, default=35)
+    parser.add_argument("--web-threads", type=int, default=4)
+    parser.add_argument("--host-rate", type=float, default=1000, help="per-host limiter rate (all stub URLs share one host)")
+    parser.add_argument("--host-concurrency", type=int, default=64)
+    parser.add_argument("--dns-hosts", type=int, default=0, help="spread URLs over this many stub-resolved hostnames")
+    parser.add_argument("--dns-ms", type=float, default=20, help="stub resolver latency per lookup")
+    parser.add_argument("--phases", default="runner,updateprice,web")
+    parser.add_argument("--json", help="write machine-readable results here")
+    parser.add_argument("--compare", help="previous --json output to diff against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.db, args.duration, args.result, args.cycle, args.host_rate, args.host_concurrency,
+                  args.dns_ms)
+        return
+
+    stub = StubServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                      timeout_rate=args.timeout_rate, hang_s=args.hang_s).start()
+    phases = args.phases.split(",")
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        db = synthetic_db.generate(os.path.join(workdir, "cronjobs.db"), args.users, args.jobs,
+                                   stub.base_url, args.job_interval, hosts=args.dns_hosts)
+        intervals = intended_intervals(db)
+        for phase in ("runner", "updateprice", "scheduler"):
+            if phase in phases:
+                results[phase] = run_phase(phase, db, stub, args.duration, args.cycle, intervals, workdir,
+                                           args.host_rate, args.host_concurrency, args.dns_ms)
+                print(f"== {phase}: {json.dumps(results[phase])}")
+        if "web" in phases:
+            results["web"] = run_web(db, args.duration, args.web_threads)
+            for name, stats in results["web"].items():
+                print(f"  {name:28} {stats['ops_per_sec']:>8} req/s  p50 {stats['p50_ms']} ms  "
+                      f"p95 {stats['p95_ms']} ms  errors {stats['errors']}")
+    stub.stop()
+
+    output = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("child", "db", "result", "json", "compare")},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        compare(output, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import argparse
+import csv
+import heapq
+import json
+import math
+import random
+import sys
+import time
+import zlib
+from array import array
+
+from common import percentile
+import clock
+import scheduler
+
+# Virtual-time replay of scheduler.py: the real Scheduler and FairQueue run
+# on a clock.VirtualClock with synthetic sources shaped like UsersSource
+# (order/file per package interval, price every PRICE_INTERVAL) and
+# CronJobsSource, plus the real MaintenanceSource (archive every
+# ARCHIVE_INTERVAL). Nothing is requested: a stub transport says how long
+# each run holds its worker (--latency-ms median, --slow-share of tasks
+# taking --slow-seconds), and the clock jumps from one due time or
+# completion to the next.
+#
+# Every run's due time and start time is recorded, giving exact lag
+# (start - due) per kind and tier, drift of fixed-cadence tasks against
+# their ideal grid (first due + n * interval), missed runs against what the
+# interval promises, and the longest gap between two runs of one task.
+# --max-p99-lag / --max-missed turn it into a check that exits 1.
+#
+# Usage: python benchmarks/sim_schedule.py --users 5000 --jobs 20000 --hours 24
+#        python benchmarks/sim_schedule.py --users 0 --jobs 100000 --job-intervals 1800,3600
+#        python benchmarks/sim_schedule.py --workers 8 --slow-share 0.05 --trace runs.csv
+
+# name, price (tier weight), order/file interval
+PACKAGES = [
+    ("Silver", 5.0, 300),
+    ("Gold", 15.0, 120),
+    ("Platinum", 25.0, 60),
+]
+JOB_INTERVALS = [300, 600, 1800, 3600]
+# Fixed start so reports are comparable run to run
+START = 1767225600  # 2026-01-01 00:00 UTC
+
+
+class SimUsersSource:
+    name = "users"
+    refresh_every = 3600
+    anchor_on_finish = scheduler.UsersSource.anchor_on_finish
+    persist_schedule = False
+
+    def __init__(self, users, seed):
+        rng = random.Random(seed)
+        self.users = [(user_id, rng.choice(PACKAGES)) for user_id in range(1, users + 1)]
+
+    def load(self):
+        tasks = []
+        for user_id, (tier, weight, interval) in self.users:
+            for kind, every in (("order", interval), ("file", interval), ("price", scheduler.PRICE_INTERVAL)):
+                tasks.append(scheduler.Task((self.name, kind, user_id), self.name, scheduler.PRIORITY[kind], every,
+                                            None, tier=tier, weight=weight, tenant=user_id))
+        return tasks
+
+
+class SimJobsSource:
+    name = "cron_jobs"
+    refresh_every = 3600
+    anchor_on_finish = scheduler.CronJobsSource.anchor_on_finish
+    persist_schedule = False
+
+    def __init__(self, jobs, users, seed, intervals=JOB_INTERVALS):
+        rng = random.Random(seed + 1)
+        self.jobs = [(job_id, rng.randint(1, users) if users else None, rng.choice(intervals))
+                     for job_id in range(1, jobs + 1)]
+        self.tiers = {user_id: package for user_id, package in SimUsersSource(users, seed).users}
+
+    def load(self):
+        tasks = []
+        for job_id, owner, interval in self.jobs:
+            tier, weight, _ = self.tiers.get(owner, ("none", scheduler.MIN_TIER_WEIGHT, None))
+            tasks.append(scheduler.Task((self.name, job_id), self.name, scheduler.PRIORITY["job"], interval, None,
+                                        tier=tier, weight=weight,
+                                        tenant=owner if owner is not None else f"job:{job_id}"))
+        return tasks
+
+
+class StubTransport:
+    # Seconds a run holds its worker: log-normal around the median, or
+    # slow_seconds for the slow_share of tasks picked by key
+    def __init__(self, latency_ms, slow_share, slow_seconds, seed):
+        self.mu = math.log(max(latency_ms, 1) / 1000)
+        self.slow_share = slow_share
+        self.slow_seconds = slow_seconds
+        self.rng = random.Random(seed)
+
+    def __call__(self, task):
+        if zlib.crc32(repr(task.key).encode()) % 10000 < self.slow_share * 10000:
+            return self.slow_seconds
+        return self.rng.lognormvariate(self.mu, 0.5)
+
+
+def group_of(task):
+    return task.key[1] if task.source == "users" else task.source
+
+
+class Report:
+    def __init__(self, trace=None):
+        self.lags = {}     # group -> array of start - due
+        self.tier_lags = {}
+        self.late = {}
+        # key -> [group, interval, fixed cadence, first due, runs, last start, max gap, drift, seconds held]
+        self.tasks = {}
+        self.trace = csv.writer(trace) if trace else None
+        if self.trace:
+            self.trace.writerow(["key", "due", "start", "finish"])
+
+    def record(self, task, start, finish, fixed):
+        group = group_of(task)
+        lag = max(start - task.next_due, 0)
+        self.lags.setdefault(group, array("d")).append(lag)
+        if task.tier is not None:
+            self.tier_lags.setdefault(task.tier, array("d")).append(lag)
+            if lag > task.interval * scheduler.PROMISE_TOLERANCE:
+                self.late[task.tier] = self.late.get(task.tier, 0) + 1
+        entry = self.tasks.get(task.key)
+        if entry is None:
+            entry = self.tasks[task.key] = [group, task.interval, fixed, task.next_due, 0, None, 0.0, 0.0, 0.0]
+        if entry[5] is not None:
+            entry[6] = max(entry[6], start - entry[5])
+        if fixed:
+            entry[7] = start - (entry[3] + entry[4] * task.interval)
+        entry[4] += 1
+        entry[5] = start
+        entry[8] += finish - start
+        if self.trace:
+            self.trace.writerow([scheduler.state_key(task.key), f"{task.next_due:.3f}", f"{start:.3f}",
+                                 f"{finish:.3f}"])
+
+    def expect(self, key, group, interval, first_due, fixed):
+        # Tasks that never got a worker still count towards missed runs
+        if key not in self.tasks:
+            self.tasks[key] = [group, interval, fixed, first_due, 0, None, 0.0, 0.0, 0.0]
+
+    @staticmethod
+    def lag_stats(values):
+        values = sorted(values)
+        return {
+            "runs": len(values),
+            "mean": round(sum(values) / len(values), 3) if values else None,
+            "p50": round(percentile(values, 50), 3) if values else None,
+            "p95": round(percentile(values, 95), 3) if values else None,
+            "p99": round(percentile(values, 99), 3) if values else None,
+            "max": round(values[-1], 3) if values else None,
+        }
+
+    def summary(self, end):
+        groups = {}
+        for group, lags in sorted(self.lags.items()):
+            groups[group] = self.lag_stats(lags)
+        for stats in groups.values():
+            stats.update(expected=0, missed=0, never_ran=0, max_gap_ratio=0.0, max_drift=0.0)
+        for group, interval, fixed, first_due, runs, last_start, max_gap, drift, held in self.tasks.values():
+            stats = groups.setdefault(group, dict(self.lag_stats([]), expected=0, missed=0, never_ran=0,
+                                                  max_gap_ratio=0.0, max_drift=0.0))
+            # Slots due before `end`; tasks anchored on finish also wait out
+            # their own run time. The last slot may still be queued at the end.
+            period = interval if fixed else interval + (held / runs if runs else 0)
+            expected = math.ceil((end - first_due) / period) if end > first_due else 0
+            stats["expected"] += expected
+            stats["missed"] += max(expected - runs - 1, 0)
+            stats["never_ran"] += 1 if runs == 0 and expected else 0
+            if runs == 0 and expected:
+                max_gap = end - first_due
+            stats["max_gap_ratio"] = round(max(stats["max_gap_ratio"], max_gap / interval), 2)
+            if fixed:
+                stats["max_drift"] = round(max(stats["max_drift"], drift), 3)
+        tiers = {}
+        for tier, lags in sorted(self.tier_lags.items()):
+            tiers[tier] = dict(self.lag_stats(lags), late=self.late.get(tier, 0))
+        return {"groups": groups, "tiers": tiers}
+
+
+class SimulatedScheduler(scheduler.Scheduler):
+    # Runs never block: _submit books the worker until start + transport
+    # time, and _wait jumps the clock to the next completion or wake-up
+    def __init__(self, sources, workers, virtual, transport, until, report):
+        super().__init__(sources, workers)
+        self.virtual = virtual
+        self.transport = transport
+        self.until = until
+        self.report = report
+        self.in_flight = []  # (finish, seq, task, start)
+        self.runs = 0
+
+    def refresh(self, source):
+        super().refresh(source)
+        for key, task in self.tasks.items():
+            if task.source == source.name:
+                self.report.expect(key, group_of(task), task.interval, task.next_due,
+                                   not source.anchor_on_finish)
+
+    def _submit(self, task):
+        start = self._started(task)
+        finish = start + self.transport(task)
+        self.report.record(task, start, finish, not self.sources[task.source].anchor_on_finish)
+        heapq.heappush(self.in_flight, (finish, next(self.seq), task, start))
+        self.runs += 1
+
+    def _wait(self, timeout):
+        # Completions before the wake-up only reschedule their task, so they
+        # are applied in one go unless one frees a worker for queued work
+        wake = min(self.virtual.time() + timeout, self.until)
+        while self.in_flight and self.in_flight[0][0] <= wake:
+            finish, _, task, start = heapq.heappop(self.in_flight)
+            self.virtual.advance_to(finish)
+            self._finished(task, start)
+            if self.ready:
+                return
+            if self.waiting:
+                wake = min(wake, self.waiting[0][0])
+        self.virtual.advance_to(wake)
+        if self.virtual.time() >= self.until:
+            self.running = False
+
+
+def simulate(users, jobs, hours, workers, latency_ms, slow_share, slow_seconds, seed, trace=None,
+             job_intervals=JOB_INTERVALS):
+    virtual = clock.use(clock.VirtualClock(START))
+    try:
+        sources = [SimUsersSource(users, seed), SimJobsSource(jobs, users, seed, job_intervals), scheduler.MaintenanceSource()]
+        report = Report(trace)
+        end = START + hours * 3600
+        sim = SimulatedScheduler(sources, workers, virtual, StubTransport(latency_ms, slow_share, slow_seconds, seed),
+                                 end, report)
+        wall = time.perf_counter()
+        sim.run()
+        wall = time.perf_counter() - wall
+    finally:
+        clock.use(clock.SystemClock())
+    # Every run that started is recorded; the last start counts up to `end`
+    result = report.summary(end)
+    result.update(runs=sim.runs, wall_seconds=round(wall, 2),
+                  runs_per_wall_second=round(sim.runs / wall) if wall else None)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual-time scheduler simulation")
+    parser.add_argument("--users", type=int, default=5000, help="users, 3 URL tasks each")
+    parser.add_argument("--jobs", type=int, default=20000, help="cron_jobs rows")
+    parser.add_argument("--job-intervals", default=",".join(str(i) for i in JOB_INTERVALS),
+                        help="cron_jobs intervals (seconds) to pick from")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--workers", type=int, default=scheduler.WORKERS)
+    parser.add_argument("--latency-ms", type=float, default=200, help="median run time")
+    parser.add_argument("--slow-share", type=float, default=0.0, help="share of tasks that always take --slow-seconds")
+    parser.add_argument("--slow-seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace", help="write one CSV row per run (key, due, start, finish)")
+    parser.add_argument("--json", help="write machine-readable results here")
+    parser.add_argument("--max-p99-lag", type=float, help="fail if any kind's p99 lag exceeds this many seconds")
+    parser.add_argument("--max-missed", type=float, help="fail if any kind misses more than this share of runs")
+    args = parser.parse_args()
+
+    trace = open(args.trace, "w", newline="") if args.trace else None
+    try:
+        result = simulate(args.users, args.jobs, args.hours, args.workers, args.latency_ms,
+                          args.slow_share, args.slow_seconds, args.seed, trace,
+                          [int(i) for i in args.job_intervals.split(",")])
+    finally:
+        if trace:
+            trace.close()
+
+    print(f"== {args.hours:g}h simulated for {args.users * 3 + args.jobs + 1} tasks on {args.workers} workers: "
+          f"{result['runs']} runs in {result['wall_seconds']}s ({result['runs_per_wall_second']} runs/s)")
+    print(f"  {'kind':12} {'runs':>9} {'missed':>8} {'never':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>9} "
+          f"{'gap/int':>8} {'drift':>8}")
+    for group, s in result["groups"].items():
+        print(f"  {group:12} {s['runs']:>9} {s['missed']:>8} {s['never_ran']:>6} {s['p50']!s:>8} {s['p95']!s:>8} "
+              f"{s['p99']!s:>8} {s['max']!s:>9} {s['max_gap_ratio']:>8} {s['max_drift']:>8}")
+    print(f"  {'tier':12} {'runs':>9} {'late':>8}")
+    for tier, s in result["tiers"].items():
+        print(f"  {tier:12} {s['runs']:>9} {s['late']:>8} {s['p50']!s:>15} {s['p95']!s:>8} {s['p99']!s:>8} "
+              f"{s['max']!s:>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"params": vars(args), "results": result}, f, indent=2)
+
+    failures = []
+    for group, s in result["groups"].items():
+        if args.max_p99_lag is not None and s["p99"] is not None and s["p99"] > args.max_p99_lag:
+            failures.append(f"{group} p99 lag {s['p99']}s > {args.max_p99_lag}s")
+        if args.max_missed is not None and s["expected"] and s["missed"] / s["expected"] > args.max_missed:
+            failures.append(f"{group} missed {s['missed']}/{s['expected']} runs")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import base64
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Local stand-in for a customer's Dhru Fusion API, for cron/dhru_sync.py.
+# Keeps an in-memory order book: add_orders() appends new orders, and every
+# bulk status call moves each pending order it returns on with probability
+# `progress`. Like a real provider, order IDs are sparse: they start at
+# FIRST_ORDER_ID and skip up to MAX_GAP - 1 IDs between this customer's
+# orders (taken by the provider's other customers). Counts API calls,
+# orders returned and TCP connections opened, so connection pooling and
+# batching can be checked.
+#
+# Usage: python benchmarks/stub_dhru.py --port 8098 --orders 500
+#        then save http://127.0.0.1:8098 / bench / secret in /dhru_fusion_settings
+#        and register the printed order IDs through userpanel /api/dhru/orders
+
+USERNAME = "bench"
+API_KEY = "secret"
+FIRST_ORDER_ID = 10000
+MAX_GAP = 200
+
+
+class StubDhru:
+    def __init__(self, port=0, orders=0, progress=0.3, seed=1):
+        self.progress = progress
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.orders = {}  # id -> [status, code]
+        self.calls = 0
+        self.orders_returned = 0
+        self.connections = 0
+        self.add_orders(orders)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+    def add_orders(self, count):
+        # Returns the new order IDs
+        added = []
+        with self.lock:
+            order_id = max(self.orders, default=FIRST_ORDER_ID - 1)
+            for _ in range(count):
+                order_id += self.rng.randint(1, MAX_GAP)
+                self.orders[order_id] = [0, None]
+                added.append(order_id)
+        return added
+
+    def bulk_status(self, parameters):
+        success = {}
+        with self.lock:
+            for index, item in parameters.items():
+                order = self.orders.get(int(item.get("ID", 0)))
+                if order is None:
+                    continue
+                if order[0] in (0, 1) and self.rng.random() < self.progress:
+                    order[0] = self.rng.choice((1, 4, 4, 4, 3))
+                    order[1] = f"CODE-{item['ID']}" if order[0] == 4 else None
+                success[index] = {"ID": int(item["ID"]), "STATUS": order[0], "CODE": order[1]}
+            self.orders_returned += len(success)
+        return success
+
+    def handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                with stub.lock:
+                    stub.calls += 1
+                if form.get("username") != USERNAME or form.get("apiaccesskey") != API_KEY:
+                    result = {"ERROR": [{"MESSAGE": "Authentication Failed"}]}
+                elif form.get("action") != "getimeiorderbulk":
+                    result = {"ERROR": [{"MESSAGE": "Invalid Action"}]}
+                else:
+                    parameters = json.loads(base64.b64decode(form.get("parameters", "")) or "{}")
+                    result = {"SUCCESS": stub.bulk_status(parameters)}
+                body = json.dumps(result).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Dhru Fusion API")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--progress", type=float, default=0.3)
+    args = parser.parse_args()
+    server = StubDhru(args.port, args.orders, args.progress)
+    print(f"Stub Dhru API listening on {server.base_url} (username '{USERNAME}', key '{API_KEY}')")
+    print("Order IDs: " + ",".join(str(order_id) for order_id in sorted(server.orders)))
+    server.httpd.serve_forever()
@@ -0,0 +1,103 @@
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for customer sites. Every GET/POST is answered after a
+# random latency; a share of requests return 500, and a share hang long
+# enough to trip the runners' timeouts. Arrival times are recorded per
+# path so the benchmark can measure schedule drift.
+#
+# Usage: python benchmarks/stub_server.py --port 8099 --latency-ms 50
+
+
+class StubServer:
+    def __init__(self, port=0, latency_ms=50, jitter_ms=20, error_rate=0.0,
+                 timeout_rate=0.0, hang_s=35, seed=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_s = hang_s
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.responses = {"ok": 0, "error": 0, "hang": 0}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+    def handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_request(self):
+                arrived = time.time()
+                with stub.lock:
+                    stub.hits.setdefault(self.path, []).append(arrived)
+                    stub.in_flight += 1
+                    stub.peak_in_flight = max(stub.peak_in_flight, stub.in_flight)
+                    roll = stub.rng.random()
+                    delay = max(stub.rng.gauss(stub.latency_ms, stub.jitter_ms), 0) / 1000.0
+                try:
+                    if roll < stub.timeout_rate:
+                        outcome, status = "hang", 200
+                        delay = stub.hang_s
+                    elif roll < stub.timeout_rate + stub.error_rate:
+                        outcome, status = "error", 500
+                    else:
+                        outcome, status = "ok", 200
+                    time.sleep(delay)
+                    body = b"ok" if status == 200 else b"error"
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/plain")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    with stub.lock:
+                        stub.responses[outcome] += 1
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            do_GET = handle_request
+            do_POST = handle_request
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def snapshot(self):
+        with self.lock:
+            return {path: list(times) for path, times in self.hits.items()}, dict(self.responses)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub HTTP server for runner benchmarks")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-s", type=float, default=35)
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                        args.timeout_rate, args.hang_s)
+    print(f"Stub server listening on {server.base_url}")
+    server.httpd.serve_forever()
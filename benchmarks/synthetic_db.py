@@ -0,0 +1,91 @@
+import argparse
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from common import ROOT
+
+# Builds a synthetic cronjobs.db with the same schema as the shipped one:
+# N users with order/file/price URLs, a handful of packages and M cron_jobs
+# rows, all pointing at a stub server base URL. With --hosts N the URLs are
+# spread over N names h0.bench.test ... for dns_cache's stub resolver.
+#
+# Usage: python benchmarks/synthetic_db.py out.db --users 500 --jobs 200
+
+PACKAGES = [
+    # name, validity (days), price, interval
+    ("Basic", 30, 5.0, "30 seconds"),
+    ("Standard", 30, 10.0, "10 seconds"),
+    ("Premium", 30, 20.0, "5 seconds"),
+]
+
+
+def copy_schema(conn, source=None):
+    # Reuse the real schema so the benchmark tracks it as it evolves
+    src = sqlite3.connect(source or os.path.join(ROOT, "cronjobs.db"))
+    statements = src.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END
+    """).fetchall()
+    src.close()
+    for (sql,) in statements:
+        conn.execute(sql)
+
+
+def host_url(base_url, hosts, i):
+    if not hosts:
+        return base_url
+    port = base_url.rsplit(":", 1)[1]
+    return f"http://h{i % hosts}.bench.test:{port}"
+
+
+def generate(path, users=100, jobs=100, base_url="http://127.0.0.1:8099", job_interval=30, seed=1, hosts=0):
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    copy_schema(conn)
+
+    conn.executemany(
+        "INSERT INTO packages (name, validity, price, interval, status) VALUES (?, ?, ?, ?, 'enabled')",
+        PACKAGES
+    )
+    package_ids = [row[0] for row in conn.execute("SELECT id FROM packages ORDER BY id")]
+
+    expire = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+    conn.executemany("""
+        INSERT INTO users (name, email, password, mobile, domain, status, active_package,
+                           expair_date, order_update_url, file_update_url, price_update_url)
+        VALUES (?, ?, 'x', ?, ?, 'Enable', ?, ?, ?, ?, ?)
+    """, [
+        (f"user{i}", f"user{i}@bench.local", f"0170000{i:05d}", f"site{i}.bench.local",
+         rng.choice(package_ids), expire,
+         f"{host_url(base_url, hosts, i)}/u/{i}/order", f"{host_url(base_url, hosts, i)}/u/{i}/file",
+         f"{host_url(base_url, hosts, i)}/u/{i}/price")
+        for i in range(1, users + 1)
+    ])
+
+    conn.executemany("""
+        INSERT INTO cron_jobs (domain, url, status, interval, last_run) VALUES (?, ?, 'online', ?, 0)
+    """, [
+        (f"site{i}.bench.local", f"{host_url(base_url, hosts, i)}/j/{i}", job_interval)
+        for i in range(1, jobs + 1)
+    ])
+    conn.commit()
+    conn.close()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic cronjobs.db")
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8099")
+    parser.add_argument("--job-interval", type=int, default=30)
+    parser.add_argument("--hosts", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.path, args.users, args.jobs, args.base_url, args.job_interval, hosts=args.hosts)
+    print(f"Synthetic database written to '{args.path}'.")
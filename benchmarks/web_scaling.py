@@ -0,0 +1,156 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from common import ROOT, Recorder, load_app
+import synthetic_db
+
+# Web serving scale-out: runs userpanel (or admin) under prefork.py with each
+# --workers count in turn on a synthetic database, and drives it over real
+# HTTP from --clients processes x --threads threads, logged in as different
+# users. Reports requests/sec and latency per worker count.
+#
+# Usage: python benchmarks/web_scaling.py --workers 1,2,4 --duration 10
+#        python benchmarks/web_scaling.py --app admin --workers 1,4
+
+PAGES = {
+    "userpanel": ["/", "/stats"],
+    "admin": ["/dashboard", "/packages"],
+}
+
+
+def serve(app_name, db, port, workers, cache_dir):
+    module = load_app(f"bench_{app_name}", os.path.join(ROOT, app_name, "app.py"))
+    module.DATABASE = module.LOG_DATABASE = db
+    module.shared_cache.CACHE_DATABASE = os.path.join(cache_dir, "app_cache.db")
+    module.shared_cache.VERSIONS_FILE = os.path.join(cache_dir, "app_cache.versions")
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    module.prefork.serve(module.app, "127.0.0.1", port, workers)
+
+
+def session_cookie(app_name, user_id):
+    # Signed Flask session cookie, as the login form would set it
+    module = sys.modules.get(f"cookie_{app_name}") or load_app(f"cookie_{app_name}", os.path.join(ROOT, app_name, "app.py"))
+    client = module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["email"] = f"user{user_id}@bench.local"
+        sess["role"] = "admin"
+    return client.get_cookie("session").value
+
+
+def client_process(args):
+    app_name, port, duration, threads, users, first_user = args
+    recorder = Recorder()
+    stop = time.time() + duration
+    cookies = [session_cookie(app_name, (first_user + i) % users + 1) for i in range(threads)]
+
+    def worker(i):
+        http = requests.Session()
+        http.cookies.set("session", cookies[i])
+        while time.time() < stop:
+            for page in PAGES[app_name]:
+                def get(page=page):
+                    response = http.get(f"http://127.0.0.1:{port}{page}", allow_redirects=False)
+                    if response.status_code >= 400:
+                        raise RuntimeError(response.status_code)
+                recorder.timed(page, get)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return recorder.samples, recorder.errors
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def run(app_name, workers, db, duration, clients, threads, users, workdir):
+    port = free_port()
+    cache_dir = tempfile.mkdtemp(dir=workdir)
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", app_name, "--db", db,
+                               "--port", str(port), "--workers", str(workers), "--cache-dir", cache_dir])
+    try:
+        wait_for_port(port)
+        with multiprocessing.get_context("spawn").Pool(clients) as pool:
+            results = pool.map(client_process, [(app_name, port, duration, threads, users, i * threads)
+                                                for i in range(clients)])
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    recorder = Recorder()
+    for samples, errors in results:
+        for name, values in samples.items():
+            recorder.samples.setdefault(name, []).extend(values)
+        for name, count in errors.items():
+            recorder.errors[name] = recorder.errors.get(name, 0) + count
+    summary = recorder.summary(duration)
+    total = sum(stats["ops"] for stats in summary.values())
+    return {"requests_per_sec": round(total / duration, 1), "pages": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Web serving scale-out benchmark")
+    parser.add_argument("--app", default="userpanel", choices=sorted(PAGES))
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--threads", type=int, default=8, help="threads per client process")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--json", help="write machine-readable results here")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.db, args.port, int(args.workers), args.cache_dir)
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        db = synthetic_db.generate(os.path.join(workdir, "cronjobs.db"), args.users, 50)
+        baseline = None
+        for workers in [int(w) for w in args.workers.split(",")]:
+            result = run(args.app, workers, db, args.duration, args.clients, args.threads, args.users, workdir)
+            results[workers] = result
+            baseline = baseline or result["requests_per_sec"]
+            scale = result["requests_per_sec"] / baseline if baseline else 0
+            print(f"== {args.app} workers={workers}: {result['requests_per_sec']} req/s (x{scale:.2f})")
+            for page, stats in result["pages"].items():
+                print(f"  {page:20} {stats['ops_per_sec']:>8} req/s  p50 {stats['p50_ms']} ms  "
+                      f"p95 {stats['p95_ms']} ms  errors {stats['errors']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"app": args.app, "params": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
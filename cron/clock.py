@@ -0,0 +1,82 @@
+import time as _time
+from datetime import datetime
+
+# Where the runners get "now" from. Everything that decides when something
+# runs (due times, intervals, the dispatcher's sleep) goes through here
+# instead of the time module:
+#
+#   clock.time()          unix seconds
+#   clock.now(BD_TZ)      aware datetime
+#   clock.sleep(seconds)
+#   clock.wait(cond, timeout)   Condition.wait
+#
+# use(VirtualClock(...)) swaps in virtual time, which only moves when
+# something sleeps or waits and then jumps straight to the wake-up time, so
+# a day of scheduling replays in seconds (benchmarks/sim_schedule.py).
+# Request latencies, timeouts and DB retry back-offs stay on real time.
+
+
+class SystemClock:
+    virtual = False
+
+    def time(self):
+        return _time.time()
+
+    def now(self, tz=None):
+        return datetime.now(tz)
+
+    def sleep(self, seconds):
+        _time.sleep(seconds)
+
+    def wait(self, cond, timeout):
+        return cond.wait(timeout)
+
+
+class VirtualClock:
+    # Single-threaded: the caller driving the simulation is the only thing
+    # that advances it, and waiting never blocks
+    virtual = True
+
+    def __init__(self, start=0.0):
+        self.current = float(start)
+
+    def time(self):
+        return self.current
+
+    def now(self, tz=None):
+        return datetime.fromtimestamp(self.current, tz)
+
+    def sleep(self, seconds):
+        self.current += max(seconds or 0, 0)
+
+    def wait(self, cond, timeout):
+        self.sleep(timeout)
+        return False
+
+    def advance_to(self, ts):
+        self.current = max(self.current, ts)
+
+
+CLOCK = SystemClock()
+
+
+def use(clock):
+    global CLOCK
+    CLOCK = clock
+    return clock
+
+
+def time():
+    return CLOCK.time()
+
+
+def now(tz=None):
+    return CLOCK.now(tz)
+
+
+def sleep(seconds):
+    CLOCK.sleep(seconds)
+
+
+def wait(cond, timeout):
+    return CLOCK.wait(cond, timeout)
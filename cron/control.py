@@ -0,0 +1,147 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import event_log
+import http_client
+import tick_profiler
+
+# Localhost control endpoint for a running runner, answering from its
+# in-memory state (nothing here opens the databases). JSON in and out:
+#
+#   GET  /                 routes this process serves
+#   GET  /in-flight        outbound requests waiting on a response
+#   GET  /hosts            per-host limiter state and pauses (?host= adds its URLs' timeouts)
+#   POST /hosts/pause?host=example.com    skip that host's runs until resumed
+#   POST /hosts/resume?host=example.com
+#   POST /limits?rate=2&burst=4&concurrent=4    per-host limits, applied live
+#   POST /profiler?on=1    tick_profiler on/off, like SIGUSR1
+#
+# Each runner adds its own schedule routes (/queue, /run, ...).
+#
+#   curl -s localhost:9123/queue?limit=20
+#   curl -s -X POST 'localhost:9123/run?key=users:order:12'
+
+_routes = {}  # (method, path) -> (handler, help)
+_REQUIRED = object()
+
+
+class ControlError(Exception):
+    # Bad request; the message goes back to the caller with a 400
+    pass
+
+
+def route(method, path, handler, help=""):
+    # handler(params) -> JSON-serialisable; params are the query string
+    # (and form body for POST) as a dict of single strings
+    _routes[(method, path)] = (handler, help)
+
+
+def param(params, name, cast=str, default=_REQUIRED):
+    value = params.get(name)
+    if value is None or value == "":
+        if default is _REQUIRED:
+            raise ControlError(f"missing parameter: {name}")
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise ControlError(f"bad value for {name}: {value!r}")
+
+
+def _index(params):
+    return [{"method": method, "path": path, "help": help} for (method, path), (_, help) in sorted(_routes.items())]
+
+
+def _pause(params):
+    host = param(params, "host")
+    http_client.pause(host)
+    event_log.info("control_paused", "⏸️ Control: paused {host}", host=host)
+    return {"paused": sorted(http_client.paused_hosts())}
+
+
+def _resume(params):
+    host = param(params, "host")
+    http_client.resume(host)
+    event_log.info("control_resumed", "▶️ Control: resumed {host}", host=host)
+    return {"paused": sorted(http_client.paused_hosts())}
+
+
+def _limits(params):
+    limits = http_client.set_host_limits(
+        rate=param(params, "rate", float, None),
+        burst=param(params, "burst", int, None),
+        max_concurrent=param(params, "concurrent", int, None),
+    )
+    event_log.info("control_limits", "🎚️ Control: host limits now {rate}/s, burst {burst}, "
+                   "{max_concurrent} concurrent", **limits)
+    return limits
+
+
+def _profiler(params):
+    if param(params, "on", str, "1") in ("1", "true", "on"):
+        tick_profiler.enable()
+    else:
+        tick_profiler.disable()
+    return {"enabled": tick_profiler.enabled, "report_file": tick_profiler.REPORT_FILE}
+
+
+route("GET", "/", _index, "this list")
+route("GET", "/in-flight", lambda params: http_client.in_flight(), "outbound requests waiting on a response")
+route("GET", "/hosts", lambda params: http_client.host_state(params.get("host"), param(params, "max_timeout", float, 30)),
+      "per-host limiter state and pauses; ?host= adds that host's URL timeouts")
+route("POST", "/hosts/pause", _pause, "?host= skip that host's runs until resumed")
+route("POST", "/hosts/resume", _resume, "?host=")
+route("POST", "/limits", _limits, "?rate= &burst= &concurrent= per-host limits")
+route("POST", "/profiler", _profiler, "?on=1|0 tick profiler")
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    def _handle(self, method):
+        parts = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                params.update({k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()})
+        entry = _routes.get((method, parts.path.rstrip("/") or "/"))
+        if entry is None:
+            self._reply(404, {"error": f"no route {method} {parts.path}"})
+            return
+        try:
+            self._reply(200, entry[0](params))
+        except ControlError as e:
+            self._reply(400, {"error": str(e)})
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _reply(self, status, result):
+        body = (json.dumps(result, indent=2, default=str) + "\n").encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    try:
+        server = ThreadingHTTPServer((host, port), _ControlHandler)
+    except OSError as e:
+        event_log.error("control_not_started", "⚠️ Control endpoint not started on {host}:{port}: {error}", host=host,
+                        port=port, error=str(e))
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    event_log.info("control_started", "🎛️ Control on http://{host}:{port}/", host=host, port=port)
+    return server
@@ -1,21 +1,71 @@
+import os
+import re
 import sqlite3
 import time
-import requests
 from datetime import datetime, timedelta
 import pytz
 
+import clock
+import control
+import event_log
+import history_archiver
+import http_client
+import job_events
+import metrics
+import schedule_state
+import tick_profiler
+
 # DB File Path
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE = os.path.join(BASE_DIR, "../cronjobs.db")
+# History and stats tables live in a separate file, see admin/migrate_logs_db.py
+LOG_DATABASE = os.path.join(BASE_DIR, "../cronjobs_logs.db")
 # Timezone
 BD_TZ = pytz.timezone("Asia/Dhaka")
+# Latency histogram bucket upper bounds (ms) for the customer stats page
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+# How long rows stay in the hot log tables before being archived
+HISTORY_KEEP = timedelta(days=1)
+PRICE_LOGS_KEEP = timedelta(days=7)
+# Upper bound for a customer URL request; see http_client.py for the adaptive part
+REQUEST_TIMEOUT = 10
+# Last ts written to cron_history by this process
+last_history_ts = 0
+# Metrics endpoint (localhost only) and optional textfile dump, see metrics.py
+METRICS_PORT = 9101
+METRICS_FILE = None
+# Local control endpoint, see control.py
+CONTROL_PORT = 9121
+# A tick (one pass over all active users) longer than this counts as an overrun
+TICK_BUDGET_SECONDS = 5
+# Start with the slow-tick profiler on (otherwise toggle with SIGUSR1), see tick_profiler.py
+PROFILE_ON_START = False
+
+metrics.describe("cron_request_duration_seconds", "histogram", "Customer URL request latency by kind", metrics.LATENCY_BUCKETS)
+metrics.describe("cron_requests_total", "counter", "Customer URL requests by kind and outcome")
+metrics.describe("cron_schedule_lag_seconds", "histogram", "How late a URL ran after it became due", metrics.LAG_BUCKETS)
+metrics.describe("cron_tick_duration_seconds", "histogram", "Duration of one run_jobs() pass, excluding the sleep", metrics.TICK_BUCKETS)
+metrics.describe("cron_tick_overruns_total", "counter", "Ticks that took longer than TICK_BUDGET_SECONDS")
+metrics.describe("cron_in_flight_requests", "gauge", "Customer URL requests currently waiting on a response")
+metrics.describe("cron_queue_depth", "gauge", "Users still to visit in the current tick")
+metrics.describe("cron_active_users", "gauge", "Active users at the last refresh")
+metrics.describe("cron_db_lock_errors_total", "counter", "Log writes that failed because the database stayed locked")
+metrics.describe("cron_rows_written_total", "counter", "Rows written to the log database by table")
 
 # --- Helper Functions ---
 
+def record_request(user, kind, start, outcome, lag=None):
+    elapsed = time.time() - start
+    metrics.observe("cron_request_duration_seconds", elapsed, kind=kind)
+    tick_profiler.record_job(f"{user['domain']} {kind}", elapsed)
+    metrics.inc("cron_requests_total", kind=kind, outcome=outcome)
+    if lag is not None:
+        metrics.observe("cron_schedule_lag_seconds", max(lag, 0), kind=kind)
+
 def get_active_users():
-    with sqlite3.connect(DB, timeout=10) as conn:
+    with tick_profiler.phase("db"), sqlite3.connect(DATABASE, timeout=10) as conn:
         conn.row_factory = sqlite3.Row
-        today = datetime.now(BD_TZ).date()
+        today = clock.now(BD_TZ).date()
         users = conn.execute("""
             SELECT * FROM users
             WHERE status = 'Enable'
@@ -26,110 +76,384 @@ def get_active_users():
         return valid_users
 
 def get_package_interval(package_name):
-    with sqlite3.connect(DB, timeout=10) as conn:
+    with tick_profiler.phase("db"), sqlite3.connect(DATABASE, timeout=10) as conn:
         conn.row_factory = sqlite3.Row
         result = conn.execute("SELECT interval FROM packages WHERE name = ?", (package_name,)).fetchone()
         return int(result['interval']) if result else 5  # default 5 seconds if not found
 
-def log_history(domain, email, method, result):
+HISTORY_TABLE_SQL = """
+    CREATE TABLE cron_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        email TEXT,
+        kind TEXT NOT NULL,            -- 'order', 'file', 'price' or 'dhru' (dhru_sync.py)
+        method TEXT NOT NULL,          -- 'GET' or 'POST'
+        status_code INTEGER,           -- NULL when no response was received
+        latency_ms INTEGER,
+        error_class TEXT,              -- exception class name on failure
+        ts INTEGER NOT NULL            -- unix seconds
+    )
+"""
+
+LEGACY_RESULT_RE = re.compile(r"^(GET|POST): (Order|File|Price) update( error)?: (.*)$", re.S)
+LEGACY_CAUSE_RE = re.compile(r"Caused by (\w+)\(")
+
+def parse_legacy_result(result):
+    # "GET: Order update: 200" / "POST: File update error: <exception text>"
+    match = LEGACY_RESULT_RE.match(result or "")
+    if not match:
+        return "order", "GET", None, "Unknown"
+    method, kind, is_error, detail = match.groups()
+    if not is_error and detail.strip().isdigit():
+        return kind.lower(), method, int(detail.strip()), None
+    cause = LEGACY_CAUSE_RE.search(detail)
+    return kind.lower(), method, None, cause.group(1) if cause else "RequestException"
+
+def parse_legacy_timestamp(timestamp):
+    # Old rows hold Dhaka local time as "YYYY-MM-DD HH:MM:SS"; 0 if unreadable
     try:
-        with sqlite3.connect(DB, timeout=10) as conn:
-            timestamp = datetime.now(BD_TZ).strftime("%Y-%m-%d %H:%M:%S")
-            conn.execute(
-                "INSERT INTO cron_history (job_id, email, result, timestamp) VALUES (?, ?, ?, ?)",
-                (domain, email, f"{method}: {result}", timestamp)
+        return int(BD_TZ.localize(datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+def migrate_legacy_history(conn):
+    # Rebuild cron_history from the old (job_id=domain, result=text, timestamp=text)
+    # layout into typed columns. Runs once; later starts see the new layout.
+    event_log.info("schema_migration", "➕ Migrating cron_history to structured columns...")
+    user_ids = {row[0]: row[1] for row in conn.execute("SELECT email, id FROM users")}
+    conn.execute("DROP INDEX IF EXISTS idx_cron_history_email_ts")
+    conn.execute("ALTER TABLE cron_history RENAME TO cron_history_legacy")
+    conn.execute(HISTORY_TABLE_SQL)
+
+    batch = []
+    for row_id, email, result, timestamp in conn.execute(
+        "SELECT id, email, result, timestamp FROM cron_history_legacy ORDER BY id"
+    ):
+        kind, method, status_code, error_class = parse_legacy_result(result)
+        ts = parse_legacy_timestamp(timestamp)
+        batch.append((row_id, user_ids.get(email), email, kind, method, status_code, error_class, ts))
+        if len(batch) >= 1000:
+            conn.executemany(
+                "INSERT INTO cron_history (id, user_id, email, kind, method, status_code, error_class, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                batch
             )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO cron_history (id, user_id, email, kind, method, status_code, error_class, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            batch
+        )
+    conn.execute("DROP TABLE cron_history_legacy")
+
+def ensure_history_schema():
+    # Structured history layout, indexes for per-user history pages and a
+    # per-user row counter table, so the userpanel never has to COUNT(*)
+    # over cron_history.
+    try:
+        with sqlite3.connect(LOG_DATABASE, timeout=10) as conn:
+            # users is read from the config database during legacy migration
+            if LOG_DATABASE != DATABASE:
+                conn.execute("ATTACH DATABASE ? AS config", (DATABASE,))
+                legacy = conn.execute(
+                    "SELECT name FROM config.sqlite_master WHERE type = 'table' AND name = 'cron_history'"
+                ).fetchone()
+                if legacy:
+                    event_log.warning("schema_location", "⚠️ cron_history still lives in the config database, run admin/migrate_logs_db.py")
+            cols = [col[1] for col in conn.execute("PRAGMA main.table_info(cron_history)")]
+            if not cols:
+                conn.execute(HISTORY_TABLE_SQL)
+            elif "result" in cols:
+                migrate_legacy_history(conn)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_cron_history_email_ts
+                ON cron_history (email, ts, id)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_cron_history_user_ts
+                ON cron_history (user_id, ts)
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cron_history_ts ON cron_history (ts)")
+            exists = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'cron_history_counts'"
+            ).fetchone()
+            if not exists:
+                conn.execute("""
+                    CREATE TABLE cron_history_counts (
+                        email TEXT PRIMARY KEY,
+                        total INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                conn.execute("""
+                    INSERT INTO cron_history_counts (email, total)
+                    SELECT email, COUNT(*) FROM cron_history
+                    WHERE email IS NOT NULL GROUP BY email
+                """)
+            # Running per-URL aggregates, updated on every run so the
+            # userpanel stats page never scans cron_history
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cron_url_stats (
+                    email TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    success INTEGER NOT NULL DEFAULT 0,
+                    fail_streak INTEGER NOT NULL DEFAULT 0,
+                    max_fail_streak INTEGER NOT NULL DEFAULT 0,
+                    last_status INTEGER,
+                    last_error TEXT,
+                    last_run TEXT,
+                    last_failure TEXT,
+                    PRIMARY KEY (email, kind, url)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cron_url_latency (
+                    email TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    bucket_ms INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (email, kind, url, bucket_ms)
+                )
+            """)
+            conn.commit()
+    except Exception as e:
+        event_log.error("schema_error", "Error ensuring history schema: {error}", error=str(e))
+
+def latency_bucket(latency_ms):
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return bound
+    return LATENCY_BUCKETS_MS[-1]
+
+def record_url_stats(conn, email, kind, url, status_code, latency_ms, error, timestamp):
+    ok = status_code is not None and 200 <= status_code < 300
+    conn.execute("""
+        INSERT INTO cron_url_stats
+            (email, kind, url, total, success, fail_streak, max_fail_streak,
+             last_status, last_error, last_run, last_failure)
+        VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(email, kind, url) DO UPDATE SET
+            total = total + 1,
+            success = success + excluded.success,
+            fail_streak = CASE WHEN excluded.success = 1 THEN 0 ELSE fail_streak + 1 END,
+            max_fail_streak = MAX(max_fail_streak,
+                CASE WHEN excluded.success = 1 THEN 0 ELSE fail_streak + 1 END),
+            last_status = excluded.last_status,
+            last_error = excluded.last_error,
+            last_run = excluded.last_run,
+            last_failure = COALESCE(excluded.last_failure, last_failure)
+    """, (email, kind, url, int(ok), int(not ok), int(not ok),
+          status_code, error, timestamp, None if ok else timestamp))
+    if latency_ms is not None:
+        conn.execute("""
+            INSERT INTO cron_url_latency (email, kind, url, bucket_ms, count) VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(email, kind, url, bucket_ms) DO UPDATE SET count = count + 1
+        """, (email, kind, url, latency_bucket(latency_ms)))
+
+def next_history_ts():
+    # Clock seconds, never going backwards within this process
+    global last_history_ts
+    last_history_ts = max(int(clock.time()), last_history_ts)
+    return last_history_ts
+
+def log_history(user, kind, method, status_code=None, latency_ms=None, error_class=None, url=None):
+    try:
+        with tick_profiler.phase("logging"), sqlite3.connect(LOG_DATABASE, timeout=10) as conn:
+            conn.execute("""
+                INSERT INTO cron_history (user_id, email, kind, method, status_code, latency_ms, error_class, ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user['id'], user['email'], kind, method, status_code, latency_ms, error_class, next_history_ts()))
+            conn.execute("""
+                INSERT INTO cron_history_counts (email, total) VALUES (?, 1)
+                ON CONFLICT(email) DO UPDATE SET total = total + 1
+            """, (user['email'],))
+            if url:
+                timestamp = clock.now(BD_TZ).strftime("%Y-%m-%d %H:%M:%S")
+                record_url_stats(conn, user['email'], kind, url, status_code, latency_ms, error_class, timestamp)
             conn.commit()
+        metrics.inc("cron_rows_written_total", table="cron_history")
     except Exception as e:
-        print(f"Error logging history: {e}")
+        if "locked" in str(e).lower():
+            metrics.inc("cron_db_lock_errors_total")
+        event_log.error("history_write_failed", "Error logging history: {error}", user_id=user['id'], kind=kind, error=str(e))
+
+def hit_url(user, kind, method, url, lag=None):
+    # One request to a customer URL: timing, metrics and the cron_history row
+    if http_client.is_paused(url):
+        event_log.info("run_skipped_paused", "[{domain}] {kind} update skipped: host paused", domain=user['domain'],
+                       kind=kind, url=url)
+        return
+    start = time.time()
+    metrics.add_gauge("cron_in_flight_requests", 1)
+    event = {"source": kind, "id": user['id'], "domain": user['domain'], "url": url,
+             "lag": round(lag, 3) if lag is not None else None}
+    job_events.publish("started", **event)
+    try:
+        with tick_profiler.phase("http"):
+            response = http_client.fetch(method, url, REQUEST_TIMEOUT, subscriber=f"{kind}:{user['id']}")
+        latency_ms = int((time.time() - start) * 1000)
+        record_request(user, kind, start, "ok" if response.ok else "http_error", lag)
+        log_history(user, kind, method, status_code=response.status_code, latency_ms=latency_ms, url=url)
+        job_events.publish("finished", ok=response.ok, status_code=response.status_code,
+                           duration=round(time.time() - start, 2), **event)
+        event_log.info("run_finished", "[{domain}] {kind} update done: {status_code}", domain=user['domain'], kind=kind,
+                       method=method, status_code=response.status_code, latency_ms=latency_ms, lag=lag)
+    except Exception as e:
+        record_request(user, kind, start, "exception", lag)
+        log_history(user, kind, method, error_class=type(e).__name__, url=url)
+        job_events.publish("finished", ok=False, status_code=0, duration=round(time.time() - start, 2),
+                           error=type(e).__name__, **event)
+        event_log.warning("run_failed", "[{domain}] {kind} update error: {error}", domain=user['domain'], kind=kind,
+                          method=method, error=str(e), error_class=type(e).__name__, lag=lag)
+    finally:
+        metrics.add_gauge("cron_in_flight_requests", -1)
+
+def archive_logs():
+    for table, keep in (("cron_history", HISTORY_KEEP), ("updateprice_logs", PRICE_LOGS_KEEP)):
+        try:
+            moved = history_archiver.archive_table(LOG_DATABASE, table, keep)
+            event_log.info("logs_archived", "{table}: archived {rows} rows.", table=table, rows=moved)
+        except Exception as e:
+            event_log.error("archive_failed", "Error archiving {table}: {error}", table=table, error=str(e))
 
 # --- Main Runner ---
 
+# run_jobs() state for control.py: next due time (unix seconds) per schedule
+# key ('price', 'order:12', 'file:12') and the keys forced to run next tick
+next_due = {}
+forced = set()
+
+def queue_state(params):
+    limit = control.param(params, "limit", int, 50)
+    match = params.get("match")
+    now = clock.time()
+    due = sorted((ts, key) for key, ts in list(next_due.items()) if not match or match in key)[:limit]
+    return {"keys": len(next_due), "forced": sorted(forced),
+            "next_due": [{"key": key, "next_due": round(ts, 3), "due_in": round(ts - now, 3)} for ts, key in due]}
+
+def run_now(params):
+    key = control.param(params, "key")
+    if key not in next_due:
+        raise control.ControlError(f"no schedule key {key}")
+    forced.add(key)
+    event_log.info("control_forced", "⏩ Control: forced {key}", key=key)
+    return {"forced": sorted(forced)}
+
 def run_jobs():
-    print("Cron Runner Started...")
+    event_log.info("runner_started", "Cron Runner Started...")
 
     # Per-user last run trackers
     last_run_order = {}
     last_run_file = {}
-    last_run_price = datetime.now(BD_TZ) - timedelta(minutes=30)
-    last_clear_history = datetime.now(BD_TZ)
-    last_users_refresh = datetime.now(BD_TZ) - timedelta(minutes=1)
+    last_clear_history = clock.now(BD_TZ)
+    last_users_refresh = clock.now(BD_TZ) - timedelta(minutes=1)
 
     method_toggle = True
+    ensure_history_schema()
     active_users = get_active_users()
+    metrics.set_gauge("cron_active_users", len(active_users))
+
+    # Warm restart: carry on from the checkpointed schedule; anything overdue
+    # is spread over its interval instead of firing in the first tick
+    state = schedule_state.ScheduleState("cron_runner", LOG_DATABASE)
+    saved = state.load()
+    start_ts = clock.time()
+
+    def restored(key, interval):
+        due = schedule_state.restored_due(saved, key, interval, start_ts)
+        return datetime.fromtimestamp(due - interval, BD_TZ)
+
+    last_run_price = restored("price", 1800)
+    next_due["price"] = last_run_price.timestamp() + 1800
+    for user in active_users:
+        interval = get_package_interval(user['active_package'])
+        last_run_order[user['id']] = restored(f"order:{user['id']}", interval)
+        last_run_file[user['id']] = restored(f"file:{user['id']}", interval)
+        if user['order_update_url']:
+            next_due[f"order:{user['id']}"] = last_run_order[user['id']].timestamp() + interval
+        if user['file_update_url']:
+            next_due[f"file:{user['id']}"] = last_run_file[user['id']].timestamp() + interval
 
     while True:
-        now = datetime.now(BD_TZ)
+        now = clock.now(BD_TZ)
+        tick_start = time.time()
+        tick_profiler.start_tick()
 
         # Refresh active users every 1 minute
         if (now - last_users_refresh).total_seconds() >= 60:
             active_users = get_active_users()
-            print(f"{now.strftime('%Y-%m-%d %H:%M:%S')} - Refreshed active users: {len(active_users)} users")
+            metrics.set_gauge("cron_active_users", len(active_users))
+            event_log.info("users_refreshed", "Refreshed active users: {users} users", users=len(active_users))
             last_users_refresh = now
 
-        # Clear cron_history every 10 minutes
+        # Move old log rows to the compressed archive every 10 minutes
         if (now - last_clear_history).total_seconds() >= 600:
-            try:
-                with sqlite3.connect(DB, timeout=10) as conn:
-                    conn.execute("DELETE FROM cron_history")
-                    conn.commit()
-                print(f"{now.strftime('%Y-%m-%d %H:%M:%S')} - cron_history table cleared.")
-            except Exception as e:
-                print(f"Error clearing cron_history: {e}")
+            archive_logs()
             last_clear_history = now
 
         # Price update every 30 minutes
-        if (now - last_run_price).total_seconds() >= 1800:
+        if (now - last_run_price).total_seconds() >= 1800 or "price" in forced:
+            forced.discard("price")
+            price_lag = (now - last_run_price).total_seconds() - 1800
             for user in active_users:
-                url = user['price_update_url']
-                if url:
-                    try:
-                        response = requests.get(url, timeout=10)
-                        log_history(user['domain'], user['email'], "GET", f"Price update: {response.status_code}")
-                        print(f"[{user['domain']}] Price update done: {response.status_code}")
-                    except Exception as e:
-                        log_history(user['domain'], user['email'], "GET", f"Price update error: {str(e)}")
-                        print(f"[{user['domain']}] Price update error: {str(e)}")
+                if user['price_update_url']:
+                    hit_url(user, "price", "GET", user['price_update_url'], price_lag)
             last_run_price = now
+            state.mark("price", now.timestamp())
+            next_due["price"] = now.timestamp() + 1800
 
         # Per-user job handling
-        for user in active_users:
+        for position, user in enumerate(active_users):
+            metrics.set_gauge("cron_queue_depth", len(active_users) - position)
             interval = get_package_interval(user['active_package'])
 
             # Order update
             if user['order_update_url']:
                 last_time_order = last_run_order.get(user['id'], now - timedelta(seconds=interval + 1))
-                if (now - last_time_order).total_seconds() >= interval:
-                    try:
-                        method = "GET" if method_toggle else "POST"
-                        response = requests.get(user['order_update_url'], timeout=10) if method == "GET" else requests.post(user['order_update_url'], timeout=10)
-                        log_history(user['domain'], user['email'], method, f"Order update: {response.status_code}")
-                        print(f"[{user['domain']}] Order update done: {response.status_code}")
-                    except Exception as e:
-                        log_history(user['domain'], user['email'], method, f"Order update error: {str(e)}")
-                        print(f"[{user['domain']}] Order update error: {str(e)}")
+                if (now - last_time_order).total_seconds() >= interval or f"order:{user['id']}" in forced:
+                    forced.discard(f"order:{user['id']}")
+                    # First run of a user has no schedule to be late against
+                    lag = (now - last_time_order).total_seconds() - interval if user['id'] in last_run_order else None
+                    hit_url(user, "order", "GET" if method_toggle else "POST", user['order_update_url'], lag)
                     last_run_order[user['id']] = now
+                    state.mark(f"order:{user['id']}", now.timestamp())
+                next_due[f"order:{user['id']}"] = last_run_order.get(user['id'], now).timestamp() + interval
 
             # File update
             if user['file_update_url']:
                 last_time_file = last_run_file.get(user['id'], now - timedelta(seconds=interval + 1))
-                if (now - last_time_file).total_seconds() >= interval:
-                    try:
-                        method = "POST" if method_toggle else "GET"
-                        response = requests.post(user['file_update_url'], timeout=10) if method == "POST" else requests.get(user['file_update_url'], timeout=10)
-                        log_history(user['domain'], user['email'], method, f"File update: {response.status_code}")
-                        print(f"[{user['domain']}] File update done: {response.status_code}")
-                    except Exception as e:
-                        log_history(user['domain'], user['email'], method, f"File update error: {str(e)}")
-                        print(f"[{user['domain']}] File update error: {str(e)}")
+                if (now - last_time_file).total_seconds() >= interval or f"file:{user['id']}" in forced:
+                    forced.discard(f"file:{user['id']}")
+                    lag = (now - last_time_file).total_seconds() - interval if user['id'] in last_run_file else None
+                    hit_url(user, "file", "POST" if method_toggle else "GET", user['file_update_url'], lag)
                     last_run_file[user['id']] = now
+                    state.mark(f"file:{user['id']}", now.timestamp())
+                next_due[f"file:{user['id']}"] = last_run_file.get(user['id'], now).timestamp() + interval
+
+        metrics.set_gauge("cron_queue_depth", 0)
+        tick_duration = time.time() - tick_start
+        metrics.observe("cron_tick_duration_seconds", tick_duration)
+        if tick_duration > TICK_BUDGET_SECONDS:
+            metrics.inc("cron_tick_overruns_total")
+        tick_profiler.end_tick("run_jobs tick", TICK_BUDGET_SECONDS)
+        state.checkpoint()
 
         # Toggle GET/POST
         method_toggle = not method_toggle
 
         # Sleep to avoid high CPU usage
-        time.sleep(1)
+        clock.sleep(1)
 
 # --- Main Entry ---
 if __name__ == '__main__':
+    tick_profiler.install_signal_handler()
+    if PROFILE_ON_START:
+        tick_profiler.enable()
+    metrics.start_http_server(METRICS_PORT)
+    if METRICS_FILE:
+        metrics.start_file_dump(METRICS_FILE)
+    control.route("GET", "/queue", queue_state, "next due per schedule key (?limit=50 &match=order:)")
+    control.route("POST", "/run", run_now, "?key=order:12 run it on the next tick")
+    control.start_http_server(CONTROL_PORT)
     run_jobs()
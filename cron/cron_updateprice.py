@@ -1,47 +1,86 @@
 import time
-import requests
 import sqlite3
-import datetime
 import os
 import traceback
 import threading
 
+import clock
+import control
+import event_log
+import http_client
+import job_events
+import job_queue
+import metrics
+import tick_profiler
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE = os.path.join(BASE_DIR, "../cronjobs.db")
+# updateprice_logs lives in a separate file, see admin/migrate_logs_db.py
+LOG_DATABASE = os.path.join(BASE_DIR, "../cronjobs_logs.db")
+# Metrics endpoint (localhost only) and optional textfile dump, see metrics.py
+METRICS_PORT = 9102
+METRICS_FILE = None
+# Local control endpoint, see control.py
+CONTROL_PORT = 9122
+# Seconds slept between cycles; a cycle longer than this counts as an overrun
+CYCLE_SECONDS = 30
+# Start with the slow-cycle profiler on (otherwise toggle with SIGUSR1), see tick_profiler.py
+PROFILE_ON_START = False
+# Upper bound for a job request; see http_client.py for the adaptive part
+REQUEST_TIMEOUT = 30
+# A job whose request raised gets RETRY_ATTEMPTS more tries through job_queue
+RETRY_DELAY_SECONDS = 10
+RETRY_ATTEMPTS = 2
+
+metrics.describe("cron_request_duration_seconds", "histogram", "Job URL request latency", metrics.LATENCY_BUCKETS)
+metrics.describe("cron_requests_total", "counter", "Job URL requests by outcome")
+metrics.describe("cron_schedule_lag_seconds", "histogram", "How late a job ran after it became due", metrics.LAG_BUCKETS)
+metrics.describe("cron_tick_duration_seconds", "histogram", "Duration of one run_due_cron_jobs() cycle", metrics.TICK_BUCKETS)
+metrics.describe("cron_tick_overruns_total", "counter", "Cycles that took longer than CYCLE_SECONDS")
+metrics.describe("cron_in_flight_requests", "gauge", "Job URL requests currently waiting on a response")
+metrics.describe("cron_queue_depth", "gauge", "Jobs of the current cycle that have not finished")
+metrics.describe("cron_db_lock_retries_total", "counter", "execute_with_retry / execute_query_with_retry lock retries")
+metrics.describe("cron_rows_written_total", "counter", "Rows written to the log database by table")
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False)
+def get_db_connection(path=None):
+    conn = sqlite3.connect(path or DATABASE, timeout=10, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     return conn
 
-def execute_with_retry(sql, params=(), retries=5, delay=0.3):
+def execute_with_retry(sql, params=(), retries=5, delay=0.3, path=None):
     for attempt in range(retries):
         try:
-            conn = get_db_connection()
-            conn.execute("BEGIN IMMEDIATE")
-            conn.execute(sql, params)
-            conn.commit()
-            conn.close()
+            with tick_profiler.phase("db"):
+                conn = get_db_connection(path)
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(sql, params)
+                conn.commit()
+                conn.close()
             return
         except sqlite3.OperationalError as e:
             if 'locked' in str(e).lower():
-                print(f"🔄 DB locked (write), retrying {attempt+1}/{retries}...")
+                metrics.inc("cron_db_lock_retries_total", op="write")
+                event_log.warning("db_locked", "🔄 DB locked (write), retrying {attempt}/{retries}...", op="write",
+                                  attempt=attempt + 1, retries=retries)
                 time.sleep(delay)
             else:
                 raise
     raise sqlite3.OperationalError("Max retries exceeded (write lock).")
 
-def execute_query_with_retry(sql, params=(), retries=5, delay=0.3):
+def execute_query_with_retry(sql, params=(), retries=5, delay=0.3, path=None):
     for attempt in range(retries):
         try:
-            conn = get_db_connection()
-            cursor = conn.execute(sql, params)
-            result = cursor.fetchall()
-            conn.close()
+            with tick_profiler.phase("db"):
+                conn = get_db_connection(path)
+                cursor = conn.execute(sql, params)
+                result = cursor.fetchall()
+                conn.close()
             return result
         except sqlite3.OperationalError as e:
             if 'locked' in str(e).lower():
-                print(f"🔄 DB locked (read), retrying {attempt+1}/{retries}...")
+                metrics.inc("cron_db_lock_retries_total", op="read")
+                event_log.warning("db_locked", "🔄 DB locked (read), retrying {attempt}/{retries}...", op="read",
+                                  attempt=attempt + 1, retries=retries)
                 time.sleep(delay)
             else:
                 raise
@@ -51,116 +90,248 @@ def ensure_last_run_column():
     try:
         cols = execute_query_with_retry("PRAGMA table_info(cron_jobs)")
         if "last_run" not in [col["name"] for col in cols]:
-            print("➕ Adding 'last_run' column...")
+            event_log.info("schema_migration", "➕ Adding 'last_run' column...")
             execute_with_retry("ALTER TABLE cron_jobs ADD COLUMN last_run INTEGER DEFAULT 0")
     except Exception as e:
-        print(f"⚠️ Ensure column error: {e}")
-        traceback.print_exc()
+        event_log.error("schema_error", "⚠️ Ensure column error: {error}", error=str(e),
+                        traceback=traceback.format_exc())
 
-def log_history(job_id, url, status_code, duration, result):
+def ensure_log_table():
     try:
+        exists = execute_query_with_retry(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'updateprice_logs'",
+            path=LOG_DATABASE
+        )
+        if exists:
+            return
+        event_log.info("schema_migration", "➕ Creating 'updateprice_logs' table in log database...")
         execute_with_retry("""
-            INSERT INTO updateprice_logs 
-            (cron_job_id, url, status_code, response_time, result) 
-            VALUES (?, ?, ?, ?, ?)
-        """, (job_id, url, status_code, duration, result[:500]))
+            CREATE TABLE IF NOT EXISTS updateprice_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cron_job_id INTEGER,
+                url TEXT,
+                status_code INTEGER,
+                response_time REAL,
+                result TEXT,
+                ran_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """, path=LOG_DATABASE)
+    except Exception as e:
+        event_log.error("schema_error", "⚠️ Ensure log table error: {error}", error=str(e),
+                        traceback=traceback.format_exc())
+
+def log_history(job_id, url, status_code, duration, result):
+    try:
+        with tick_profiler.phase("logging"):
+            execute_with_retry("""
+                INSERT INTO updateprice_logs 
+                (cron_job_id, url, status_code, response_time, result) 
+                VALUES (?, ?, ?, ?, ?)
+            """, (job_id, url, status_code, duration, result[:500]), path=LOG_DATABASE)
+        metrics.inc("cron_rows_written_total", table="updateprice_logs")
     except Exception as e:
-        print(f"⚠️ Log insert failed for Job {job_id}: {e}")
+        event_log.error("job_log_failed", "⚠️ Log insert failed for Job {job_id}: {error}", job_id=job_id, error=str(e))
 
-def update_status(job_id, new_status):
+def update_status(job_id, new_status, old_status=None):
     try:
         execute_with_retry("UPDATE cron_jobs SET status = ? WHERE id = ?", (new_status, job_id))
     except Exception as e:
-        print(f"⚠️ Status update failed: {e}")
+        event_log.error("job_status_failed", "⚠️ Status update failed: {error}", job_id=job_id, error=str(e))
+        return
+    if new_status != old_status:
+        job_events.publish("status", id=job_id, status=new_status)
 
 def update_last_run(job_id, timestamp):
     try:
         execute_with_retry("UPDATE cron_jobs SET last_run = ? WHERE id = ?", (timestamp, job_id))
     except Exception as e:
-        print(f"⚠️ last_run update failed: {e}")
+        event_log.error("job_last_run_failed", "⚠️ last_run update failed: {error}", job_id=job_id, error=str(e))
 
-def run_single_job(job):
+def run_single_job(job, force=False):
+    # One attempt. A request that raised is retried through job_queue after
+    # RETRY_DELAY_SECONDS instead of looping here; queued runs (force=True)
+    # leave retrying to the queue. Returns (ok, summary) or None if not due.
     job_id = job['id']
     url = job['url']
     interval = job['interval']
     last_run = job['last_run'] or 0
-    now_ts = int(time.time())
-
-    if now_ts - last_run < interval:
-        print(f"⏳ Job {job_id} not due yet ({interval - (now_ts - last_run)}s)")
-        return
+    now_ts = int(clock.time())
 
-    print(f"🚀 Running Job #{job_id}: {url}")
-    start_time = time.time()
-    timeout_flag = threading.Event()
+    if not force and now_ts - last_run < interval:
+        event_log.info("job_not_due", "⏳ Job {job_id} not due yet ({due_in}s)", job_id=job_id,
+                        due_in=interval - (now_ts - last_run))
+        return None
 
-    def timeout_handler():
-        if not timeout_flag.is_set():
-            print(f"⏰ Job {job_id} timed out after 30s — skipping offline marking")
-            log_history(job_id, url, 0, 30, "Timeout: exceeded 30 seconds (handler)")
-            update_last_run(job_id, int(time.time()))
+    if http_client.is_paused(url):
+        event_log.info("run_skipped_paused", "⏸️ Job {job_id} skipped: host paused", job_id=job_id, url=url)
+        return (False, "Skipped: host paused") if force else None
 
-    timer = threading.Timer(30.0, timeout_handler)
-    timer.start()
+    event_log.info("job_started", "🚀 Running Job #{job_id}: {url}", job_id=job_id, url=url)
+    lag = now_ts - last_run - interval if last_run and not force else None
+    if lag is not None:
+        metrics.observe("cron_schedule_lag_seconds", lag, kind="updateprice")
+    event = {"source": "job", "id": job_id, "domain": job['domain'], "url": url, "lag": lag}
+    job_events.publish("started", **event)
+    start_time = time.time()
 
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
     }
 
-    for attempt in range(3):
+    try:
+        metrics.add_gauge("cron_in_flight_requests", 1)
         try:
-            response = requests.get(url, headers=headers, timeout=30)
-            timeout_flag.set()
-            timer.cancel()
+            with tick_profiler.phase("http"):
+                response = http_client.fetch("GET", url, REQUEST_TIMEOUT, headers=headers,
+                                             subscriber=f"job:{job_id}")
+        finally:
+            metrics.add_gauge("cron_in_flight_requests", -1)
+        metrics.observe("cron_request_duration_seconds", time.time() - start_time, kind="updateprice")
+        metrics.inc("cron_requests_total", kind="updateprice",
+                    outcome="ok" if 200 <= response.status_code < 300 else "http_error")
 
-            duration = round(time.time() - start_time, 2)
-            log_history(job_id, url, response.status_code, duration, response.text)
+        duration = round(time.time() - start_time, 2)
+        log_history(job_id, url, response.status_code, duration, response.text)
+        job_events.publish("finished", ok=200 <= response.status_code < 300, status_code=response.status_code,
+                           duration=duration, result=response.text[:200], **event)
 
-            if 200 <= response.status_code < 300:
-                if job['status'] != 'offline':
-                    update_status(job_id, 'online')
-                print(f"✅ Job {job_id} success ({response.status_code}) in {duration}s")
-            else:
-                update_status(job_id, 'offline')
-                print(f"⚠️ Job {job_id} returned {response.status_code}")
-            break
-
-        except Exception as e:
-            timeout_flag.set()
-            timer.cancel()
-            duration = round(time.time() - start_time, 2)
-            log_history(job_id, url, 0, duration, f"Error: {str(e)}")
-
-            if "timed out" in str(e).lower():
-                print(f"⚠️ Job {job_id} timed out — keeping status unchanged")
-            else:
-                update_status(job_id, 'offline')
-                print(f"❌ Job {job_id} failed: {e}")
+        if 200 <= response.status_code < 300:
+            if job['status'] != 'offline':
+                update_status(job_id, 'online', job['status'])
+            event_log.info("job_finished", "✅ Job {job_id} success ({status_code}) in {duration}s", job_id=job_id,
+                           status_code=response.status_code, duration=duration)
+        else:
+            update_status(job_id, 'offline', job['status'])
+            event_log.warning("job_http_error", "⚠️ Job {job_id} returned {status_code}", job_id=job_id,
+                              status_code=response.status_code, duration=duration)
+        ok, summary = True, f"HTTP {response.status_code} in {duration}s"
+
+    except Exception as e:
+        metrics.observe("cron_request_duration_seconds", time.time() - start_time, kind="updateprice")
+        metrics.inc("cron_requests_total", kind="updateprice", outcome="exception")
+        duration = round(time.time() - start_time, 2)
+        log_history(job_id, url, 0, duration, f"Error: {str(e)}")
+        job_events.publish("finished", ok=False, status_code=0, duration=duration,
+                           result=f"Error: {str(e)}"[:200], error=type(e).__name__, **event)
+
+        if "timed out" in str(e).lower():
+            event_log.warning("job_timed_out", "⚠️ Job {job_id} timed out — keeping status unchanged", job_id=job_id,
+                              duration=duration, error=str(e))
+        else:
+            update_status(job_id, 'offline', job['status'])
+            event_log.warning("job_failed", "❌ Job {job_id} failed: {error}", job_id=job_id, duration=duration,
+                              error=str(e), error_class=type(e).__name__)
+        ok, summary = False, f"Error: {str(e)}"
+
+        if not force:
+            try:
+                job_queue.enqueue("cron_job", job_id, {"retry": True}, delay=RETRY_DELAY_SECONDS,
+                                  max_attempts=RETRY_ATTEMPTS)
+                event_log.info("job_retry_queued", "🔁 Job {job_id} retry queued in {delay}s", job_id=job_id,
+                               delay=RETRY_DELAY_SECONDS)
+            except sqlite3.Error as queue_error:
+                event_log.error("job_retry_failed", "⚠️ Could not queue retry for Job {job_id}: {error}", job_id=job_id,
+                                error=str(queue_error))
+
+    update_last_run(job_id, int(clock.time()))
+    tick_profiler.record_job(f"job {job_id} {url}", time.time() - start_time)
+    return ok, summary
+
+def run_queued_job(item):
+    # job_queue handler for kind 'cron_job' (admin "Run now" and retries)
+    rows = execute_query_with_retry("SELECT * FROM cron_jobs WHERE id = ?", (item['target_id'],))
+    if not rows:
+        event_log.warning("queued_job_missing", "⚠️ Queued Job {job_id} no longer exists", job_id=item['target_id'])
+        return
+    job = rows[0]
+    ok, summary = run_single_job(job, force=True)
+    if item['payload'].get('manual'):
+        execute_with_retry(
+            "INSERT INTO manual_history (job_id, domain, result, timestamp) VALUES (?, ?, ?, ?)",
+            (job['id'], job['domain'], summary, clock.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+    if not ok:
+        raise RuntimeError(summary)
+
+# job_queue kinds handled by this runner (also used by scheduler.py)
+QUEUE_HANDLERS = {"cron_job": run_queued_job}
+
+# run_due_cron_jobs() state for control.py: next due time per 'job:<id>' as
+# of the last cycle, and jobs forced to run on the next one
+next_due = {}
+forced = set()
+
+def queue_state(params):
+    limit = control.param(params, "limit", int, 50)
+    now = clock.time()
+    due = sorted((ts, key) for key, ts in list(next_due.items()))[:limit]
+    return {"jobs": len(next_due), "forced": sorted(forced),
+            "next_due": [{"key": key, "next_due": ts, "due_in": round(ts - now, 3)} for ts, key in due]}
 
-    update_last_run(job_id, int(time.time()))
+def run_now(params):
+    key = control.param(params, "key")
+    if key not in next_due:
+        raise control.ControlError(f"no job {key}")
+    forced.add(key)
+    event_log.info("control_forced", "⏩ Control: forced {key}", key=key)
+    return {"forced": sorted(forced)}
+
+def run_tracked_job(job):
+    try:
+        key = f"job:{job['id']}"
+        if key in forced:
+            forced.discard(key)
+            run_single_job(job, force=True)
+        else:
+            run_single_job(job)
+    finally:
+        metrics.add_gauge("cron_queue_depth", -1)
 
 def run_due_cron_jobs():
+    cycle_start = time.time()
+    tick_profiler.start_tick()
     ensure_last_run_column()
+    ensure_log_table()
     jobs = execute_query_with_retry("SELECT * FROM cron_jobs WHERE status IN ('enable', 'online')")
-    print(f"✅ Found {len(jobs)} jobs to check")
+    event_log.info("cycle_started", "✅ Found {jobs} jobs to check", jobs=len(jobs))
+    next_due.clear()
+    next_due.update({f"job:{job['id']}": (job['last_run'] or 0) + job['interval'] for job in jobs})
 
+    metrics.set_gauge("cron_queue_depth", len(jobs))
     threads = []
     for job in jobs:
-        thread = threading.Thread(target=run_single_job, args=(job,))
+        thread = threading.Thread(target=run_tracked_job, args=(job,))
         thread.start()
         threads.append(thread)
 
     for thread in threads:
         thread.join()
 
+    cycle_duration = time.time() - cycle_start
+    metrics.observe("cron_tick_duration_seconds", cycle_duration)
+    if cycle_duration > CYCLE_SECONDS:
+        metrics.inc("cron_tick_overruns_total")
+    tick_profiler.end_tick("run_due_cron_jobs cycle", CYCLE_SECONDS)
+
 if __name__ == "__main__":
-    print("📡 Cron Price Update Runner started.")
+    event_log.info("runner_started", "📡 Cron Price Update Runner started.")
+    tick_profiler.install_signal_handler()
+    if PROFILE_ON_START:
+        tick_profiler.enable()
+    metrics.start_http_server(METRICS_PORT)
+    if METRICS_FILE:
+        metrics.start_file_dump(METRICS_FILE)
+    control.route("GET", "/queue", queue_state, "next due per job as of the last cycle (?limit=50)")
+    control.route("POST", "/run", run_now, "?key=job:12 run it on the next cycle")
+    control.start_http_server(CONTROL_PORT)
+    job_queue.ensure_queue_table()
+    threading.Thread(target=job_queue.work_forever, args=(QUEUE_HANDLERS,), daemon=True).start()
     while True:
-        print(f"\n[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Checking due cron jobs...")
+        event_log.info("cycle_check", "Checking due cron jobs...")
         try:
             run_due_cron_jobs()
         except Exception as err:
-            print(f"🔥 Unhandled error: {err}")
-            traceback.print_exc()
-        time.sleep(30)
+            event_log.error("cycle_failed", "🔥 Unhandled error: {error}", error=str(err),
+                            traceback=traceback.format_exc())
+        clock.sleep(CYCLE_SECONDS)
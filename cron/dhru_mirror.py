@@ -0,0 +1,74 @@
+import time
+
+# Mirrored Dhru order states, kept in the log database. Shared by
+# dhru_sync.py (which polls the Dhru API) and userpanel /api/dhru/orders
+# (where customers register the order IDs they placed and read the states
+# back). Needs nothing but an open sqlite3 connection, so the web app can
+# import it without pulling in the runner.
+#
+# Functions take the caller's connection and leave committing to it.
+
+# Dhru order STATUS values that no longer change (3 rejected, 4 completed)
+FINAL_STATUSES = (3, 4)
+
+TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS {schema}dhru_orders (
+        user_id INTEGER NOT NULL,
+        order_id INTEGER NOT NULL,
+        status INTEGER,            -- Dhru STATUS: 0 new, 1 in process, 3 rejected, 4 completed; NULL until first synced
+        code TEXT,
+        updated_at REAL NOT NULL,  -- unix seconds of the last change
+        PRIMARY KEY (user_id, order_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS {schema}dhru_sync_state (
+        user_id INTEGER PRIMARY KEY,
+        synced_at REAL,
+        last_error TEXT
+    )
+    """,
+]
+
+_NOT_FINAL = f"(status IS NULL OR status NOT IN ({', '.join(str(status) for status in FINAL_STATUSES)}))"
+# Final orders are kept for the endpoint but never polled again
+TABLES_SQL.append(f"CREATE INDEX IF NOT EXISTS {{schema}}idx_dhru_orders_pending ON dhru_orders (user_id) WHERE {_NOT_FINAL}")
+
+
+def ensure_tables(conn, schema=""):
+    # schema is "logs." when the log database is attached under that name
+    for sql in TABLES_SQL:
+        conn.execute(sql.format(schema=schema))
+
+
+def register(conn, user_id, order_ids):
+    # Adds orders the customer placed (status NULL); already known ones are
+    # left alone. Returns how many were new.
+    now = time.time()
+    return conn.executemany("""
+        INSERT INTO dhru_orders (user_id, order_id, status, code, updated_at) VALUES (?, ?, NULL, NULL, ?)
+        ON CONFLICT(user_id, order_id) DO NOTHING
+    """, [(user_id, int(order_id), now) for order_id in order_ids]).rowcount
+
+
+def statuses(conn, user_id, order_ids):
+    # order_id -> (status, code) for the given registered orders
+    order_ids = list(order_ids)
+    if not order_ids:
+        return {}
+    return {order_id: (status, code) for order_id, status, code in conn.execute(
+        f"SELECT order_id, status, code FROM dhru_orders WHERE user_id = ? "
+        f"AND order_id IN ({','.join('?' * len(order_ids))})", (user_id, *order_ids)
+    )}
+
+
+def pending(conn, user_id):
+    # order_id -> (status, code) for the user's orders that are not final yet
+    return {order_id: (status, code) for order_id, status, code in conn.execute(
+        f"SELECT order_id, status, code FROM dhru_orders WHERE user_id = ? AND {_NOT_FINAL}", (user_id,)
+    )}
+
+
+def users_with_pending(conn):
+    return {user_id for user_id, in conn.execute(f"SELECT DISTINCT user_id FROM dhru_orders WHERE {_NOT_FINAL}")}
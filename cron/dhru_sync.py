@@ -0,0 +1,209 @@
+import base64
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import cron_runner
+import dhru_mirror
+import event_log
+import http_client
+import job_events
+import metrics
+
+# Order-status mirror of customers' Dhru Fusion accounts, using the
+# credentials they save in dhru_settings (userpanel /dhru_fusion_settings).
+# We call Dhru directly:
+#
+#   POST {api_url}/api/index.php
+#        username, apiaccesskey, action, requestformat=JSON,
+#        parameters=base64(JSON {"1": {"ID": ...}, "2": {...}})
+#
+# Dhru order IDs are sparse and shared by all of a provider's customers, and
+# the API has no "list my orders" action, so nothing here guesses IDs. The
+# customer's site registers the IDs of orders it placed through userpanel
+# POST /api/dhru/orders (register_orders() does the same here); they start
+# in dhru_orders (see dhru_mirror.py) with a NULL status. Each sync asks for
+# the state of every registered order not yet final, up to BATCH_SIZE per
+# bulk status call. Connections are pooled per API host.
+#
+# This is a mirror only: statuses are handed back by the same userpanel
+# endpoint, but nothing pushes them into the customer's site, so their
+# order_update_url is still polled as before. It is therefore not run at
+# the package's order interval: scheduler.py (DhruSource) syncs users with
+# pending orders every DHRU_SYNC_INTERVAL. benchmarks/stub_dhru.py is a
+# local stand-in for testing.
+
+ENDPOINT = "/api/index.php"
+BULK_ACTION = "getimeiorderbulk"
+BATCH_SIZE = 50
+REQUEST_TIMEOUT = 30
+POOL_SIZE = 4
+
+_lock = threading.Lock()
+_sessions = {}  # scheme://host -> requests.Session
+
+metrics.describe("cron_dhru_calls_total", "counter", "Dhru API calls by outcome")
+metrics.describe("cron_dhru_orders_synced_total", "counter", "Order states received from Dhru APIs")
+metrics.describe("cron_dhru_call_seconds", "histogram", "Dhru API call latency", metrics.LATENCY_BUCKETS)
+
+class DhruError(Exception):
+    pass
+
+
+def ensure_dhru_tables():
+    with sqlite3.connect(cron_runner.LOG_DATABASE, timeout=10) as conn:
+        dhru_mirror.ensure_tables(conn)
+    conn.close()
+
+
+def register_orders(user_id, order_ids):
+    with sqlite3.connect(cron_runner.LOG_DATABASE, timeout=10) as conn:
+        added = dhru_mirror.register(conn, user_id, order_ids)
+    conn.close()
+    return added
+
+
+def users_with_pending_orders():
+    with sqlite3.connect(cron_runner.LOG_DATABASE, timeout=10) as conn:
+        users = dhru_mirror.users_with_pending(conn)
+    conn.close()
+    return users
+
+
+def load_settings():
+    # user_id -> dhru_settings row
+    with sqlite3.connect(cron_runner.DATABASE, timeout=10) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("""
+            SELECT * FROM dhru_settings
+            WHERE TRIM(api_url) != '' AND TRIM(api_username) != '' AND TRIM(api_key) != ''
+        """).fetchall()
+    conn.close()
+    return {row['user_id']: row for row in rows}
+
+
+def api_endpoint(api_url):
+    url = api_url.strip().rstrip("/")
+    if not url.startswith(("http://", "https://")):
+        url = f"https://{url}"
+    return url if url.endswith(ENDPOINT) else url + ENDPOINT
+
+
+def session_for(url):
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = requests.Session()
+            session.mount(key, HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+    return session
+
+
+def call(settings, action, parameters):
+    url = api_endpoint(settings['api_url'])
+    data = {
+        "username": settings['api_username'],
+        "apiaccesskey": settings['api_key'],
+        "action": action,
+        "requestformat": "JSON",
+        "parameters": base64.b64encode(json.dumps(parameters).encode()).decode(),
+    }
+    # Same per-host politeness as the URL runners
+    limiter = http_client.limiter_for(url)
+    try:
+        limiter.acquire(http_client.HOST_MAX_WAIT)
+    except http_client.HostBusy as e:
+        metrics.inc("cron_dhru_calls_total", outcome="busy")
+        raise DhruError(f"{action}: {e}") from e
+    start = time.time()
+    try:
+        response = session_for(url).post(url, data=data, timeout=(http_client.CONNECT_MAX, REQUEST_TIMEOUT))
+        response.raise_for_status()
+        body = response.json()
+    except (requests.RequestException, ValueError) as e:
+        metrics.inc("cron_dhru_calls_total", outcome="error")
+        raise DhruError(f"{action}: {e}") from e
+    finally:
+        limiter.release()
+        metrics.observe("cron_dhru_call_seconds", time.time() - start)
+    if not isinstance(body, dict):
+        metrics.inc("cron_dhru_calls_total", outcome="api_error")
+        raise DhruError(f"{action}: unexpected response {str(body)[:100]}")
+    if "ERROR" in body and "SUCCESS" not in body:
+        metrics.inc("cron_dhru_calls_total", outcome="api_error")
+        raise DhruError(f"{action}: {body['ERROR']}")
+    metrics.inc("cron_dhru_calls_total", outcome="ok")
+    return body
+
+
+def get_orders(settings, order_ids):
+    # order_id -> (status, code) for the IDs the API knows about
+    body = call(settings, BULK_ACTION, {str(i + 1): {"ID": order_id} for i, order_id in enumerate(order_ids)})
+    results = {}
+    for item in (body.get("SUCCESS") or {}).values():
+        if isinstance(item, dict) and "ID" in item:
+            results[int(item["ID"])] = (int(item.get("STATUS", 0)), item.get("CODE"))
+    metrics.inc("cron_dhru_orders_synced_total", len(results))
+    return results
+
+
+def sync_user(user, settings):
+    # One pass over the user's registered, not yet final orders; returns the
+    # number of orders whose state changed
+    db = cron_runner.LOG_DATABASE
+    start = time.time()
+    url = api_endpoint(settings['api_url'])
+    if http_client.is_paused(url):
+        event_log.info("run_skipped_paused", "[{domain}] Dhru sync skipped: host paused", domain=user['domain'], url=url)
+        return 0
+
+    with sqlite3.connect(db, timeout=10) as conn:
+        known = dhru_mirror.pending(conn, user['id'])
+    conn.close()
+    if not known:
+        return 0
+
+    event = {"source": "dhru", "id": user['id'], "domain": user['domain'], "url": url, "lag": None}
+    job_events.publish("started", **event)
+    results = {}
+    error = None
+    try:
+        pending = sorted(known)
+        for i in range(0, len(pending), BATCH_SIZE):
+            results.update(get_orders(settings, pending[i:i + BATCH_SIZE]))
+    except DhruError as e:
+        error = str(e)
+
+    now = time.time()
+    changed = [(status, code, now, user['id'], order_id)
+               for order_id, (status, code) in results.items()
+               if order_id in known and known[order_id] != (status, code)]
+    with sqlite3.connect(db, timeout=10) as conn:
+        conn.executemany(
+            "UPDATE dhru_orders SET status = ?, code = ?, updated_at = ? WHERE user_id = ? AND order_id = ?", changed
+        )
+        conn.execute("""
+            INSERT INTO dhru_sync_state (user_id, synced_at, last_error) VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET synced_at = excluded.synced_at, last_error = excluded.last_error
+        """, (user['id'], time.time(), error))
+    conn.close()
+
+    latency_ms = int((time.time() - start) * 1000)
+    if error:
+        cron_runner.log_history(user, "dhru", "POST", error_class="DhruError", url=url)
+        job_events.publish("finished", ok=False, status_code=0, duration=round(latency_ms / 1000, 2),
+                           error="DhruError", **event)
+        event_log.warning("dhru_sync_failed", "[{domain}] Dhru sync error: {error}", domain=user['domain'], error=error)
+    else:
+        cron_runner.log_history(user, "dhru", "POST", status_code=200, latency_ms=latency_ms, url=url)
+        job_events.publish("finished", ok=True, status_code=200, duration=round(latency_ms / 1000, 2), **event)
+        event_log.info("dhru_synced", "[{domain}] Dhru sync: {checked} of {pending} orders returned, {changed} changed",
+                       domain=user['domain'], pending=len(known), checked=len(results), changed=len(changed),
+                       latency_ms=latency_ms)
+    return len(changed)
@@ -0,0 +1,177 @@
+import fnmatch
+import ipaddress
+import socket
+import threading
+import time
+
+import urllib3.util.connection
+
+import metrics
+
+# Process-wide hostname cache for the runners' outbound HTTP. requests opens
+# its connections through urllib3's create_connection(), which would ask the
+# system resolver again for every new connection; install() wraps it so all
+# workers share one answer per hostname:
+#   fresh      younger than TTL seconds, served straight from memory
+#   stale      older than TTL: served at once while one background lookup
+#              refreshes it; if that lookup fails the old addresses keep
+#              being served for up to STALE_TTL more seconds
+#   negative   a failed lookup with nothing to fall back on is remembered
+#              for NEGATIVE_TTL seconds so a dead domain does not cost a
+#              resolver round trip on every run
+# getaddrinfo() does not expose record TTLs, so TTL is a fixed setting.
+#
+# Tests and the benchmark swap the system resolver for a StubResolver with
+# use_stub_resolver({"*.bench.test": "127.0.0.1"}).
+
+TTL = 300
+NEGATIVE_TTL = 30
+STALE_TTL = 3600
+
+_lock = threading.Lock()
+_cache = {}       # hostname -> {"addresses", "error", "expires", "stale_until"}
+_refreshing = {}  # hostname -> Event set when the lookup in progress finishes
+_original_create_connection = urllib3.util.connection.create_connection
+
+metrics.describe("cron_dns_lookups_total", "counter",
+                 "Hostname lookups by result: hit, stale, miss, negative (cached failure) or error")
+metrics.describe("cron_dns_refresh_failures_total", "counter",
+                 "Background refreshes that failed while a stale answer was still being served")
+metrics.describe("cron_dns_cache_entries", "gauge", "Hostnames held in the DNS cache")
+
+
+def system_resolver(host, port):
+    return sorted({info[4][0] for info in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)})
+
+
+class StubResolver:
+    # Answers from a fixed {hostname pattern: address or [addresses]} map,
+    # None meaning NXDOMAIN. `delay` simulates resolver latency.
+    def __init__(self, records, delay=0):
+        self.records = records
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, host, port):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        for pattern, addresses in self.records.items():
+            if fnmatch.fnmatch(host, pattern):
+                if addresses is None:
+                    break
+                return [addresses] if isinstance(addresses, str) else list(addresses)
+        raise socket.gaierror(socket.EAI_NONAME, f"stub resolver has no record for {host}")
+
+
+RESOLVER = system_resolver
+
+
+def use_stub_resolver(records, delay=0):
+    global RESOLVER
+    RESOLVER = StubResolver(records, delay)
+    clear()
+    return RESOLVER
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+    metrics.set_gauge("cron_dns_cache_entries", 0)
+
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+def resolve(host, port=80):
+    # List of addresses for `host`; raises socket.gaierror like getaddrinfo
+    host = host.lower()
+    if _is_ip(host):
+        return [host.strip("[]")]
+    now = time.time()
+    with _lock:
+        entry = _cache.get(host)
+        if entry is not None and now < entry["expires"]:
+            result = "negative" if entry["error"] is not None else "hit"
+        elif entry is not None and entry["addresses"] and now < entry["stale_until"]:
+            result = "stale"
+            start_refresh = host not in _refreshing
+            if start_refresh:
+                _refreshing[host] = threading.Event()
+        else:
+            result = "miss"
+            waiter = _refreshing.get(host)
+            if waiter is None:
+                _refreshing[host] = threading.Event()
+
+    if result in ("hit", "negative"):
+        metrics.inc("cron_dns_lookups_total", result=result)
+        if entry["error"] is not None:
+            raise socket.gaierror(entry["error"][0], entry["error"][1])
+        return entry["addresses"]
+
+    if result == "stale":
+        metrics.inc("cron_dns_lookups_total", result="stale")
+        if start_refresh:
+            threading.Thread(target=_lookup, args=(host, port), daemon=True).start()
+        return entry["addresses"]
+
+    if waiter is not None:
+        # Another worker is already asking the resolver for this name
+        waiter.wait()
+        return resolve(host, port)
+    metrics.inc("cron_dns_lookups_total", result="miss")
+    entry = _lookup(host, port)
+    if entry["error"] is not None and not entry["addresses"]:
+        metrics.inc("cron_dns_lookups_total", result="error")
+        raise socket.gaierror(entry["error"][0], entry["error"][1])
+    return entry["addresses"]
+
+
+def _lookup(host, port):
+    now = time.time()
+    try:
+        addresses = RESOLVER(host, port)
+        entry = {"addresses": addresses, "error": None, "expires": now + TTL, "stale_until": now + TTL + STALE_TTL}
+    except Exception as e:
+        # gaierror normally, but a malformed name can raise UnicodeError etc.
+        errno = e.errno if isinstance(e, socket.gaierror) else socket.EAI_FAIL
+        with _lock:
+            previous = _cache.get(host)
+        if previous is not None and previous["addresses"] and now < previous["stale_until"]:
+            # Keep serving the last good answer; try the resolver again after NEGATIVE_TTL
+            metrics.inc("cron_dns_refresh_failures_total")
+            entry = dict(previous, expires=now + NEGATIVE_TTL)
+        else:
+            entry = {"addresses": [], "error": (errno, str(e)), "expires": now + NEGATIVE_TTL, "stale_until": 0}
+    with _lock:
+        _cache[host] = entry
+        size = len(_cache)
+        event = _refreshing.pop(host, None)
+    metrics.set_gauge("cron_dns_cache_entries", size)
+    if event is not None:
+        event.set()
+    return entry
+
+
+def create_connection(address, *args, **kwargs):
+    # Drop-in for urllib3.util.connection.create_connection: resolve through
+    # the cache, then connect to each address in turn. TLS still verifies
+    # against the hostname, which urllib3 passes separately.
+    host, port = address
+    last_error = None
+    for ip in resolve(host, port):
+        try:
+            return _original_create_connection((ip, port), *args, **kwargs)
+        except OSError as e:
+            last_error = e
+    raise last_error
+
+
+def install():
+    urllib3.util.connection.create_connection = create_connection
@@ -0,0 +1,145 @@
+import atexit
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import metrics
+
+# Runner log output. Callers hand over an event name, a message template and
+# the fields; a background thread formats them and writes to stdout in
+# batches, so a slow pipe (journald, docker logs) never blocks a worker and
+# formatting stays off the job threads:
+#
+#   event_log.info("job_finished", "✅ Job {job_id} success ({status_code}) in {duration}s",
+#                  job_id=7, status_code=200, duration=0.31)
+#
+# FORMAT "json" writes one object per line:
+#   {"ts": "2026-10-19 18:00:00.123", "level": "info", "event": "job_finished",
+#    "msg": "✅ Job 7 success (200) in 0.31s", "job_id": 7, "status_code": 200, "duration": 0.31}
+# and "text" just the timestamp and message. Events below LEVEL are dropped
+# before anything is queued; SAMPLE_EVERY keeps one in N of the noisy ones
+# (the line carries "sampled": N). If the writer falls QUEUE_SIZE lines
+# behind, new lines are dropped and counted rather than waited on.
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+LEVEL = "info"
+FORMAT = "json"
+SAMPLE_EVERY = {"job_not_due": 100, "run_skipped_paused": 20}
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+
+metrics.describe("cron_log_dropped_total", "counter", "Log lines dropped because the writer fell QUEUE_SIZE behind")
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_counters = {}  # event -> itertools.count, for sampling
+_lock = threading.Lock()
+_writer = None
+
+
+def enabled_for(level):
+    return LEVELS[level] >= LEVELS[LEVEL]
+
+
+def log(level, event, message, **fields):
+    if LEVELS[level] < LEVELS[LEVEL]:
+        return
+    every = SAMPLE_EVERY.get(event)
+    if every:
+        counter = _counters.get(event) or _counters.setdefault(event, itertools.count())
+        if next(counter) % every:
+            return
+        fields["sampled"] = every
+    _start()
+    try:
+        _queue.put_nowait((time.time(), level, event, message, fields))
+    except queue.Full:
+        metrics.inc("cron_log_dropped_total")
+
+
+def debug(event, message, **fields):
+    log("debug", event, message, **fields)
+
+
+def info(event, message, **fields):
+    log("info", event, message, **fields)
+
+
+def warning(event, message, **fields):
+    log("warning", event, message, **fields)
+
+
+def error(event, message, **fields):
+    log("error", event, message, **fields)
+
+
+def _format(record):
+    ts, level, event, message, fields = record
+    try:
+        text = message.format(**fields)
+    except (KeyError, IndexError, ValueError):
+        text = message
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)) + f".{int(ts % 1 * 1000):03d}"
+    if FORMAT == "text":
+        return f"{stamp} {text}\n"
+    return json.dumps({"ts": stamp, "level": level, "event": event, "msg": text, **fields},
+                      ensure_ascii=False, default=str) + "\n"
+
+
+def _write_loop():
+    while True:
+        batch = [_queue.get()]
+        try:
+            while len(batch) < BATCH_SIZE:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+        try:
+            # Looked up per batch so redirecting sys.stdout still works
+            out = sys.stdout
+            out.write("".join(_format(record) for record in batch))
+            out.flush()
+        except Exception:
+            pass
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def _start():
+    global _writer
+    if _writer is not None:
+        return
+    with _lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="event-log", daemon=True)
+            _writer.start()
+
+
+def flush(timeout=5):
+    # Wait for queued lines to be written; False if the writer did not
+    # catch up within `timeout`
+    deadline = time.monotonic() + timeout
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _queue.all_tasks_done.wait(remaining)
+    return True
+
+
+def _after_fork():
+    # A forked child (prefork.py web workers) has no writer thread and may
+    # have inherited the queue mid-put; it starts over with its own
+    global _queue, _lock, _writer
+    _queue = queue.Queue(maxsize=QUEUE_SIZE)
+    _lock = threading.Lock()
+    _writer = None
+
+
+atexit.register(flush)
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,161 @@
+import gzip
+import json
+import os
+import sqlite3
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+# Moves old log rows out of the hot tables into compressed, append-only,
+# day-segmented files:
+#
+#   archive/<table>/<YYYY-MM-DD>.ndjson.gz   one JSON row per line, gzip members appended
+#   archive/<table>/<YYYY-MM-DD>.idx.json    {"min", "max", "rows", "keys"} used to skip segments
+#                                            (may over-cover after a rolled-back batch, never under-cover)
+#   archive/<table>/state.json               in-flight batch, for crash recovery
+#
+# admin/history_archive.py reads the same layout for the history views.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(BASE_DIR, "../archive")
+BD_TZ = timezone(timedelta(hours=6))
+BATCH_SIZE = 5000
+
+# time: column used for the cutoff and segment day
+# epoch: True for unix seconds, False for "YYYY-MM-DD HH:MM:SS" UTC text
+# key: column collected into the segment index for pruning
+ARCHIVE_TABLES = {
+    "cron_history": {"time": "ts", "epoch": True, "key": "email"},
+    "updateprice_logs": {"time": "ran_at", "epoch": False, "key": "cron_job_id"},
+}
+
+
+def segment_day(table, value):
+    if ARCHIVE_TABLES[table]["epoch"]:
+        return datetime.fromtimestamp(value, BD_TZ).strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+
+def cutoff_for(table, older_than):
+    moment = datetime.now(timezone.utc) - older_than
+    if ARCHIVE_TABLES[table]["epoch"]:
+        return int(moment.timestamp())
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def recover(conn, table, table_dir):
+    # A batch is: record sizes -> append -> mark appended -> delete rows.
+    # Roll back an append that never finished, or finish a pending delete.
+    state_path = os.path.join(table_dir, "state.json")
+    state = read_json(state_path, {})
+    pending = state.get("pending")
+    if not pending:
+        return
+    if pending.get("appended"):
+        delete_batch(conn, table, pending["cutoff"], pending["max_id"])
+    else:
+        for path, size in pending["sizes"].items():
+            if size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+            elif os.path.exists(path):
+                os.remove(path)
+    write_json(state_path, {})
+
+
+def delete_batch(conn, table, cutoff, max_id):
+    time_col = ARCHIVE_TABLES[table]["time"]
+    conn.execute("BEGIN IMMEDIATE")
+    if table == "cron_history":
+        # Keep the per-user counters in line with what is left in the hot table
+        emails = Counter(row[0] for row in conn.execute(
+            f"SELECT email FROM {table} WHERE {time_col} < ? AND id <= ?", (cutoff, max_id)))
+        conn.executemany(
+            "UPDATE cron_history_counts SET total = MAX(total - ?, 0) WHERE email = ?",
+            [(count, email) for email, count in emails.items()]
+        )
+    conn.execute(f"DELETE FROM {table} WHERE {time_col} < ? AND id <= ?", (cutoff, max_id))
+    conn.execute("COMMIT")
+
+
+def append_batch(table, table_dir, rows, columns):
+    config = ARCHIVE_TABLES[table]
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(segment_day(table, row[config["time"]]), []).append(row)
+
+    for day, day_rows in by_day.items():
+        segment = os.path.join(table_dir, f"{day}.ndjson.gz")
+        # Each batch is its own gzip member; readers see one continuous stream
+        with open(segment, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                for row in day_rows:
+                    gz.write((json.dumps(dict(zip(columns, row))) + "\n").encode())
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        index_path = os.path.join(table_dir, f"{day}.idx.json")
+        index = read_json(index_path, {"min": None, "max": None, "rows": 0, "keys": []})
+        times = [row[config["time"]] for row in day_rows]
+        index["min"] = min(times) if index["min"] is None else min(index["min"], min(times))
+        index["max"] = max(times) if index["max"] is None else max(index["max"], max(times))
+        index["rows"] += len(day_rows)
+        index["keys"] = sorted(set(index["keys"]) | {row[config["key"]] for row in day_rows if row[config["key"]] is not None})
+        write_json(index_path, index)
+
+
+def archive_table(db_path, table, older_than, archive_dir=None):
+    config = ARCHIVE_TABLES[table]
+    table_dir = os.path.join(archive_dir or ARCHIVE_DIR, table)
+    os.makedirs(table_dir, exist_ok=True)
+    state_path = os.path.join(table_dir, "state.json")
+    cutoff = cutoff_for(table, older_than)
+    archived = 0
+
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        recover(conn, table, table_dir)
+        while True:
+            cursor = conn.execute(
+                f"SELECT * FROM {table} WHERE {config['time']} < ? ORDER BY id LIMIT ?",
+                (cutoff, BATCH_SIZE)
+            )
+            columns = [col[0] for col in cursor.description]
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            max_id = rows[-1]["id"]
+            days = {segment_day(table, row[config["time"]]) for row in rows}
+            paths = [os.path.join(table_dir, f"{day}.ndjson.gz") for day in days]
+            sizes = {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in paths}
+            pending = {"cutoff": cutoff, "max_id": max_id, "sizes": sizes}
+            write_json(state_path, {"pending": pending})
+
+            append_batch(table, table_dir, rows, columns)
+            pending["appended"] = True
+            write_json(state_path, {"pending": pending})
+
+            delete_batch(conn, table, cutoff, max_id)
+            write_json(state_path, {})
+            archived += len(rows)
+    finally:
+        conn.close()
+    return archived
@@ -0,0 +1,391 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+
+import dns_cache
+import metrics
+
+# Outbound HTTP for the runners. Timeouts are worked out per URL from its
+# recent latencies instead of a flat 10s / 30s:
+#   connect  = clamp(p99 * CONNECT_MULTIPLIER, CONNECT_MIN, CONNECT_MAX)
+#   read     = clamp(p99 * READ_MULTIPLIER, READ_MIN, max_timeout)
+#   deadline = min(connect + read, max_timeout), for the whole run including the body
+# until a URL has MIN_SAMPLES latencies, the caller's legacy timeout is used.
+# The read timeout only bounds each socket read, so a timer shuts the
+# socket down when the deadline passes: a site that trickles its body a
+# byte at a time is cut off there too (DeadlineExceeded). A site trickling
+# its response headers is only bounded by the read timeout per byte.
+#
+# Every request also goes through a per-host limiter: a token bucket
+# (HOST_RATE requests/second, bursts of HOST_BURST) plus at most
+# HOST_MAX_CONCURRENT requests in flight. Many customers share hosting, so
+# with LIMIT_BY_IP the limiter is keyed by resolved address instead. This
+# is what keeps high runner concurrency from hammering a single origin.
+#
+# Identical (method, URL) requests are coalesced: other callers due while
+# one is in flight, or within COALESCE_WINDOW seconds of when it started, get
+# its response (or exception) instead of sending their own. Callers pass a
+# subscriber key (their schedule entry, e.g. "order:12" or "job:7"), and a
+# response is never handed to the same subscriber twice, so a job's next run
+# always sends a fresh request. Callers without a key only join requests
+# still in flight. Each caller still writes its own history/status rows. This
+# pays off in scheduler.py, where users' URLs and cron_jobs rows pointing at
+# the same endpoint share a process. The window comes from the
+# CRON_COALESCE_WINDOW environment variable (seconds, 0 = in flight only).
+#
+# Hostnames are resolved through dns_cache, installed below for every
+# connection requests opens in this process.
+#
+# control.py reads the in-flight requests and limiter state from here, and
+# can pause a host (fetch raises HostPaused; the runners check is_paused()
+# first and skip the run) or change the limits while the process runs.
+
+WINDOW = 50
+MIN_SAMPLES = 10
+CONNECT_MULTIPLIER = 2
+CONNECT_MIN = 0.5
+CONNECT_MAX = 5
+READ_MULTIPLIER = 4
+READ_MIN = 1
+CHUNK_SIZE = 16 * 1024
+HOST_RATE = 2.0
+HOST_BURST = 4
+HOST_MAX_CONCURRENT = 4
+# Give up on a host slot after this long; the run is logged as timed out
+HOST_MAX_WAIT = 30
+LIMIT_BY_IP = False
+COALESCE_WINDOW = float(os.environ.get("CRON_COALESCE_WINDOW", 5))
+
+_lock = threading.Lock()
+_latencies = {}  # url -> deque of recent latencies (seconds)
+_limiters = {}   # host or IP -> HostLimiter
+_recent = {}     # (method, url) -> in-flight or recently finished request, see fetch()
+_leader_calls = 0
+_paused = {}     # hostname -> unix seconds paused at
+
+dns_cache.install()
+
+metrics.describe("cron_request_deadline_seconds", "histogram", "Per-run deadline picked for outbound requests",
+                 metrics.LATENCY_BUCKETS)
+metrics.describe("cron_request_timeouts_total", "counter", "Outbound requests that hit their connect/read timeout or deadline")
+metrics.describe("cron_request_timeout_wait_seconds_total", "counter", "Worker seconds spent on requests that ended in a timeout")
+metrics.describe("cron_host_throttle_wait_seconds_total", "counter", "Seconds requests waited for their host's rate limit or concurrency cap")
+metrics.describe("cron_host_throttled_total", "counter", "Requests that had to wait for their host's limiter")
+metrics.describe("cron_host_busy_total", "counter", "Requests abandoned after HOST_MAX_WAIT seconds waiting for a host slot")
+metrics.describe("cron_requests_coalesced_total", "counter", "Requests answered from an identical in-flight or recent request instead of being sent")
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    pass
+
+
+class HostBusy(requests.exceptions.Timeout):
+    pass
+
+
+class HostPaused(requests.exceptions.ConnectionError):
+    pass
+
+
+class HostLimiter:
+    def __init__(self, rate, burst, max_concurrent):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        # Counted by hand rather than a Semaphore so the cap can change live
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.slots = threading.Condition()
+
+    def _take_slot(self, timeout):
+        with self.slots:
+            if not self.slots.wait_for(lambda: self.active < self.max_concurrent, timeout):
+                return False
+            self.active += 1
+            return True
+
+    def acquire(self, timeout):
+        # Returns seconds waited; raises HostBusy when `timeout` runs out
+        start = time.monotonic()
+        if not self._take_slot(timeout):
+            raise HostBusy(f"timed out waiting {timeout}s for a host slot")
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - start
+                wait = (1 - self.tokens) / self.rate
+            if now + wait - start > timeout:
+                self.release()
+                raise HostBusy(f"timed out waiting {timeout}s for the host rate limit")
+            time.sleep(wait)
+
+    def release(self):
+        with self.slots:
+            self.active -= 1
+            self.slots.notify()
+
+    def set_limits(self, rate, burst, max_concurrent):
+        with self.lock:
+            self.rate = rate
+            self.burst = burst
+            self.tokens = min(self.tokens, burst)
+        with self.slots:
+            self.max_concurrent = max_concurrent
+            self.slots.notify_all()
+
+    def state(self):
+        with self.lock:
+            tokens = min(self.burst, self.tokens + (time.monotonic() - self.updated) * self.rate)
+        return {"tokens": round(tokens, 2), "rate": self.rate, "burst": self.burst,
+                "active": self.active, "max_concurrent": self.max_concurrent}
+
+
+def limiter_key(url):
+    host = (urlsplit(url).hostname or "").lower()
+    if LIMIT_BY_IP and host:
+        try:
+            return dns_cache.resolve(host)[0]
+        except OSError:
+            pass
+    return host
+
+
+def limiter_for(url):
+    key = limiter_key(url)
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = HostLimiter(HOST_RATE, HOST_BURST, HOST_MAX_CONCURRENT)
+    return limiter
+
+
+def set_host_limits(rate=None, burst=None, max_concurrent=None):
+    # New defaults for limiters created from now on, and applied to existing ones
+    global HOST_RATE, HOST_BURST, HOST_MAX_CONCURRENT
+    with _lock:
+        HOST_RATE = rate or HOST_RATE
+        HOST_BURST = burst or HOST_BURST
+        HOST_MAX_CONCURRENT = max_concurrent or HOST_MAX_CONCURRENT
+        limiters = list(_limiters.values())
+    for limiter in limiters:
+        limiter.set_limits(HOST_RATE, HOST_BURST, HOST_MAX_CONCURRENT)
+    return {"rate": HOST_RATE, "burst": HOST_BURST, "max_concurrent": HOST_MAX_CONCURRENT}
+
+
+def pause(host):
+    with _lock:
+        _paused.setdefault(host.strip().lower(), time.time())
+
+
+def resume(host):
+    with _lock:
+        _paused.pop(host.strip().lower(), None)
+
+
+def paused_hosts():
+    with _lock:
+        return dict(_paused)
+
+
+def is_paused(url):
+    return bool(_paused) and (urlsplit(url).hostname or "").lower() in _paused
+
+
+def in_flight():
+    # Requests actually on the wire (coalesced followers are counted, not listed)
+    now = time.time()
+    with _lock:
+        entries = [(key, entry) for key, entry in _recent.items() if entry["done_at"] is None]
+    return sorted(({"method": method, "url": url, "started": entry["started"],
+                    "elapsed": round(now - entry["started"], 3), "waiting_callers": entry["followers"]}
+                   for (method, url), entry in entries), key=lambda item: item["started"])
+
+
+def host_state(host=None, max_timeout=30):
+    # With `host`, also the timeouts its URLs would get on a run capped at max_timeout
+    with _lock:
+        limiters = dict(_limiters)
+        paused = dict(_paused)
+        latencies = {url: list(samples) for url, samples in _latencies.items()}
+    hosts = {key: dict(limiter.state(), paused_at=paused.get(key)) for key, limiter in sorted(limiters.items())}
+    for key, paused_at in paused.items():
+        hosts.setdefault(key, {"paused_at": paused_at})
+    result = {"limit_by_ip": LIMIT_BY_IP, "hosts": hosts}
+    if host:
+        host = host.strip().lower()
+        urls = {}
+        for url, samples in latencies.items():
+            if (urlsplit(url).hostname or "").lower() == host:
+                connect, read, deadline = timeouts_for(url, max_timeout)
+                urls[url] = {"samples": len(samples), "p99": round(_percentile(samples, 99), 3),
+                             "connect": round(connect, 2), "read": round(read, 2), "deadline": round(deadline, 2)}
+        result["urls"] = urls
+    return result
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def timeouts_for(url, max_timeout):
+    # (connect, read, deadline) in seconds
+    with _lock:
+        samples = list(_latencies.get(url, ()))
+    if len(samples) < MIN_SAMPLES:
+        return min(CONNECT_MAX, max_timeout), max_timeout, max_timeout
+    p99 = _percentile(samples, 99)
+    connect = min(max(p99 * CONNECT_MULTIPLIER, CONNECT_MIN), CONNECT_MAX)
+    read = min(max(p99 * READ_MULTIPLIER, READ_MIN), max_timeout)
+    return connect, read, min(connect + read, max_timeout)
+
+
+def record_latency(url, seconds):
+    with _lock:
+        samples = _latencies.get(url)
+        if samples is None:
+            samples = _latencies[url] = deque(maxlen=WINDOW)
+        samples.append(seconds)
+
+
+def fetch(method, url, max_timeout, headers=None, subscriber=None):
+    # Like requests.request(method, url, timeout=max_timeout) but with the
+    # adaptive timeouts, host limiter and coalescing above. Raises
+    # requests.exceptions.Timeout (or its subclasses DeadlineExceeded and
+    # HostBusy) when a budget runs out.
+    global _leader_calls
+    if is_paused(url):
+        raise HostPaused(f"{urlsplit(url).hostname} is paused")
+    key = (method, url)
+    now = time.time()
+    with _lock:
+        entry = _recent.get(key)
+        follower = (
+            entry is not None
+            and (entry["done_at"] is None or (subscriber is not None and now - entry["started"] <= COALESCE_WINDOW))
+            and (subscriber is None or subscriber not in entry["subscribers"])
+        )
+        if follower:
+            entry["followers"] += 1
+        else:
+            entry = _recent[key] = {"event": threading.Event(), "done_at": None, "response": None, "error": None,
+                                    "started": now, "followers": 0, "subscribers": set()}
+            _leader_calls += 1
+            if _leader_calls % 256 == 0:
+                for stale in [k for k, e in _recent.items()
+                              if e["done_at"] is not None and now - e["started"] > COALESCE_WINDOW]:
+                    del _recent[stale]
+        if subscriber is not None:
+            entry["subscribers"].add(subscriber)
+
+    if follower:
+        entry["event"].wait()
+        metrics.inc("cron_requests_coalesced_total")
+        if entry["error"] is not None:
+            raise entry["error"]
+        return entry["response"]
+
+    try:
+        entry["response"] = _limited_fetch(method, url, max_timeout, headers)
+        return entry["response"]
+    except Exception as e:
+        entry["error"] = e
+        raise
+    finally:
+        entry["done_at"] = time.time()
+        entry["event"].set()
+
+
+def _limited_fetch(method, url, max_timeout, headers):
+    limiter = limiter_for(url)
+    wait_start = time.monotonic()
+    try:
+        waited = limiter.acquire(HOST_MAX_WAIT)
+    except HostBusy:
+        metrics.inc("cron_host_busy_total")
+        metrics.inc("cron_host_throttle_wait_seconds_total", time.monotonic() - wait_start)
+        raise
+    if waited > 0.001:
+        metrics.inc("cron_host_throttled_total")
+        metrics.inc("cron_host_throttle_wait_seconds_total", waited)
+    try:
+        return _fetch(method, url, max_timeout, headers)
+    finally:
+        limiter.release()
+
+
+def _fetch(method, url, max_timeout, headers):
+    connect, read, deadline = timeouts_for(url, max_timeout)
+    metrics.observe("cron_request_deadline_seconds", deadline)
+    start = time.time()
+    current = {"response": None}
+    expired = threading.Event()
+
+    def cut_off():
+        expired.set()
+        _shutdown(current["response"])
+
+    timer = threading.Timer(deadline, cut_off)
+    timer.daemon = True
+    timer.start()
+    try:
+        with requests.request(method, url, headers=headers, timeout=(connect, read), stream=True) as response:
+            current["response"] = response
+            if expired.is_set():
+                _shutdown(response)
+            chunks = []
+            for chunk in response.iter_content(CHUNK_SIZE):
+                chunks.append(chunk)
+            if expired.is_set():
+                # The shut-down socket can look like a clean end of body
+                raise DeadlineExceeded(f"Read timed out: run deadline of {deadline:.1f}s exceeded")
+            # Same as what response.content would have loaded
+            response._content = b"".join(chunks)
+    except requests.exceptions.Timeout:
+        _timed_out(url, start, deadline)
+        raise
+    except (requests.exceptions.RequestException, OSError) as e:
+        if expired.is_set():
+            _timed_out(url, start, deadline)
+            raise DeadlineExceeded(f"Read timed out: run deadline of {deadline:.1f}s exceeded") from e
+        # A read timeout while streaming the body surfaces as ConnectionError
+        if not isinstance(e, requests.exceptions.ConnectionError) or "timed out" not in str(e).lower():
+            raise
+        _timed_out(url, start, deadline)
+        raise requests.exceptions.ReadTimeout(str(e)) from e
+    finally:
+        timer.cancel()
+    record_latency(url, time.time() - start)
+    return response
+
+
+def _shutdown(response):
+    # Unblocks a read waiting on a trickling body; the read then fails or ends.
+    # http.client keeps the socket on the response (the connection's own
+    # reference is dropped when the server will close it)
+    fp = getattr(getattr(response.raw, "_fp", None), "fp", None) if response is not None else None
+    sock = getattr(getattr(fp, "raw", None), "_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _timed_out(url, start, deadline):
+    metrics.inc("cron_request_timeouts_total")
+    metrics.inc("cron_request_timeout_wait_seconds_total", time.time() - start)
+    # Count the budget as a sample so a site that really got slower earns a
+    # longer timeout next time (p99 of the window jumps to it)
+    record_latency(url, deadline)
@@ -0,0 +1,43 @@
+import json
+import socket
+import time
+
+import metrics
+
+# Fire-and-forget job events for the admin live dashboard (admin/event_hub.py).
+# Each event is one JSON datagram to EVENTS_ADDR on localhost: sending never
+# blocks a worker and costs nothing when no admin process is listening (the
+# datagram is simply dropped). The admin hub fans them out to every open
+# dashboard, so the runners do not care how many are watching.
+#
+# Event types:
+#   started   source ('order', 'file', 'price', 'job', 'dhru'), id, url, lag
+#   finished  the same plus ok, status_code, duration, error
+#   status    a cron_jobs row went online/offline: id, status
+
+EVENTS_ADDR = ("127.0.0.1", 9110)
+ENABLED = True
+# Datagrams above this are not sent (well under the loopback MTU)
+MAX_EVENT_BYTES = 8192
+
+_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+_sock.setblocking(False)
+
+metrics.describe("cron_events_sent_total", "counter", "Live dashboard events sent by type")
+metrics.describe("cron_events_dropped_total", "counter", "Live dashboard events that could not be sent")
+
+
+def publish(event_type, **fields):
+    if not ENABLED:
+        return
+    fields["type"] = event_type
+    fields["ts"] = round(time.time(), 3)
+    try:
+        data = json.dumps(fields, default=str).encode()
+        if len(data) > MAX_EVENT_BYTES:
+            raise ValueError(f"event too large ({len(data)} bytes)")
+        _sock.sendto(data, EVENTS_ADDR)
+    except (OSError, ValueError):
+        metrics.inc("cron_events_dropped_total", type=event_type)
+        return
+    metrics.inc("cron_events_sent_total", type=event_type)
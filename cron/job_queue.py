@@ -0,0 +1,223 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+import event_log
+
+# Durable work queue shared by the web apps (enqueue) and the runners
+# (claim / complete). Lives in the log database next to the other
+# high-churn tables so claims never take the config database's write lock.
+#
+# A worker claims one row at a time with UPDATE ... RETURNING; the row stays
+# invisible to other workers until claimed_until. While the handler runs,
+# drain() renews the claim every VISIBILITY_TIMEOUT / 3, so long jobs are not
+# claimed twice and a worker that dies mid-job only delays it by
+# VISIBILITY_TIMEOUT. complete(), fail() and renew() only touch the row while
+# it still carries the worker's claim (same attempts count). Handlers signal
+# failure by raising; the row is then put back with a growing delay instead
+# of the worker retrying inline.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUEUE_DATABASE = os.path.join(BASE_DIR, "../cronjobs_logs.db")
+VISIBILITY_TIMEOUT = 120
+# Delay before attempt 2, 3, ... (the last value repeats)
+RETRY_BACKOFF = [10, 30, 120, 600]
+# Finished rows are deleted after this many seconds
+KEEP_FINISHED = 3 * 86400
+
+QUEUE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS job_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,             -- handler name, e.g. 'cron_job'
+        target_id INTEGER NOT NULL,     -- row the handler acts on (cron_jobs.id, ...)
+        payload TEXT,                   -- JSON
+        status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, done, failed
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        run_at REAL NOT NULL,           -- unix seconds, not claimable before
+        claimed_until REAL,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        finished_at REAL
+    )
+"""
+QUEUE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_job_queue_status_run_at ON job_queue(status, run_at)"
+
+
+def get_connection():
+    conn = sqlite3.connect(QUEUE_DATABASE, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def ensure_queue_table():
+    with get_connection() as conn:
+        conn.execute(QUEUE_TABLE_SQL)
+        conn.execute(QUEUE_INDEX_SQL)
+    conn.close()
+
+
+def enqueue(kind, target_id, payload=None, delay=0, max_attempts=3):
+    now = time.time()
+    with get_connection() as conn:
+        item_id = conn.execute("""
+            INSERT INTO job_queue (kind, target_id, payload, max_attempts, run_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (kind, target_id, json.dumps(payload or {}), max_attempts, now + delay, now)).lastrowid
+    conn.close()
+    return item_id
+
+
+def claim():
+    # Oldest due row, or a running row whose claim ran out (its worker died)
+    now = time.time()
+    conn = get_connection()
+    try:
+        row = conn.execute("""
+            UPDATE job_queue
+            SET status = 'running', attempts = attempts + 1, claimed_until = ?
+            WHERE id = (
+                SELECT id FROM job_queue
+                WHERE (status = 'queued' AND run_at <= ?)
+                   OR (status = 'running' AND claimed_until < ?)
+                ORDER BY run_at
+                LIMIT 1
+            )
+            RETURNING *
+        """, (now + VISIBILITY_TIMEOUT, now, now)).fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    item = dict(row)
+    item["payload"] = json.loads(item["payload"] or "{}")
+    return item
+
+
+def renew(item):
+    # Extends the claim; False if the row was reclaimed or finished meanwhile
+    with get_connection() as conn:
+        renewed = conn.execute(
+            "UPDATE job_queue SET claimed_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (time.time() + VISIBILITY_TIMEOUT, item["id"], item["attempts"])
+        ).rowcount
+    conn.close()
+    return renewed > 0
+
+
+@contextmanager
+def lease(item):
+    # Renews the claim from a side thread for as long as the block runs
+    stop = threading.Event()
+
+    def keep_alive():
+        while not stop.wait(VISIBILITY_TIMEOUT / 3):
+            try:
+                if not renew(item):
+                    event_log.warning("queue_lease_lost", "⚠️ Lost the claim on queue item {item_id}",
+                                      item_id=item['id'])
+                    return
+            except sqlite3.OperationalError as e:
+                event_log.warning("queue_lease_failed", "⚠️ Could not renew queue item {item_id}: {error}",
+                                  item_id=item['id'], error=str(e))
+
+    threading.Thread(target=keep_alive, name=f"lease-{item['id']}", daemon=True).start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+def complete(item):
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE job_queue SET status = 'done', finished_at = ?, claimed_until = NULL WHERE id = ? AND attempts = ?",
+            (time.time(), item["id"], item["attempts"])
+        )
+    conn.close()
+
+
+def fail(item, error):
+    now = time.time()
+    with get_connection() as conn:
+        if item["attempts"] < item["max_attempts"]:
+            delay = RETRY_BACKOFF[min(item["attempts"], len(RETRY_BACKOFF)) - 1]
+            conn.execute("""
+                UPDATE job_queue SET status = 'queued', run_at = ?, claimed_until = NULL, last_error = ?
+                WHERE id = ? AND attempts = ?
+            """, (now + delay, error[:500], item["id"], item["attempts"]))
+        else:
+            conn.execute("""
+                UPDATE job_queue SET status = 'failed', finished_at = ?, claimed_until = NULL, last_error = ?
+                WHERE id = ? AND attempts = ?
+            """, (now, error[:500], item["id"], item["attempts"]))
+    conn.close()
+
+
+def drain(handlers, limit=50):
+    # Claims and runs due items until the queue is empty or `limit` is hit.
+    # Returns how many items were processed.
+    processed = 0
+    while processed < limit:
+        try:
+            item = claim()
+        except sqlite3.OperationalError as e:
+            event_log.error("queue_claim_failed", "⚠️ Queue claim failed: {error}", error=str(e))
+            break
+        if item is None:
+            break
+        processed += 1
+        handler = handlers.get(item["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"no handler for kind '{item['kind']}'")
+            with lease(item):
+                handler(item)
+        except Exception as e:
+            event_log.warning("queue_item_failed", "🔁 Queue item {item_id} ({kind} #{target_id}) attempt {attempt} failed: {error}",
+                              item_id=item['id'], kind=item['kind'], target_id=item['target_id'],
+                              attempt=item['attempts'], error=str(e))
+            try:
+                fail(item, str(e))
+            except sqlite3.OperationalError as db_error:
+                # Left as 'running'; it becomes claimable again after the visibility timeout
+                event_log.error("queue_item_stuck", "⚠️ Could not reschedule queue item {item_id}: {error}",
+                                item_id=item['id'], error=str(db_error))
+            continue
+        try:
+            complete(item)
+        except sqlite3.OperationalError as e:
+            event_log.error("queue_item_stuck", "⚠️ Could not complete queue item {item_id}: {error}", item_id=item['id'],
+                            error=str(e))
+    return processed
+
+
+def purge(older_than=KEEP_FINISHED):
+    with get_connection() as conn:
+        deleted = conn.execute(
+            "DELETE FROM job_queue WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - older_than,)
+        ).rowcount
+    conn.close()
+    return deleted
+
+
+def work_forever(handlers, poll=1.0):
+    # Standalone worker loop for runners that do not use scheduler.py
+    last_purge = time.time()
+    while True:
+        try:
+            if not drain(handlers):
+                time.sleep(poll)
+            if time.time() - last_purge >= 600:
+                purge()
+                last_purge = time.time()
+        except Exception as e:
+            event_log.error("queue_worker_error", "🔥 Queue worker error: {error}", error=str(e),
+                            traceback=traceback.format_exc())
+            time.sleep(poll)
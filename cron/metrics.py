@@ -0,0 +1,161 @@
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process metrics for the runners. Everything is pre-aggregated in memory
+# (counters, gauges and fixed-bucket histograms behind one lock), so recording
+# costs a dict lookup and an add. Nothing touches disk or the network until a
+# scrape on the localhost endpoint or the periodic file dump.
+#
+# Scrape:  curl http://127.0.0.1:9101/metrics   (cron_runner)
+#          curl http://127.0.0.1:9102/metrics   (cron_updateprice)
+#          curl http://127.0.0.1:9103/metrics   (scheduler)
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+LAG_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60, 300, 900]
+TICK_BUCKETS = [0.1, 0.5, 1, 2, 5, 10, 30, 60, 300]
+
+_lock = threading.Lock()
+_help = {}
+_types = {}
+_counters = {}    # (name, labels) -> value
+_gauges = {}      # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_buckets = {}     # name -> bucket bounds
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def describe(name, kind, help_text, buckets=None):
+    _help[name] = help_text
+    _types[name] = kind
+    if buckets is not None:
+        _buckets[name] = buckets
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def add_gauge(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    bounds = _buckets[name]
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(bounds) + 2)
+        hist[bisect.bisect_left(bounds, value)] += 1
+        hist[-1] += value
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render():
+    # Prometheus text exposition format
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: list(hist) for key, hist in _histograms.items()}
+    lines = []
+    for name in sorted(_types):
+        lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} {_types[name]}")
+        if _types[name] == "histogram":
+            bounds = _buckets[name]
+            for (metric, labels), hist in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(bounds + ["+Inf"], hist[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {round(hist[-1], 6)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        else:
+            values = counters if _types[name] == "counter" else gauges
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    # Plain dict copy for code that wants numbers rather than text
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "histograms": {key: list(hist) for key, hist in _histograms.items()},
+        }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    import event_log  # event_log imports this module
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        event_log.error("metrics_not_started", "⚠️ Metrics endpoint not started on {host}:{port}: {error}", host=host,
+                        port=port, error=str(e))
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    event_log.info("metrics_started", "📈 Metrics on http://{host}:{port}/metrics", host=host, port=port)
+    return server
+
+
+def start_file_dump(path, every=15):
+    # Rewrites `path` atomically every `every` seconds, for hosts where
+    # nothing can scrape the HTTP endpoint (node_exporter textfile dir etc.)
+    import event_log  # event_log imports this module
+    def loop():
+        while True:
+            time.sleep(every)
+            try:
+                tmp = f"{path}.tmp"
+                with open(tmp, "w") as f:
+                    f.write(render())
+                os.replace(tmp, path)
+            except OSError as e:
+                event_log.error("metrics_dump_failed", "⚠️ Metrics dump to {path} failed: {error}", path=path,
+                                error=str(e))
+
+    threading.Thread(target=loop, daemon=True).start()
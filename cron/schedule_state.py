@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import event_log
+
+# Last-run times of the runners' schedules, checkpointed to the log database
+# so a restart or deploy carries on where the previous process stopped
+# instead of firing every URL at once. Runs are marked in memory and written
+# in one batch at most every CHECKPOINT_SECONDS; a crash loses at most that
+# much, which only makes a few URLs run slightly early.
+#
+# Anything overdue (or never seen) when a process starts is spread over its
+# interval, capped at RAMP_SECONDS, by a stable hash of its key.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DATABASE = os.path.join(BASE_DIR, "../cronjobs_logs.db")
+CHECKPOINT_SECONDS = 30
+RAMP_SECONDS = 300
+
+STATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schedule_state (
+        runner TEXT NOT NULL,     -- 'cron_runner', 'scheduler'
+        key TEXT NOT NULL,        -- e.g. 'order:12', 'users:price:12'
+        last_run REAL NOT NULL,   -- unix seconds
+        PRIMARY KEY (runner, key)
+    ) WITHOUT ROWID
+"""
+
+
+def ramp_due(due, now, key, interval):
+    # Due time for `key` after a start-up: unchanged if still in the future,
+    # otherwise somewhere in [now, now + min(interval, RAMP_SECONDS))
+    if due > now:
+        return due
+    window = max(min(interval, RAMP_SECONDS), 1)
+    return now + (zlib.crc32(key.encode()) % int(window * 1000)) / 1000.0
+
+
+def restored_due(saved, key, interval, now):
+    last = saved.get(key)
+    return ramp_due(last + interval if last is not None else now, now, key, interval)
+
+
+class ScheduleState:
+    def __init__(self, runner, db_path=None):
+        self.runner = runner
+        self.db_path = db_path or STATE_DATABASE
+        self.lock = threading.Lock()
+        self.dirty = {}
+        self.last_checkpoint = time.time()
+
+    def load(self):
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                conn.execute(STATE_TABLE_SQL)
+                rows = conn.execute(
+                    "SELECT key, last_run FROM schedule_state WHERE runner = ?", (self.runner,)
+                ).fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            event_log.error("schedule_restore_failed", "⚠️ Could not restore schedule state, starting cold: {error}",
+                            error=str(e))
+            return {}
+        event_log.info("schedule_restored", "♻️ Restored {entries} schedule entries for {runner}", entries=len(rows),
+                       runner=self.runner)
+        return dict(rows)
+
+    def mark(self, key, last_run):
+        with self.lock:
+            self.dirty[key] = last_run
+
+    def checkpoint(self, force=False):
+        if not force and time.time() - self.last_checkpoint < CHECKPOINT_SECONDS:
+            return
+        self.last_checkpoint = time.time()
+        with self.lock:
+            batch, self.dirty = self.dirty, {}
+        if not batch:
+            return
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                conn.executemany("""
+                    INSERT INTO schedule_state (runner, key, last_run) VALUES (?, ?, ?)
+                    ON CONFLICT(runner, key) DO UPDATE SET last_run = excluded.last_run
+                """, [(self.runner, key, last_run) for key, last_run in batch.items()])
+            conn.close()
+        except sqlite3.Error as e:
+            event_log.error("schedule_checkpoint_failed", "⚠️ Schedule checkpoint failed, will retry: {error}", error=str(e))
+            with self.lock:
+                for key, last_run in batch.items():
+                    self.dirty.setdefault(key, last_run)
@@ -0,0 +1,553 @@
+import heapq
+import itertools
+from collections import deque
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import clock
+import control
+import cron_runner
+import cron_updateprice
+import dhru_sync
+import event_log
+import job_queue
+import metrics
+import schedule_state
+import tick_profiler
+
+# One process for everything cron_runner.py and cron_updateprice.py do.
+# Job sources (users' order/file/price URLs, Dhru Fusion order sync,
+# cron_jobs rows, job_queue items such as admin "Run now" and retries, log archiving)
+# are reloaded on their own refresh interval and turned into tasks. Tasks
+# wait in a heap ordered by due time; once due they move to a FairQueue
+# and a fixed worker pool drains it. The
+# dispatcher sleeps until the next task is due or a source needs reloading,
+# instead of waking every second.
+#
+# Usage: python cron/scheduler.py   (replaces running both runners)
+
+WORKERS = 32
+PRICE_INTERVAL = 1800
+# Dhru order-status mirror; customers still get their order_update_url polled
+# at the package interval, so this only has to keep the mirror reasonably fresh
+DHRU_SYNC_INTERVAL = 300
+ARCHIVE_INTERVAL = 600
+# job_queue pollers; each drains the queue then waits QUEUE_POLL_SECONDS
+QUEUE_WORKERS = 2
+QUEUE_POLL_SECONDS = 1
+# Within one tenant, lower runs first when more tasks are due than there are free workers
+PRIORITY = {"queue": 0, "order": 0, "file": 1, "job": 1, "price": 2, "dhru": 2, "archive": 3}
+# Tier weight is the package price; users without a package get this
+MIN_TIER_WEIGHT = 1
+# A run counts as late for its tier when it starts this share of its interval after due
+PROMISE_TOLERANCE = 0.25
+METRICS_PORT = 9103
+CONTROL_PORT = 9123
+METRICS_FILE = None
+PROFILE_ON_START = False
+# With the tick profiler on, a dispatcher pass (source reloads + dispatch)
+# longer than this is reported; jobs finished since the pass began are listed
+PASS_BUDGET_SECONDS = 1
+
+metrics.describe("scheduler_tasks", "gauge", "Tasks known to the scheduler by source")
+metrics.describe("scheduler_busy_workers", "gauge", "Workers currently running a task")
+metrics.describe("scheduler_lag_seconds", "histogram", "Task start time minus due time by source", metrics.LAG_BUCKETS)
+metrics.describe("scheduler_wakeups_total", "counter", "Dispatcher wakeups")
+metrics.describe("scheduler_task_errors_total", "counter", "Tasks that raised by source")
+metrics.describe("scheduler_tier_lag_seconds", "histogram", "Task start time minus due time by package tier", metrics.LAG_BUCKETS)
+metrics.describe("scheduler_tier_runs_total", "counter", "Runs by package tier")
+metrics.describe("scheduler_tier_late_total", "counter", "Runs that started more than PROMISE_TOLERANCE of their interval late, by package tier")
+metrics.describe("scheduler_tier_ready_tasks", "gauge", "Due tasks waiting for a worker by package tier")
+
+
+class Task:
+    __slots__ = ("key", "source", "priority", "interval", "run", "next_due", "tier", "weight", "tenant")
+
+    def __init__(self, key, source, priority, interval, run, next_due=None, tier=None, weight=MIN_TIER_WEIGHT,
+                 tenant=None):
+        self.key = key
+        self.source = source
+        self.priority = priority
+        self.interval = interval
+        self.run = run
+        self.next_due = next_due
+        # Tasks without a tier (queue pollers, maintenance) are dispatched first
+        self.tier = tier
+        self.weight = weight
+        self.tenant = tenant
+
+
+def load_tiers():
+    # users.active_package holds the package id (older rows the name)
+    tiers = {}
+    for row in cron_updateprice.execute_query_with_retry("SELECT id, name, price FROM packages"):
+        tier = (row['name'], max(float(row['price'] or 0), MIN_TIER_WEIGHT))
+        tiers[str(row['id'])] = tiers[row['name']] = tier
+    return tiers
+
+
+def tier_for(tiers, package):
+    return tiers.get(str(package), ("none", MIN_TIER_WEIGHT)) if package is not None else ("none", MIN_TIER_WEIGHT)
+
+
+class FairQueue:
+    # Due tasks waiting for a worker. Untiered tasks go first. Tiers share
+    # workers by stride scheduling: each pick advances the tier's pass by
+    # 1/weight, and the tier with the lowest pass goes next, so a tier that
+    # pays twice as much gets twice the slots while every tier keeps moving.
+    # Inside a tier, tenants take turns, so a tenant with many URLs cannot
+    # starve the others; a tenant's own tasks go by (priority, due).
+    def __init__(self):
+        self.system = []
+        self.tiers = {}
+        self.vtime = 0.0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, task, due, seq):
+        self.size += 1
+        if task.tier is None:
+            heapq.heappush(self.system, (task.priority, due, seq, task))
+            return
+        tier = self.tiers.get(task.tier)
+        if tier is None:
+            tier = self.tiers[task.tier] = {"pass": self.vtime, "weight": task.weight, "tenants": {},
+                                            "order": deque(), "size": 0}
+        elif tier["size"] == 0:
+            # An idle tier does not bank credit for the time it had nothing due
+            tier["pass"] = max(tier["pass"], self.vtime)
+        tier["weight"] = task.weight
+        tier["size"] += 1
+        tenant = tier["tenants"].get(task.tenant)
+        if tenant is None:
+            tenant = tier["tenants"][task.tenant] = []
+            tier["order"].append(task.tenant)
+        heapq.heappush(tenant, (task.priority, due, seq, task))
+
+    def pop(self):
+        if self.system:
+            self.size -= 1
+            return heapq.heappop(self.system)[3]
+        active = [(tier["pass"], name) for name, tier in self.tiers.items() if tier["size"]]
+        if not active:
+            return None
+        self.vtime, name = min(active)
+        tier = self.tiers[name]
+        tier["pass"] += 1.0 / tier["weight"]
+        tenant_key = tier["order"].popleft()
+        tenant = tier["tenants"][tenant_key]
+        task = heapq.heappop(tenant)[3]
+        if tenant:
+            tier["order"].append(tenant_key)
+        else:
+            del tier["tenants"][tenant_key]
+        tier["size"] -= 1
+        self.size -= 1
+        return task
+
+    def remove(self, task, tier_name, tenant_key):
+        # Takes out a queued task that was pushed under tier_name / tenant_key;
+        # returns its (due, seq), or None if it is not queued there
+        tier = None
+        if tier_name is None:
+            heap = self.system
+        else:
+            tier = self.tiers.get(tier_name)
+            heap = tier["tenants"].get(tenant_key) if tier else None
+        index = next((i for i, entry in enumerate(heap or ()) if entry[3] is task), None)
+        if index is None:
+            return None
+        entry = heap[index]
+        heap[index] = heap[-1]
+        heap.pop()
+        heapq.heapify(heap)
+        self.size -= 1
+        if tier is not None:
+            tier["size"] -= 1
+            if not heap:
+                del tier["tenants"][tenant_key]
+                tier["order"].remove(tenant_key)
+        return entry[1], entry[2]
+
+    def depth_by_tier(self):
+        return {name: tier["size"] for name, tier in self.tiers.items()}
+
+
+class UsersSource:
+    # Order/file URLs every package interval, price URLs every 30 minutes
+    name = "users"
+    refresh_every = 60
+    anchor_on_finish = False
+    persist_schedule = True
+
+    def __init__(self):
+        self.method_toggle = {}
+
+    def load(self):
+        users = cron_runner.get_active_users()
+        metrics.set_gauge("cron_active_users", len(users))
+        tiers = load_tiers()
+        intervals = {}
+        tasks = []
+        for user in users:
+            package = user['active_package']
+            if package not in intervals:
+                intervals[package] = cron_runner.get_package_interval(package)
+            tier, weight = tier_for(tiers, package)
+            for kind, interval in (("order", intervals[package]), ("file", intervals[package]),
+                                   ("price", PRICE_INTERVAL)):
+                url = user[f"{kind}_update_url"]
+                if url:
+                    tasks.append(Task((self.name, kind, user['id']), self.name, PRIORITY[kind], interval,
+                                      partial(self.run, user, kind, url),
+                                      tier=tier, weight=weight, tenant=user['id']))
+        return tasks
+
+    def run(self, user, kind, url):
+        # Order starts with GET and file with POST, then each alternates
+        # like the old per-tick toggle; price is always GET
+        key = (kind, user['id'])
+        toggle = self.method_toggle.get(key, True)
+        self.method_toggle[key] = not toggle
+        if kind == "order":
+            method = "GET" if toggle else "POST"
+        elif kind == "file":
+            method = "POST" if toggle else "GET"
+        else:
+            method = "GET"
+        cron_runner.hit_url(user, kind, method, url)
+
+
+class DhruSource:
+    # Active users with Dhru Fusion credentials and registered orders that are
+    # not final yet, synced every DHRU_SYNC_INTERVAL
+    name = "dhru"
+    refresh_every = 60
+    anchor_on_finish = True
+    persist_schedule = True
+
+    def load(self):
+        settings = dhru_sync.load_settings()
+        if not settings:
+            return []
+        pending = dhru_sync.users_with_pending_orders()
+        tiers = load_tiers()
+        tasks = []
+        for user in cron_runner.get_active_users():
+            if user['id'] not in settings or user['id'] not in pending:
+                continue
+            tier, weight = tier_for(tiers, user['active_package'])
+            tasks.append(Task((self.name, "sync", user['id']), self.name, PRIORITY["dhru"], DHRU_SYNC_INTERVAL,
+                              partial(dhru_sync.sync_user, user, settings[user['id']]),
+                              tier=tier, weight=weight, tenant=user['id']))
+        return tasks
+
+
+class CronJobsSource:
+    # cron_jobs rows; run_single_job sets last_run when it finishes, so the
+    # next run is counted from the end of the previous one. last_run is
+    # already persisted in cron_jobs, so no schedule_state entries.
+    name = "cron_jobs"
+    refresh_every = 30
+    anchor_on_finish = True
+    persist_schedule = False
+
+    def load(self):
+        jobs = cron_updateprice.execute_query_with_retry(
+            "SELECT * FROM cron_jobs WHERE status IN ('enable', 'online')"
+        )
+        packages = dict(cron_updateprice.execute_query_with_retry(
+            "SELECT id, active_package FROM users WHERE active_package IS NOT NULL"
+        ))
+        tiers = load_tiers()
+        now = clock.time()
+        tasks = []
+        for job in jobs:
+            # Jobs without an owner are their own tenant
+            owner = job['user_id'] if 'user_id' in job.keys() else None
+            tier, weight = tier_for(tiers, packages.get(owner))
+            tasks.append(Task((self.name, job['id']), self.name, PRIORITY["job"], job['interval'],
+                              partial(cron_updateprice.run_single_job, job),
+                              schedule_state.ramp_due((job['last_run'] or 0) + job['interval'], now,
+                                                      f"cron_jobs:{job['id']}", job['interval']),
+                              tier=tier, weight=weight,
+                              tenant=owner if owner is not None else f"job:{job['id']}"))
+        return tasks
+
+
+class QueueSource:
+    # Fixed set of poller tasks; run-now latency is at most QUEUE_POLL_SECONDS
+    name = "queue"
+    refresh_every = 3600
+    anchor_on_finish = True
+    persist_schedule = False
+
+    def load(self):
+        return [Task((self.name, worker), self.name, PRIORITY["queue"], QUEUE_POLL_SECONDS,
+                     partial(job_queue.drain, cron_updateprice.QUEUE_HANDLERS))
+                for worker in range(QUEUE_WORKERS)]
+
+
+class MaintenanceSource:
+    name = "maintenance"
+    refresh_every = 3600
+    anchor_on_finish = True
+    persist_schedule = False
+
+    def load(self):
+        return [Task((self.name, "archive"), self.name, PRIORITY["archive"], ARCHIVE_INTERVAL,
+                     self.run, clock.time() + ARCHIVE_INTERVAL)]
+
+    def run(self):
+        cron_runner.archive_logs()
+        event_log.info("queue_purged", "🧹 job_queue: purged {items} finished items.", items=job_queue.purge())
+
+
+def state_key(key):
+    return ":".join(str(part) for part in key)
+
+
+class Scheduler:
+    # With a ScheduleState, last runs are checkpointed and new tasks start
+    # from their saved due time (spread out if overdue) instead of now
+    def __init__(self, sources, workers=WORKERS, state=None):
+        self.sources = {source.name: source for source in sources}
+        self.state = state
+        self.saved = state.load() if state else {}
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.pool_size = workers
+        self.cond = threading.Condition()
+        self.tasks = {}
+        self.waiting = []  # (next_due, seq, task)
+        self.ready = FairQueue()
+        self.seq = itertools.count()
+        self.busy = 0
+        self.next_refresh = {name: 0 for name in self.sources}
+        self.running = False
+        self.in_progress = {}  # key -> start, for control.py
+
+    def _push(self, task):
+        heapq.heappush(self.waiting, (task.next_due, next(self.seq), task))
+
+    def refresh(self, source):
+        try:
+            fresh = source.load()
+        except Exception as e:
+            event_log.error("source_reload_failed", "⚠️ Scheduler: reloading {source} failed: {error}", source=source.name,
+                            error=str(e))
+            return
+        now = clock.time()
+        keys = set()
+        with self.cond:
+            for task in fresh:
+                keys.add(task.key)
+                current = self.tasks.get(task.key)
+                if current is not None:
+                    # Keep the schedule, pick up new rows/intervals and package tiers
+                    old_place = (current.tier, current.tenant)
+                    current.priority, current.interval, current.run = task.priority, task.interval, task.run
+                    current.tier, current.weight, current.tenant = task.tier, task.weight, task.tenant
+                    if (current.tier, current.tenant) != old_place:
+                        # Already due: move it to the queue of its new tier/tenant
+                        queued = self.ready.remove(current, *old_place)
+                        if queued is not None:
+                            self.ready.push(current, *queued)
+                    continue
+                if task.next_due is None:
+                    if self.state:
+                        task.next_due = schedule_state.restored_due(self.saved, state_key(task.key), task.interval, now)
+                    else:
+                        task.next_due = now
+                self.tasks[task.key] = task
+                self._push(task)
+            # Tasks whose row went away are dropped when they reach the top of a heap
+            for key in [key for key, task in self.tasks.items() if task.source == source.name and key not in keys]:
+                del self.tasks[key]
+            self.cond.notify()
+        metrics.set_gauge("scheduler_tasks", len(keys), source=source.name)
+
+    def _started(self, task):
+        start = clock.time()
+        self.in_progress[task.key] = start
+        lag = max(start - task.next_due, 0)
+        metrics.observe("scheduler_lag_seconds", lag, source=task.source)
+        if task.tier is not None:
+            metrics.observe("scheduler_tier_lag_seconds", lag, tier=task.tier)
+            metrics.inc("scheduler_tier_runs_total", tier=task.tier)
+            if lag > task.interval * PROMISE_TOLERANCE:
+                metrics.inc("scheduler_tier_late_total", tier=task.tier)
+        return start
+
+    def _finished(self, task, start):
+        if self.state and self.sources[task.source].persist_schedule:
+            self.state.mark(state_key(task.key), start)
+        with self.cond:
+            self.busy -= 1
+            self.in_progress.pop(task.key, None)
+            if self.tasks.get(task.key) is task:
+                anchor = clock.time() if self.sources[task.source].anchor_on_finish else start
+                task.next_due = anchor + task.interval
+                self._push(task)
+            self.cond.notify()
+
+    def _execute(self, task):
+        start = self._started(task)
+        try:
+            task.run()
+        except Exception as e:
+            metrics.inc("scheduler_task_errors_total", source=task.source)
+            event_log.error("task_failed", "🔥 Task {key} failed: {error}", key=state_key(task.key), error=str(e),
+                            traceback=traceback.format_exc())
+        finally:
+            self._finished(task, start)
+
+    # The virtual-time simulator (benchmarks/sim_schedule.py) replaces these two
+    def _submit(self, task):
+        self.pool.submit(self._execute, task)
+
+    def _wait(self, timeout):
+        clock.wait(self.cond, timeout)
+
+    def run(self):
+        self.running = True
+        while self.running:
+            tick_profiler.start_tick()
+            now = clock.time()
+            for name, source in self.sources.items():
+                if now >= self.next_refresh[name]:
+                    self.refresh(source)
+                    self.next_refresh[name] = clock.time() + source.refresh_every
+
+            with self.cond:
+                now = clock.time()
+                while self.waiting and self.waiting[0][0] <= now:
+                    due, seq, task = heapq.heappop(self.waiting)
+                    # A task forced through control.py has a second, earlier entry
+                    if self.tasks.get(task.key) is task and task.next_due == due:
+                        self.ready.push(task, due, seq)
+                while self.ready and self.busy < self.workers:
+                    task = self.ready.pop()
+                    if self.tasks.get(task.key) is not task:
+                        continue
+                    self.busy += 1
+                    self._submit(task)
+                metrics.set_gauge("cron_queue_depth", len(self.ready))
+                for tier, depth in self.ready.depth_by_tier().items():
+                    metrics.set_gauge("scheduler_tier_ready_tasks", depth, tier=tier)
+                metrics.set_gauge("scheduler_busy_workers", self.busy)
+            if self.state:
+                self.state.checkpoint()
+            tick_profiler.end_tick("scheduler pass", PASS_BUDGET_SECONDS)
+
+            with self.cond:
+                # Sleep until a source reload, the next due task, or a worker
+                # finishing (notify) when tasks are queued behind busy workers
+                wake = min(self.next_refresh.values())
+                if self.waiting and not self.ready:
+                    wake = min(wake, self.waiting[0][0])
+                elif self.ready and self.busy < self.workers:
+                    # A worker finished after the dispatch above; its notify
+                    # has already been missed
+                    wake = 0
+                if self.running:
+                    self._wait(max(wake - clock.time(), 0))
+                metrics.inc("scheduler_wakeups_total")
+        self.pool.shutdown(wait=True)
+        if self.state:
+            self.state.checkpoint(force=True)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    # --- control.py routes, answered from memory ---
+
+    def _describe(self, task, now):
+        return {"key": state_key(task.key), "source": task.source, "tier": task.tier, "tenant": task.tenant,
+                "interval": task.interval, "next_due": round(task.next_due, 3),
+                "due_in": round(task.next_due - now, 3)}
+
+    def queue_state(self, params):
+        limit = control.param(params, "limit", int, 50)
+        match = params.get("match")
+        now = clock.time()
+        with self.cond:
+            waiting = [task for due, _, task in self.waiting
+                       if self.tasks.get(task.key) is task and task.next_due == due
+                       and (not match or match in state_key(task.key))]
+            running = [{"key": state_key(key), "elapsed": round(now - start, 3)}
+                       for key, start in self.in_progress.items()]
+            summary = {"workers": self.workers, "busy": self.busy, "ready": len(self.ready),
+                       "ready_by_tier": self.ready.depth_by_tier(), "waiting": len(self.waiting),
+                       "tasks": len(self.tasks),
+                       "next_refresh": {name: round(due - now, 1) for name, due in self.next_refresh.items()}}
+        summary["running"] = sorted(running, key=lambda item: -item["elapsed"])
+        summary["next_due"] = [self._describe(task, now)
+                               for task in heapq.nsmallest(limit, waiting, key=lambda task: task.next_due)]
+        return summary
+
+    def run_now(self, params):
+        key = control.param(params, "key")
+        with self.cond:
+            task = next((task for task in self.tasks.values() if state_key(task.key) == key), None)
+            if task is None:
+                raise control.ControlError(f"no task {key}")
+            if task.key in self.in_progress:
+                raise control.ControlError(f"{key} is running")
+            if task.next_due <= clock.time():
+                raise control.ControlError(f"{key} is already due, waiting for a worker")
+            task.next_due = clock.time()
+            self._push(task)
+            self.cond.notify()
+        event_log.info("control_forced", "⏩ Control: forced {key}", key=key)
+        return self._describe(task, task.next_due)
+
+    def set_workers(self, params):
+        workers = control.param(params, "n", int)
+        if workers < 1:
+            raise control.ControlError("n must be at least 1")
+        with self.cond:
+            if workers > self.pool_size:
+                # Tasks already running finish on the old pool
+                old, self.pool = self.pool, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+                self.pool_size = workers
+                old.shutdown(wait=False)
+            self.workers = workers
+            self.cond.notify()
+        event_log.info("control_workers", "🎚️ Control: {workers} workers", workers=workers)
+        return {"workers": workers, "busy": self.busy}
+
+    def register_control(self):
+        control.route("GET", "/queue", self.queue_state,
+                      "workers, running tasks and the next due (?limit=50 &match=users:order)")
+        control.route("POST", "/run", self.run_now, "?key=users:order:12 run a task now")
+        control.route("POST", "/workers", self.set_workers, "?n= worker count")
+
+
+def default_sources():
+    return [UsersSource(), DhruSource(), CronJobsSource(), QueueSource(), MaintenanceSource()]
+
+
+if __name__ == "__main__":
+    event_log.info("runner_started", "🗓️ Scheduler started.")
+    tick_profiler.install_signal_handler()
+    if PROFILE_ON_START:
+        tick_profiler.enable()
+    metrics.start_http_server(METRICS_PORT)
+    if METRICS_FILE:
+        metrics.start_file_dump(METRICS_FILE)
+    cron_runner.ensure_history_schema()
+    cron_updateprice.ensure_last_run_column()
+    cron_updateprice.ensure_log_table()
+    job_queue.ensure_queue_table()
+    dhru_sync.ensure_dhru_tables()
+    engine = Scheduler(default_sources(), state=schedule_state.ScheduleState("scheduler"))
+    engine.register_control()
+    control.start_http_server(CONTROL_PORT)
+    engine.run()
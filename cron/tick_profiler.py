@@ -0,0 +1,166 @@
+import collections
+import logging
+import logging.handlers
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import event_log
+
+# Opt-in profiler for the runner loops. While enabled it
+#   - adds up time spent in the "db", "http" and "logging" phases of a tick
+#     (whatever is left over is reported as scheduling / other),
+#   - keeps the duration of every job run in the tick,
+#   - samples the stacks of the worker threads every SAMPLE_INTERVAL seconds.
+# When a tick runs over its budget the breakdown, the slowest jobs and the
+# hottest stacks go to REPORT_FILE (rotated). Ticks inside the budget only
+# reset the counters. Disabled, phase() and record_job() return immediately.
+#
+# Toggle at runtime with:  kill -USR1 <runner pid>
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_FILE = os.path.join(BASE_DIR, "../slow_ticks.log")
+REPORT_MAX_BYTES = 5 * 1024 * 1024
+REPORT_BACKUPS = 3
+SAMPLE_INTERVAL = 0.01
+STACK_DEPTH = 4
+TOP = 10
+PHASES = ("db", "http", "logging")
+
+enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_phases = {}
+_jobs = []
+_samples = collections.Counter()
+_tick_start = None
+_sampler = None
+_logger = None
+
+
+def _report_logger():
+    global _logger
+    if _logger is None:
+        _logger = logging.getLogger("slow_ticks")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        _logger.addHandler(logging.handlers.RotatingFileHandler(
+            REPORT_FILE, maxBytes=REPORT_MAX_BYTES, backupCount=REPORT_BACKUPS
+        ))
+    return _logger
+
+
+def _sample_loop():
+    me = threading.get_ident()
+    while enabled:
+        for ident, frame in sys._current_frames().items():
+            # Skip ourselves and threads parked in Event/Condition waits
+            if ident == me or frame.f_code.co_filename.endswith("threading.py"):
+                continue
+            stack = []
+            while frame is not None and len(stack) < STACK_DEPTH:
+                stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            with _lock:
+                _samples[" <- ".join(stack)] += 1
+        time.sleep(SAMPLE_INTERVAL)
+
+
+def enable():
+    global enabled, _sampler
+    enabled = True
+    if _sampler is None or not _sampler.is_alive():
+        _sampler = threading.Thread(target=_sample_loop, daemon=True)
+        _sampler.start()
+
+
+def disable():
+    global enabled, _tick_start
+    enabled = False
+    _tick_start = None
+
+
+def toggle(signum=None, frame=None):
+    if enabled:
+        disable()
+    else:
+        enable()
+    # Usually runs as the SIGUSR1 handler, which may have interrupted the
+    # main thread inside event_log's queue lock; log from a thread instead
+    threading.Thread(target=event_log.info, daemon=True, args=(
+        "tick_profiler_toggled", "🔬 Tick profiler {state} (reports in {report_file})"
+    ), kwargs={"state": "enabled" if enabled else "disabled", "report_file": REPORT_FILE}).start()
+
+
+def install_signal_handler():
+    # Must be called from the main thread
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, toggle)
+
+
+@contextmanager
+def phase(name):
+    # Nested phases count towards the outermost one (log_history -> "logging",
+    # not the execute_with_retry "db" call inside it)
+    if not enabled or getattr(_local, "phase", None):
+        yield
+        return
+    _local.phase = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.phase = None
+        with _lock:
+            _phases[name] = _phases.get(name, 0) + elapsed
+
+
+def record_job(label, seconds):
+    if enabled and _tick_start is not None:
+        with _lock:
+            _jobs.append((seconds, label))
+
+
+def start_tick():
+    global _tick_start
+    if not enabled:
+        _tick_start = None
+        return
+    with _lock:
+        _phases.clear()
+        _jobs.clear()
+        _samples.clear()
+    _tick_start = time.perf_counter()
+
+
+def end_tick(name, budget):
+    if not enabled or _tick_start is None:
+        return
+    duration = time.perf_counter() - _tick_start
+    if duration <= budget:
+        return
+    with _lock:
+        phases = dict(_phases)
+        jobs = sorted(_jobs, reverse=True)[:TOP]
+        job_count = len(_jobs)
+        samples = _samples.most_common(TOP)
+        sample_count = sum(_samples.values())
+
+    lines = [f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {name} took {duration:.3f}s (budget {budget}s), {job_count} jobs"]
+    # Phase times are summed over threads, so they can exceed the wall time
+    for key in PHASES:
+        lines.append(f"  {key:<12}{phases.get(key, 0):9.3f}s")
+    lines.append(f"  {'scheduling':<12}{max(duration - sum(phases.values()), 0):9.3f}s")
+    lines.append("  slowest jobs:")
+    lines.extend(f"    {seconds:8.3f}s  {label}" for seconds, label in jobs)
+    lines.append(f"  hottest stacks ({sample_count} samples):")
+    lines.extend(f"    {count:6}  {stack}" for stack, count in samples)
+    try:
+        _report_logger().info("\n".join(lines) + "\n")
+    except OSError as e:
+        event_log.error("tick_report_failed", "⚠️ Could not write slow tick report: {error}", error=str(e))
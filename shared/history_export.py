@@ -0,0 +1,68 @@
+import csv
+import io
+import itertools
+import json
+import zlib
+
+from flask import Response, stream_with_context
+
+# History downloads (admin /history/export, userpanel /cronjob_history/export)
+# as CSV or NDJSON, optionally gzip'd. Rows are pulled from the cursor one
+# at a time, so memory stays flat no matter how many rows match the filter.
+# The CSV header goes out before the first row, so an empty result is still
+# a valid file (and a valid gzip member).
+
+MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def stream(connect, sql, params, fmt, use_gzip, extra_rows=None):
+    # connect() opens the connection the query runs on. extra_rows, if given,
+    # is a callable taking that connection and returning more dicts (e.g.
+    # archived rows) to append after the query's rows.
+    conn = connect()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(chunk.encode()) if compressor else chunk
+
+    try:
+        cursor = conn.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        if fmt == "csv":
+            writer.writerow(columns)
+            chunk = take()
+            if chunk:
+                yield chunk
+
+        rows = cursor
+        if extra_rows:
+            rows = itertools.chain(cursor, ([row.get(col) for col in columns] for row in extra_rows(conn)))
+
+        for row in rows:
+            if fmt == "csv":
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row))) + "\n")
+            chunk = take()
+            if chunk:
+                yield chunk
+
+        if compressor:
+            yield compressor.flush()
+    finally:
+        conn.close()
+
+
+def response(connect, sql, params, fmt, use_gzip, filename, extra_rows=None):
+    # Streaming download named filename.<fmt>[.gz]
+    filename = f"{filename}.{fmt}" + (".gz" if use_gzip else "")
+    return Response(
+        stream_with_context(stream(connect, sql, params, fmt, use_gzip, extra_rows)),
+        mimetype="application/gzip" if use_gzip else MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
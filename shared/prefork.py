@@ -0,0 +1,75 @@
+import os
+import signal
+import socket
+import time
+
+from werkzeug.serving import make_server
+
+import event_log
+
+# Production serving: the parent binds the port once and forks `workers`
+# processes that all accept on it, each a threaded werkzeug server. The
+# parent only restarts workers that die and passes SIGTERM / Ctrl-C on.
+# Workers share nothing in memory; use shared_cache.py for cached reads.
+#
+#   python app.py --workers 4
+#
+# Imported from shared/ by both admin and userpanel, which also put ../cron
+# on sys.path for event_log (forked workers restart its writer thread).
+
+LISTEN_BACKLOG = 1024
+RESTART_DELAY = 1
+
+
+def serve(app, host, port, workers, on_worker_start=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+
+    children = {}  # pid -> worker index
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                if on_worker_start is not None:
+                    on_worker_start(index)
+                make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+            finally:
+                event_log.flush(1)
+                os._exit(1)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for index in range(workers):
+        spawn(index)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    event_log.info("web_serving", "🚀 Serving on http://{host}:{port} with {workers} workers (pid {pid})",
+                   host=host, port=port, workers=workers, pid=os.getpid())
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            event_log.warning("web_worker_restarted", "⚠️ Worker {index} (pid {pid}) exited with status {status}, restarting",
+                              index=index, pid=pid, status=status)
+            time.sleep(RESTART_DELAY)
+            spawn(index)
+    sock.close()
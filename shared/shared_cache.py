@@ -0,0 +1,153 @@
+import fcntl
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+import event_log
+
+# Read-through cache for hot, read-mostly rows (packages, user profiles,
+# dashboard counts), shared by every worker process of admin and userpanel.
+# Both apps import this module from shared/ and point at the same files in
+# the project root.
+#
+#   versions  VERSIONS_FILE, SLOTS 64-bit counters mmap'd by every process.
+#             invalidate(namespace) bumps the namespace's counter, so every
+#             process sees the change on its next read without a query.
+#   shared    CACHE_DATABASE holds the last loaded value of each key tagged
+#             with the version it was loaded under; a worker that starts
+#             cold or sees a new version reloads from here before running
+#             the loader against the real database.
+#   local     a per-process dict in front of both.
+#
+# Values must be JSON-serialisable: loaders return dicts / lists of dicts,
+# not sqlite3.Row. Anything that writes the underlying tables must call
+# invalidate() for the namespaces it touches; TTL bounds the staleness for
+# writers that cannot (the runners).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DATABASE = os.path.join(BASE_DIR, "../app_cache.db")
+VERSIONS_FILE = os.path.join(BASE_DIR, "../app_cache.versions")
+SLOTS = 64
+TTL = 300
+LOCAL_MAX_ENTRIES = 10000
+
+_lock = threading.Lock()
+_local = {}  # (namespace, key) -> (version, expires, value)
+_versions = None
+_schema_ready = False
+_MISSING = object()
+
+
+def _slot(namespace):
+    return zlib.crc32(namespace.encode()) % SLOTS * 8
+
+
+def _versions_map():
+    global _versions
+    if _versions is None:
+        with _lock:
+            if _versions is None:
+                fd = os.open(VERSIONS_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if os.fstat(fd).st_size < SLOTS * 8:
+                        os.ftruncate(fd, SLOTS * 8)
+                    _versions = mmap.mmap(fd, SLOTS * 8)
+                finally:
+                    os.close(fd)
+    return _versions
+
+
+def version(namespace):
+    return struct.unpack_from("<Q", _versions_map(), _slot(namespace))[0]
+
+
+def invalidate(*namespaces):
+    versions = _versions_map()
+    with open(VERSIONS_FILE, "rb+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            for namespace in namespaces:
+                offset = _slot(namespace)
+                struct.pack_into("<Q", versions, offset, struct.unpack_from("<Q", versions, offset)[0] + 1)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _connect():
+    global _schema_ready
+    conn = sqlite3.connect(CACHE_DATABASE, timeout=5)
+    if not _schema_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                expires REAL NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        """)
+        _schema_ready = True
+    return conn
+
+
+def _read_shared(namespace, key, current, now):
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT value, expires FROM cache_entries WHERE namespace = ? AND key = ? AND version = ? AND expires > ?",
+                (namespace, key, current, now)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        # The cache is only an optimisation; fall through to the loader
+        event_log.warning("shared_cache_read_failed", "⚠️ Shared cache read failed ({namespace}/{key}): {error}",
+                          namespace=namespace, key=key, error=str(e))
+        return _MISSING
+    return (json.loads(row[0]), row[1]) if row is not None else _MISSING
+
+
+def _write_shared(namespace, key, current, expires, value):
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, version, expires, value) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, current, expires, json.dumps(value, default=str))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        event_log.warning("shared_cache_write_failed", "⚠️ Shared cache write failed ({namespace}/{key}): {error}",
+                          namespace=namespace, key=key, error=str(e))
+
+
+def get(namespace, key, loader, ttl=TTL):
+    key = str(key)
+    current = version(namespace)
+    now = time.time()
+    entry = _local.get((namespace, key))
+    if entry is not None and entry[0] == current and entry[1] > now:
+        return entry[2]
+
+    shared = _read_shared(namespace, key, current, now)
+    if shared is _MISSING:
+        value, expires = loader(), now + ttl
+        _write_shared(namespace, key, current, expires, value)
+    else:
+        value, expires = shared
+
+    with _lock:
+        if len(_local) >= LOCAL_MAX_ENTRIES:
+            _local.clear()
+        _local[(namespace, key)] = (current, expires, value)
+    return value
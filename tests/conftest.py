@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import sys
+import types
+
+import pytest
+
+# The runner modules import each other by bare name, as when started from
+# cron/; the web apps are loaded from their files like benchmarks/ does.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(ROOT, "cron"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from common import load_app  # noqa: E402
+
+CONFIG_SCHEMA = [
+    """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        mobile TEXT,
+        domain TEXT,
+        active_package TEXT,
+        expair_date TEXT,
+        order_update_url TEXT,
+        price_update_url TEXT,
+        file_update_url TEXT,
+        status TEXT DEFAULT 'Enable'
+    )
+    """,
+    """
+    CREATE TABLE cron_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        domain TEXT NOT NULL,
+        url TEXT NOT NULL,
+        status TEXT NOT NULL,
+        interval INTEGER NOT NULL,
+        last_run INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE packages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        validity INTEGER NOT NULL,
+        price REAL NOT NULL,
+        interval TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'enabled'
+    )
+    """,
+    """
+    CREATE TABLE dhru_settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        api_url TEXT NOT NULL,
+        api_username TEXT NOT NULL,
+        api_key TEXT NOT NULL
+    )
+    """,
+]
+
+LOG_SCHEMA = [
+    """
+    CREATE TABLE updateprice_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cron_job_id INTEGER,
+        url TEXT,
+        status_code INTEGER,
+        response_time REAL,
+        result TEXT,
+        ran_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+@pytest.fixture
+def databases(tmp_path):
+    # Empty config and log databases with the current schema
+    import cron_runner
+
+    config = str(tmp_path / "cronjobs.db")
+    logs = str(tmp_path / "cronjobs_logs.db")
+    conn = sqlite3.connect(config)
+    for sql in CONFIG_SCHEMA:
+        conn.execute(sql)
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(logs)
+    for sql in LOG_SCHEMA + [cron_runner.HISTORY_TABLE_SQL]:
+        conn.execute(sql)
+    conn.commit()
+    conn.close()
+    return types.SimpleNamespace(config=config, logs=logs)
+
+
+@pytest.fixture(scope="session")
+def admin_module():
+    return load_app("admin_app", os.path.join(ROOT, "admin", "app.py"))
+
+
+@pytest.fixture
+def admin(admin_module, databases, tmp_path, monkeypatch):
+    # Logged-in test client for admin/app.py on the temporary databases
+    monkeypatch.setattr(admin_module, "DATABASE", databases.config)
+    monkeypatch.setattr(admin_module, "LOG_DATABASE", databases.logs)
+    monkeypatch.setattr(admin_module, "list_indexes_ready", False)
+    monkeypatch.setattr(admin_module.history_archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    cache = admin_module.shared_cache
+    monkeypatch.setattr(cache, "CACHE_DATABASE", str(tmp_path / "app_cache.db"))
+    monkeypatch.setattr(cache, "VERSIONS_FILE", str(tmp_path / "app_cache.versions"))
+    monkeypatch.setattr(cache, "_versions", None)
+    monkeypatch.setattr(cache, "_schema_ready", False)
+    cache._local.clear()
+
+    client = admin_module.app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+        session["role"] = "admin"
+    return types.SimpleNamespace(module=admin_module, client=client, config=databases.config, logs=databases.logs)
+
+
+@pytest.fixture
+def runner(databases, monkeypatch):
+    # cron_runner (and the modules writing through it) on the temporary databases
+    import cron_runner
+
+    monkeypatch.setattr(cron_runner, "DATABASE", databases.config)
+    monkeypatch.setattr(cron_runner, "LOG_DATABASE", databases.logs)
+    cron_runner.ensure_history_schema()
+    return cron_runner
+
+
+@pytest.fixture(scope="session")
+def userpanel_module():
+    return load_app("userpanel_app", os.path.join(ROOT, "userpanel", "app.py"))
+
+
+@pytest.fixture
+def userpanel(userpanel_module, databases, tmp_path, monkeypatch):
+    # Anonymous test client for userpanel/app.py on the temporary databases
+    monkeypatch.setattr(userpanel_module, "DATABASE", databases.config)
+    monkeypatch.setattr(userpanel_module, "LOG_DATABASE", databases.logs)
+    cache = userpanel_module.shared_cache
+    monkeypatch.setattr(cache, "CACHE_DATABASE", str(tmp_path / "app_cache.db"))
+    monkeypatch.setattr(cache, "VERSIONS_FILE", str(tmp_path / "app_cache.versions"))
+    monkeypatch.setattr(cache, "_versions", None)
+    monkeypatch.setattr(cache, "_schema_ready", False)
+    cache._local.clear()
+    client = userpanel_module.app.test_client()
+    return types.SimpleNamespace(module=userpanel_module, client=client, config=databases.config, logs=databases.logs)
@@ -0,0 +1,157 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def numbers():
+    # A bare table with gaps in its ids, as left by deletions
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, even INTEGER)")
+    conn.executemany("INSERT INTO items VALUES (?, ?)", [(i, i % 2 == 0) for i in range(1, 60) if i % 7])
+    yield conn
+    conn.close()
+
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+
+def walk(module, conn, conditions=(), params=(), per_page=5, descending=False):
+    # Follows next cursors to the end, then prev cursors back to the start
+    page = module.keyset_page(conn, "SELECT * FROM items t", conditions, params, per_page, descending=descending)
+    forward = [page]
+    while page[2] is not None:
+        page = module.keyset_page(conn, "SELECT * FROM items t", conditions, params, per_page,
+                                  after=page[2], descending=descending)
+        forward.append(page)
+    backward = [page]
+    while page[1] is not None:
+        page = module.keyset_page(conn, "SELECT * FROM items t", conditions, params, per_page,
+                                  before=page[1], descending=descending)
+        backward.append(page)
+    return forward, backward[::-1]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_cursors_walk_every_row_once_both_ways(admin_module, numbers, descending):
+    expected = sorted((i for i in range(1, 60) if i % 7), reverse=descending)
+    forward, backward = walk(admin_module, numbers, descending=descending)
+    assert [i for rows, _, _ in forward for i in ids(rows)] == expected
+    assert [ids(rows) for rows, _, _ in backward] == [ids(rows) for rows, _, _ in forward]
+    assert forward[0][1] is None and forward[-1][2] is None
+    assert all(len(rows) == 5 for rows, _, _ in forward[:-1])
+
+
+def test_cursors_respect_filters(admin_module, numbers):
+    forward, backward = walk(admin_module, numbers, ["t.even = ?"], [1], per_page=4)
+    assert [i for rows, _, _ in forward for i in ids(rows)] == [i for i in range(2, 60, 2) if i % 7]
+    assert [ids(rows) for rows, _, _ in backward] == [ids(rows) for rows, _, _ in forward]
+
+
+def test_exact_page_multiple_has_no_empty_last_page(admin_module, numbers):
+    numbers.execute("DELETE FROM items WHERE id > 12")
+    rows, prev_cursor, next_cursor = admin_module.keyset_page(numbers, "SELECT * FROM items t", [], [], 5, after=5)
+    assert ids(rows) == [6, 8, 9, 10, 11] and (prev_cursor, next_cursor) == (6, 11)
+    rows, prev_cursor, next_cursor = admin_module.keyset_page(numbers, "SELECT * FROM items t", [], [], 5, after=11)
+    assert ids(rows) == [12] and next_cursor is None
+
+
+def test_cursor_past_the_end_is_empty(admin_module, numbers):
+    assert admin_module.keyset_page(numbers, "SELECT * FROM items t", [], [], 5, after=1000) == ([], None, None)
+
+
+def test_parse_id_cursor(admin_module):
+    assert admin_module.parse_id_cursor("42") == 42
+    assert admin_module.parse_id_cursor(None) is None
+    assert admin_module.parse_id_cursor("42; DROP TABLE users") is None
+
+
+def test_interval_seconds(admin_module):
+    assert admin_module.interval_seconds(30) == 30
+    assert admin_module.interval_seconds("5 minutes") == 300
+    assert admin_module.interval_seconds("1 Hour") == 3600
+    assert admin_module.interval_seconds("2 days") == 172800
+    assert admin_module.interval_seconds("") is None
+    assert admin_module.interval_seconds("soon") is None
+
+
+@pytest.fixture
+def rendered(admin, monkeypatch):
+    # Template context of the last render_template call
+    context = {}
+
+    def render_template(name, **kwargs):
+        context.clear()
+        context.update(kwargs, template=name)
+        return ""
+
+    monkeypatch.setattr(admin.module, "render_template", render_template)
+    return context
+
+
+def add_rows(admin, sql, rows):
+    conn = sqlite3.connect(admin.config)
+    conn.executemany(sql, rows)
+    conn.commit()
+    conn.close()
+
+
+def test_cron_list_pages_and_filters(admin, rendered):
+    add_rows(admin, "INSERT INTO cron_jobs (domain, url, status, interval) VALUES (?, ?, ?, 60)",
+             [(f"{'a' if i % 3 else 'b'}.example", f"http://x/{i}", "online" if i % 2 else "offline")
+              for i in range(1, 61)])
+    admin.client.get("/cron-list")
+    assert [job["id"] for job in rendered["jobs"]] == list(range(1, 26))
+    assert (rendered["total"], rendered["prev_cursor"], rendered["next_cursor"]) == (60, None, 25)
+
+    admin.client.get("/cron-list?after=25")
+    assert [job["id"] for job in rendered["jobs"]] == list(range(26, 51))
+    admin.client.get(f"/cron-list?before={rendered['prev_cursor']}")
+    assert [job["id"] for job in rendered["jobs"]] == list(range(1, 26))
+
+    admin.client.get("/cron-list?domain=B.example&status=offline")
+    assert [job["id"] for job in rendered["jobs"]] == [i for i in range(1, 61) if i % 3 == 0 and i % 2 == 0]
+    assert rendered["total"] == 10 and rendered["next_cursor"] is None
+
+
+def test_cron_list_next_run_only_for_jobs_the_runner_picks_up(admin, rendered):
+    add_rows(admin, "INSERT INTO cron_jobs (domain, url, status, interval) VALUES ('a.example', ?, ?, 60)",
+             [(f"http://x/{status}", status) for status in ("enable", "online", "offline", "disable")])
+    admin.client.get("/cron-list")
+    assert {job["status"]: job["next_run"] for job in rendered["jobs"]} == {
+        "enable": 60, "online": 60, "offline": None, "disable": None}
+
+
+def test_manage_clients_pages_newest_first(admin, rendered):
+    add_rows(admin, "INSERT INTO users (name, email, password, domain, status) VALUES (?, ?, 'x', ?, ?)",
+             [(f"user{i}", f"u{i}@example.com", f"d{i}.example", "Enable" if i % 2 else "Disable")
+              for i in range(1, 26)])
+    admin.client.get("/manage-clients")
+    assert [client["id"] for client in rendered["clients"]] == list(range(25, 15, -1))
+    assert rendered["next_cursor"] == 16
+
+    admin.client.get("/manage-clients?after=16")
+    assert [client["id"] for client in rendered["clients"]] == list(range(15, 5, -1))
+    admin.client.get(f"/manage-clients?before={rendered['prev_cursor']}")
+    assert [client["id"] for client in rendered["clients"]] == list(range(25, 15, -1))
+
+    admin.client.get("/manage-clients?status=Disable")
+    assert [client["id"] for client in rendered["clients"]] == list(range(24, 4, -2))[:10]
+    assert rendered["total"] == 12
+
+
+def test_user_search_escapes_wildcards_and_matches_ids(admin):
+    add_rows(admin, "INSERT INTO users (name, email, password, domain) VALUES (?, ?, 'x', ?)", [
+        ("Ann", "a_b@example.com", "ann.example"),
+        ("Bob", "axb@example.com", "bob.example"),
+        ("Cy", "100%@example.com", "cy.example"),
+    ])
+    search = lambda q: [user["email"] for user in admin.client.get("/users/search", query_string={"q": q}).get_json()]
+    assert search("a_b") == ["a_b@example.com"]
+    assert search("A") == ["a_b@example.com", "axb@example.com"]
+    assert search("100%") == ["100%@example.com"]
+    assert search("bob.") == ["axb@example.com"]
+    assert search("3") == ["100%@example.com"]
+    assert search("") == []
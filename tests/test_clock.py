@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+
+import clock
+import cron_runner
+import cron_updateprice
+
+START = 1_700_000_000  # 2023-11-14 22:13:20 UTC, 2023-11-15 04:13:20 in Dhaka
+
+
+@pytest.fixture
+def virtual():
+    previous = clock.CLOCK
+    yield clock.use(clock.VirtualClock(START))
+    clock.use(previous)
+
+
+def test_virtual_time_only_moves_when_something_sleeps(virtual):
+    assert clock.time() == START
+    assert clock.time() == START
+    clock.sleep(90)
+    clock.sleep(-5)
+    clock.sleep(None)
+    assert clock.time() == START + 90
+
+
+def test_advance_to_never_goes_backwards(virtual):
+    virtual.advance_to(START + 10)
+    virtual.advance_to(START + 5)
+    assert clock.time() == START + 10
+
+
+def test_wait_returns_at_once_after_the_timeout(virtual):
+    cond = threading.Condition()
+    with cond:
+        assert clock.wait(cond, 30) is False
+    assert clock.time() == START + 30
+
+
+def test_now_follows_virtual_time(virtual):
+    assert clock.now(cron_runner.BD_TZ).strftime("%Y-%m-%d %H:%M:%S") == "2023-11-15 04:13:20"
+    clock.sleep(3600)
+    assert clock.now() == datetime.fromtimestamp(START + 3600)
+
+
+def test_history_timestamps_follow_the_clock(virtual, runner, monkeypatch):
+    monkeypatch.setattr(cron_runner, "last_history_ts", 0)
+    user = {"id": 1, "email": "a@example.com", "domain": "a.example"}
+    cron_runner.log_history(user, "order", "GET", status_code=200, latency_ms=50, url="http://a.example/order")
+    clock.sleep(60)
+    cron_runner.log_history(user, "order", "GET", status_code=200, latency_ms=50, url="http://a.example/order")
+
+    conn = sqlite3.connect(runner.LOG_DATABASE)
+    assert [ts for ts, in conn.execute("SELECT ts FROM cron_history ORDER BY id")] == [START, START + 60]
+    assert conn.execute("SELECT last_run FROM cron_url_stats").fetchone()[0] == "2023-11-15 04:14:20"
+    conn.close()
+
+
+def test_history_timestamps_never_go_backwards(virtual, monkeypatch):
+    monkeypatch.setattr(cron_runner, "last_history_ts", START + 100)
+    assert cron_runner.next_history_ts() == START + 100
+    virtual.advance_to(START + 200)
+    assert cron_runner.next_history_ts() == START + 200
+
+
+def test_manual_history_uses_the_clock(virtual, databases, monkeypatch):
+    monkeypatch.setattr(cron_updateprice, "DATABASE", databases.config)
+    conn = sqlite3.connect(databases.config)
+    conn.execute("CREATE TABLE manual_history (id INTEGER PRIMARY KEY, job_id INTEGER, domain TEXT, "
+                 "result TEXT, timestamp TEXT)")
+    conn.execute("INSERT INTO cron_jobs (domain, url, status, interval) VALUES ('a.example', 'http://a/', 'active', 60)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(cron_updateprice, "run_single_job", lambda job, force=False: (True, "200 OK"))
+
+    cron_updateprice.run_queued_job({"target_id": 1, "payload": {"manual": True}})
+    conn = sqlite3.connect(databases.config)
+    expected = datetime.fromtimestamp(START).strftime("%Y-%m-%d %H:%M:%S")
+    assert conn.execute("SELECT result, timestamp FROM manual_history").fetchone() == ("200 OK", expected)
+    conn.close()
@@ -0,0 +1,161 @@
+import sqlite3
+
+import pytest
+
+import dhru_mirror
+import dhru_sync
+import http_client
+import stub_dhru
+
+USER = {"id": 1, "email": "a@example.com", "domain": "a.example"}
+
+
+@pytest.fixture
+def dhru(runner, monkeypatch):
+    monkeypatch.setattr(http_client, "_limiters", {})
+    monkeypatch.setattr(http_client, "HOST_RATE", 1000)
+    monkeypatch.setattr(http_client, "HOST_BURST", 1000)
+    dhru_sync.ensure_dhru_tables()
+    stub = stub_dhru.StubDhru(progress=1.0).start()
+    settings = {"api_url": stub.base_url, "api_username": stub_dhru.USERNAME, "api_key": stub_dhru.API_KEY}
+    yield stub, settings
+    stub.stop()
+
+
+def orders(runner):
+    conn = sqlite3.connect(runner.LOG_DATABASE)
+    result = dict(conn.execute("SELECT order_id, status FROM dhru_orders WHERE user_id = ?", (USER["id"],)))
+    conn.close()
+    return result
+
+
+def test_stub_order_ids_are_sparse(dhru):
+    stub, settings = dhru
+    ids = stub.add_orders(100)
+    assert ids[0] >= stub_dhru.FIRST_ORDER_ID
+    assert ids == sorted(ids)
+    assert ids[-1] - ids[0] > len(ids)
+
+
+def test_nothing_registered_means_no_calls(dhru):
+    stub, settings = dhru
+    stub.add_orders(10)
+    assert dhru_sync.sync_user(USER, settings) == 0
+    assert stub.calls == 0
+
+
+def test_registered_sparse_orders_are_synced(dhru, runner):
+    stub, settings = dhru
+    ids = stub.add_orders(120)
+    assert dhru_sync.register_orders(USER["id"], ids) == 120
+    assert dhru_sync.register_orders(USER["id"], ids[:5]) == 0
+
+    assert dhru_sync.sync_user(USER, settings) == 120
+    assert stub.calls == 3  # ceil(120 / BATCH_SIZE)
+    assert stub.orders_returned == 120
+    assert all(status is not None for status in orders(runner).values())
+
+    conn = sqlite3.connect(runner.LOG_DATABASE)
+    assert conn.execute("SELECT kind, status_code FROM cron_history").fetchall() == [("dhru", 200)]
+    conn.close()
+
+
+def test_only_orders_not_yet_final_are_polled(dhru, runner):
+    stub, settings = dhru
+    ids = stub.add_orders(60)
+    dhru_sync.register_orders(USER["id"], ids)
+    for _ in range(20):
+        dhru_sync.sync_user(USER, settings)
+        pending = [order_id for order_id, status in orders(runner).items() if status not in dhru_mirror.FINAL_STATUSES]
+        if not pending:
+            break
+    assert not pending
+    returned = stub.orders_returned
+    calls = stub.calls
+    assert dhru_sync.sync_user(USER, settings) == 0
+    assert (stub.calls, stub.orders_returned) == (calls, returned)
+
+
+def test_ids_unknown_to_the_api_stay_unsynced(dhru, runner):
+    stub, settings = dhru
+    ids = stub.add_orders(3)
+    dhru_sync.register_orders(USER["id"], ids + [ids[-1] + 1])
+    assert dhru_sync.sync_user(USER, settings) == 3
+    assert orders(runner)[ids[-1] + 1] is None
+
+
+def test_api_errors_are_recorded(dhru, runner):
+    stub, settings = dhru
+    dhru_sync.register_orders(USER["id"], stub.add_orders(2))
+    assert dhru_sync.sync_user(USER, dict(settings, api_key="wrong")) == 0
+    conn = sqlite3.connect(runner.LOG_DATABASE)
+    assert "Authentication Failed" in conn.execute("SELECT last_error FROM dhru_sync_state").fetchone()[0]
+    assert conn.execute("SELECT kind, error_class FROM cron_history").fetchall() == [("dhru", "DhruError")]
+    conn.close()
+
+
+def add_customer(userpanel):
+    conn = sqlite3.connect(userpanel.config)
+    conn.execute("INSERT INTO users (name, email, password, domain) VALUES ('a', 'a@example.com', 'x', 'a.example')")
+    conn.execute("INSERT INTO dhru_settings (user_id, api_url, api_username, api_key) "
+                 "VALUES (1, 'http://dhru.test', 'bench', 'secret')")
+    conn.commit()
+    conn.close()
+
+
+def test_orders_endpoint_registers_and_reports(userpanel):
+    add_customer(userpanel)
+    form = {"email": "a@example.com", "api_key": "secret", "order_ids": "10452, 10478 10452"}
+    response = userpanel.client.post("/api/dhru/orders", data=form)
+    assert response.status_code == 200
+    assert response.get_json() == {"registered": 2, "orders": {"10452": {"status": None, "code": None},
+                                                              "10478": {"status": None, "code": None}}}
+
+    conn = sqlite3.connect(userpanel.logs)
+    conn.execute("UPDATE dhru_orders SET status = 4, code = 'ABC' WHERE order_id = 10478")
+    conn.commit()
+    conn.close()
+    response = userpanel.client.post("/api/dhru/orders", data=form)
+    assert response.get_json()["registered"] == 0
+    assert response.get_json()["orders"]["10478"] == {"status": 4, "code": "ABC"}
+
+
+def test_orders_endpoint_checks_credentials_and_ids(userpanel):
+    add_customer(userpanel)
+    post = userpanel.client.post
+    assert post("/api/dhru/orders", data={"email": "a@example.com", "api_key": "nope", "order_ids": "1"}).status_code == 403
+    assert post("/api/dhru/orders", data={"email": "b@example.com", "api_key": "secret", "order_ids": "1"}).status_code == 403
+    assert post("/api/dhru/orders", data={"email": "a@example.com", "order_ids": "1"}).status_code == 400
+    assert post("/api/dhru/orders", data={"email": "a@example.com", "api_key": "secret",
+                                          "order_ids": "12,abc"}).status_code == 400
+    too_many = ",".join(str(i) for i in range(userpanel.module.DHRU_MAX_ORDERS + 1))
+    assert post("/api/dhru/orders", data={"email": "a@example.com", "api_key": "secret",
+                                          "order_ids": too_many}).status_code == 400
+
+
+def test_scheduler_syncs_users_with_pending_orders_at_the_mirror_interval(runner, monkeypatch):
+    import cron_updateprice
+    import scheduler
+
+    monkeypatch.setattr(cron_updateprice, "DATABASE", runner.DATABASE)
+    dhru_sync.ensure_dhru_tables()
+    conn = sqlite3.connect(runner.DATABASE)
+    conn.execute("INSERT INTO packages (name, validity, price, interval) VALUES ('Fast', 30, 10, '5')")
+    for user_id in (1, 2, 3):
+        conn.execute("INSERT INTO users (id, name, email, password, domain, active_package, expair_date) "
+                     "VALUES (?, 'u', ?, 'x', 'd.example', '1', '2999-01-01')", (user_id, f"u{user_id}@example.com"))
+        conn.execute("INSERT INTO dhru_settings (user_id, api_url, api_username, api_key) VALUES (?, 'http://dhru.test', 'u', 'k')",
+                     (user_id,))
+    conn.commit()
+    conn.close()
+    dhru_sync.register_orders(1, [10452])
+    dhru_sync.register_orders(2, [10478])
+    conn = sqlite3.connect(runner.LOG_DATABASE)
+    conn.execute("UPDATE dhru_orders SET status = 4 WHERE user_id = 2")
+    conn.commit()
+    conn.close()
+
+    tasks = scheduler.DhruSource().load()
+    assert [task.key for task in tasks] == [("dhru", "sync", 1)]
+    assert tasks[0].interval == scheduler.DHRU_SYNC_INTERVAL
+    assert tasks[0].tier == "Fast"
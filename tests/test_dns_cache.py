@@ -0,0 +1,79 @@
+import socket
+import types
+
+import pytest
+
+import dns_cache
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    clock = types.SimpleNamespace(now=1_000_000.0)
+    clock.time = lambda: clock.now
+    monkeypatch.setattr(dns_cache, "time", clock)
+    monkeypatch.setattr(dns_cache, "RESOLVER", dns_cache.RESOLVER)
+    resolver = dns_cache.use_stub_resolver({"a.test": "10.0.0.1"})
+    yield types.SimpleNamespace(clock=clock, resolver=resolver)
+    dns_cache.clear()
+
+
+def settle(host):
+    # Wait for a background refresh started by a stale answer
+    event = dns_cache._refreshing.get(host)
+    if event is not None:
+        assert event.wait(5)
+
+
+def test_fresh_answers_come_from_memory(dns):
+    assert dns_cache.resolve("A.test") == ["10.0.0.1"]
+    dns.resolver.records["a.test"] = "10.0.0.2"
+    dns.clock.now += dns_cache.TTL - 1
+    assert dns_cache.resolve("a.test") == ["10.0.0.1"]
+    assert dns.resolver.calls == 1
+
+
+def test_expired_answer_is_served_while_it_refreshes(dns):
+    dns_cache.resolve("a.test")
+    dns.resolver.records["a.test"] = "10.0.0.2"
+    dns.clock.now += dns_cache.TTL + 1
+    assert dns_cache.resolve("a.test") == ["10.0.0.1"]
+    settle("a.test")
+    assert dns_cache.resolve("a.test") == ["10.0.0.2"]
+    assert dns.resolver.calls == 2
+
+
+def test_failed_refresh_keeps_the_last_good_answer(dns):
+    dns_cache.resolve("a.test")
+    dns.resolver.records["a.test"] = None
+    dns.clock.now += dns_cache.TTL + 1
+    assert dns_cache.resolve("a.test") == ["10.0.0.1"]
+    settle("a.test")
+    assert dns_cache.resolve("a.test") == ["10.0.0.1"]
+    assert dns.resolver.calls == 2
+
+    # Retried after NEGATIVE_TTL, still falling back
+    dns.clock.now += dns_cache.NEGATIVE_TTL + 1
+    assert dns_cache.resolve("a.test") == ["10.0.0.1"]
+    settle("a.test")
+    assert dns.resolver.calls == 3
+
+    # Until STALE_TTL past the last good answer's expiry
+    dns.clock.now += dns_cache.STALE_TTL
+    with pytest.raises(socket.gaierror):
+        dns_cache.resolve("a.test")
+
+
+def test_failures_are_cached_for_negative_ttl(dns):
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            dns_cache.resolve("gone.test")
+    assert dns.resolver.calls == 1
+    dns.resolver.records["gone.test"] = "10.0.0.9"
+    dns.clock.now += dns_cache.NEGATIVE_TTL + 1
+    assert dns_cache.resolve("gone.test") == ["10.0.0.9"]
+
+
+def test_addresses_skip_the_resolver(dns):
+    assert dns_cache.resolve("127.0.0.1") == ["127.0.0.1"]
+    assert dns_cache.resolve("[::1]") == ["::1"]
+    assert dns.resolver.calls == 0
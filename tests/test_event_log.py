@@ -0,0 +1,28 @@
+import io
+import json
+import os
+import sys
+
+import event_log
+
+
+def test_forked_child_gets_its_own_writer():
+    # The parent's writer thread does not survive fork (prefork.py workers)
+    event_log.info("parent_ready", "parent")
+    assert event_log.flush()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            sys.stdout = io.TextIOWrapper(os.fdopen(write_fd, "wb"), encoding="utf-8")
+            event_log.info("child_line", "hello from {who}", who="child")
+            event_log.flush(5)
+            sys.stdout.flush()
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        lines = [json.loads(line) for line in pipe.read().splitlines()]
+    os.waitpid(pid, 0)
+    assert [(line["event"], line["msg"]) for line in lines] == [("child_line", "hello from child")]
@@ -0,0 +1,69 @@
+import sqlite3
+from datetime import timedelta
+
+import clock
+import history_archiver
+
+USERS = [{"id": 1, "email": "a@example.com", "domain": "a.example"},
+         {"id": 2, "email": "b@example.com", "domain": "b.example"}]
+
+
+def counts(path):
+    conn = sqlite3.connect(path)
+    result = dict(conn.execute("SELECT email, total FROM cron_history_counts"))
+    conn.close()
+    return result
+
+
+def test_each_history_row_is_counted(runner):
+    for _ in range(3):
+        runner.log_history(USERS[0], "order", "GET", status_code=200)
+    runner.log_history(USERS[1], "file", "POST", error_class="ConnectTimeout")
+    assert counts(runner.LOG_DATABASE) == {"a@example.com": 3, "b@example.com": 1}
+
+
+def test_counts_are_backfilled_when_the_table_is_created(runner):
+    runner.log_history(USERS[0], "order", "GET", status_code=200)
+    runner.log_history(USERS[0], "order", "GET", status_code=200)
+    conn = sqlite3.connect(runner.LOG_DATABASE)
+    conn.execute("DROP TABLE cron_history_counts")
+    conn.commit()
+    conn.close()
+    runner.ensure_history_schema()
+    assert counts(runner.LOG_DATABASE) == {"a@example.com": 2}
+
+
+def test_archiving_takes_rows_off_the_counts(runner, tmp_path):
+    old = clock.time() - 10 * 86400
+    conn = sqlite3.connect(runner.LOG_DATABASE)
+    conn.executemany(
+        "INSERT INTO cron_history (user_id, email, kind, method, status_code, ts) VALUES (?, ?, 'order', 'GET', 200, ?)",
+        [(1, "a@example.com", old), (1, "a@example.com", old), (2, "b@example.com", old)]
+    )
+    conn.executemany("INSERT INTO cron_history_counts (email, total) VALUES (?, ?)",
+                     [("a@example.com", 2), ("b@example.com", 1)])
+    conn.commit()
+    conn.close()
+    runner.log_history(USERS[0], "order", "GET", status_code=200)
+
+    archived = history_archiver.archive_table(runner.LOG_DATABASE, "cron_history", timedelta(days=7),
+                                              archive_dir=str(tmp_path / "archive"))
+    assert archived == 3
+    assert counts(runner.LOG_DATABASE) == {"a@example.com": 1, "b@example.com": 0}
+
+
+def test_history_page_uses_the_counter(userpanel, runner):
+    for _ in range(25):
+        runner.log_history(USERS[0], "order", "GET", status_code=200)
+    with userpanel.client.session_transaction() as session:
+        session["user_id"] = 1
+        session["email"] = "a@example.com"
+    assert "Page 1 of 3" in userpanel.client.get("/cronjob_history").get_data(as_text=True)
+
+
+def test_history_page_ignores_a_bad_page_number(userpanel):
+    with userpanel.client.session_transaction() as session:
+        session["user_id"] = 1
+        session["email"] = "a@example.com"
+    assert userpanel.client.get("/cronjob_history?page=abc").status_code == 200
+    assert userpanel.client.get("/cronjob_history?page=-4").status_code == 200
@@ -0,0 +1,146 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+
+import history_archiver
+
+COLUMNS = ["id", "user_id", "email", "kind", "method", "status_code", "latency_ms", "error_class", "ts"]
+
+
+def add_history(admin, rows):
+    conn = sqlite3.connect(admin.config)
+    conn.execute("INSERT INTO users (name, email, password, domain) VALUES ('a', 'a@example.com', 'x', 'a.example')")
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(admin.logs)
+    conn.executemany(f"INSERT INTO cron_history ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+    conn.commit()
+    conn.close()
+
+
+def history_rows():
+    return [
+        (1, 1, "a@example.com", "order", "GET", 200, 120, None, 1_700_000_000),
+        (2, 1, "a@example.com", "price", "GET", None, None, "ConnectTimeout", 1_700_000_060),
+        (3, 1, "a@example.com", "file", "POST", 500, 80, None, 1_700_000_120),
+    ]
+
+
+def test_csv_export_is_newest_first_with_header(admin):
+    add_history(admin, history_rows())
+    response = admin.client.get("/history/export?format=csv")
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0][:4] == ["id", "user_id", "email", "domain"]
+    assert [row[0] for row in rows[1:]] == ["3", "2", "1"]
+    assert rows[1][3] == "a.example"
+
+
+def test_gzip_export_matches_plain_export(admin):
+    add_history(admin, history_rows())
+    plain = admin.client.get("/history/export?format=ndjson").get_data()
+    compressed = admin.client.get("/history/export?format=ndjson&gzip=1")
+    assert compressed.mimetype == "application/gzip"
+    assert gzip.decompress(compressed.get_data()) == plain
+    lines = [json.loads(line) for line in plain.decode().splitlines()]
+    assert [line["kind"] for line in lines] == ["file", "price", "order"]
+
+
+def test_export_applies_filters(admin):
+    add_history(admin, history_rows())
+    response = admin.client.get("/history/export?format=ndjson&kind=price")
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["id"] for line in lines] == [2]
+
+
+def test_export_appends_archived_rows(admin):
+    add_history(admin, history_rows()[1:])
+    table_dir = os.path.join(admin.module.history_archive.ARCHIVE_DIR, "cron_history")
+    os.makedirs(table_dir)
+    # The archiver is handed sqlite3.Row batches (indexed by name and position)
+    source = sqlite3.connect(admin.logs)
+    source.row_factory = sqlite3.Row
+    source.execute("INSERT INTO cron_history (id, email, kind, method, user_id, status_code, ts) "
+                   "VALUES (1, 'a@example.com', 'order', 'GET', 1, 200, 1700000000)")
+    rows = source.execute(f"SELECT {', '.join(COLUMNS)} FROM cron_history WHERE id = 1").fetchall()
+    source.rollback()
+    source.close()
+    history_archiver.append_batch("cron_history", table_dir, rows, COLUMNS)
+
+    response = admin.client.get("/history/export?format=ndjson")
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["id"] for line in lines] == [3, 2, 1]
+    assert lines[-1]["domain"] == "a.example"
+
+
+def test_unknown_format_is_rejected(admin):
+    assert admin.client.get("/history/export?format=xml").status_code == 400
+
+
+def test_unreadable_archive_segment_is_skipped_and_logged(admin, monkeypatch):
+    add_history(admin, history_rows())
+    table_dir = os.path.join(admin.module.history_archive.ARCHIVE_DIR, "cron_history")
+    os.makedirs(table_dir)
+    with open(os.path.join(table_dir, "2023-11-14.ndjson.gz"), "wb") as f:
+        f.write(b"not gzip")
+    warnings = []
+    monkeypatch.setattr(admin.module.history_archive.event_log, "warning",
+                        lambda event, message, **fields: warnings.append((event, fields["path"])))
+
+    response = admin.client.get("/history/export?format=ndjson")
+    assert [json.loads(line)["id"] for line in response.get_data(as_text=True).splitlines()] == [3, 2, 1]
+    assert warnings == [("archive_segment_unreadable", os.path.join(table_dir, "2023-11-14.ndjson.gz"))]
+
+
+def archive(admin, rows):
+    # Archives rows through the archiver, which is handed sqlite3.Row batches
+    table_dir = os.path.join(admin.module.history_archive.ARCHIVE_DIR, "cron_history")
+    os.makedirs(table_dir, exist_ok=True)
+    source = sqlite3.connect(admin.logs)
+    source.row_factory = sqlite3.Row
+    source.executemany(f"INSERT INTO cron_history ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+    batch = source.execute(f"SELECT {', '.join(COLUMNS)} FROM cron_history WHERE id IN ({', '.join('?' * len(rows))}) "
+                           "ORDER BY id", [row[0] for row in rows]).fetchall()
+    source.rollback()
+    source.close()
+    history_archiver.append_batch("cron_history", table_dir, batch, COLUMNS)
+
+
+def test_archived_rows_are_exported_newest_first(admin):
+    day = 86400
+    add_history(admin, [(5, 1, "a@example.com", "order", "GET", 200, 10, None, 1_700_000_000 + 2 * day)])
+    archive(admin, [(i, 1, "a@example.com", "order", "GET", 200, 10, None, 1_700_000_000 + (i - 1) // 2 * day + i)
+                    for i in range(1, 5)])
+
+    response = admin.client.get("/history/export?format=ndjson")
+    assert [json.loads(line)["id"] for line in response.get_data(as_text=True).splitlines()] == [5, 4, 3, 2, 1]
+
+
+def test_empty_csv_export_still_has_its_header(admin):
+    plain = admin.client.get("/history/export?format=csv").get_data(as_text=True)
+    assert plain.splitlines()[0].startswith("id,user_id,email,domain")
+    compressed = admin.client.get("/history/export?format=csv&gzip=1").get_data()
+    assert gzip.decompress(compressed).decode() == plain
+    assert admin.client.get("/history/export?format=ndjson").get_data() == b""
+    assert gzip.decompress(admin.client.get("/history/export?format=ndjson&gzip=1").get_data()) == b""
+
+
+def test_userpanel_export_is_scoped_to_the_customer(userpanel):
+    conn = sqlite3.connect(userpanel.logs)
+    conn.executemany(f"INSERT INTO cron_history ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                     history_rows() + [(4, 2, "b@example.com", "order", "GET", 200, 5, None, 1_700_000_200)])
+    conn.commit()
+    conn.close()
+    with userpanel.client.session_transaction() as session:
+        session["user_id"] = 1
+        session["email"] = "a@example.com"
+
+    rows = list(csv.reader(io.StringIO(userpanel.client.get("/cronjob_history/export?format=csv").get_data(as_text=True))))
+    assert rows[0][:3] == ["id", "kind", "method"]
+    assert [row[0] for row in rows[1:]] == ["3", "2", "1"]
+    empty = userpanel.client.get("/cronjob_history/export?format=csv&kind=dhru&gzip=1")
+    assert gzip.decompress(empty.get_data()).decode().splitlines() == [",".join(rows[0])]
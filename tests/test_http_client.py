@@ -0,0 +1,242 @@
+import http.server
+import os
+import subprocess
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import http_client
+import metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    # Stands in for the limiter + network; counts requests actually sent
+    clock = FakeClock()
+    sent = []
+    gate = {"event": None, "error": None}
+
+    def limited_fetch(method, url, max_timeout, headers):
+        sent.append((method, url))
+        if gate["event"] is not None:
+            gate["event"].wait(5)
+        if gate["error"] is not None:
+            raise gate["error"]
+        return types.SimpleNamespace(status_code=200, request_number=len(sent))
+
+    monkeypatch.setattr(http_client, "_limited_fetch", limited_fetch)
+    monkeypatch.setattr(http_client, "time", clock)
+    monkeypatch.setattr(http_client, "_recent", {})
+    monkeypatch.setattr(http_client, "COALESCE_WINDOW", 5)
+    return types.SimpleNamespace(clock=clock, sent=sent, gate=gate)
+
+
+def coalesced_count():
+    return metrics._counters.get(metrics._key("cron_requests_coalesced_total", {}), 0)
+
+
+def test_callers_join_a_request_in_flight(transport):
+    transport.gate["event"] = threading.Event()
+    results = {}
+
+    def call(subscriber):
+        results[subscriber] = http_client.fetch("GET", "http://a.test/price", 10, subscriber=subscriber)
+
+    before = coalesced_count()
+    leader = threading.Thread(target=call, args=("price",))
+    leader.start()
+    while not transport.sent:
+        time.sleep(0.001)
+    followers = [threading.Thread(target=call, args=(f"job:{i}",)) for i in range(3)]
+    for thread in followers:
+        thread.start()
+    while http_client._recent[("GET", "http://a.test/price")]["followers"] < 3:
+        time.sleep(0.001)
+    transport.gate["event"].set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(transport.sent) == 1
+    assert {response.request_number for response in results.values()} == {1}
+    assert coalesced_count() - before == 3
+
+
+def test_window_counts_from_the_leaders_start(transport):
+    http_client.fetch("GET", "http://a.test/x", 10, subscriber="job:1")
+    transport.clock.now += 4
+    assert http_client.fetch("GET", "http://a.test/x", 10, subscriber="job:2").request_number == 1
+    transport.clock.now += 2
+    assert http_client.fetch("GET", "http://a.test/x", 10, subscriber="job:3").request_number == 2
+
+
+def test_same_subscriber_never_gets_a_reused_response(transport):
+    http_client.fetch("GET", "http://a.test/x", 10, subscriber="order:12")
+    transport.clock.now += 1
+    assert http_client.fetch("GET", "http://a.test/x", 10, subscriber="order:12").request_number == 2
+    # ...but another subscriber may share the new one
+    assert http_client.fetch("GET", "http://a.test/x", 10, subscriber="job:7").request_number == 2
+
+
+def test_method_is_part_of_the_key(transport):
+    http_client.fetch("GET", "http://a.test/x", 10, subscriber="order:1")
+    assert http_client.fetch("POST", "http://a.test/x", 10, subscriber="order:2").request_number == 2
+
+
+def test_callers_without_a_key_only_join_in_flight_requests(transport):
+    http_client.fetch("GET", "http://a.test/x", 10, subscriber="job:1")
+    assert http_client.fetch("GET", "http://a.test/x", 10).request_number == 2
+
+
+def test_errors_are_fanned_out(transport):
+    transport.gate["event"] = threading.Event()
+    transport.gate["error"] = http_client.requests.exceptions.ConnectionError("refused")
+    errors = []
+
+    def call(subscriber):
+        try:
+            http_client.fetch("GET", "http://a.test/x", 10, subscriber=subscriber)
+        except http_client.requests.exceptions.ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(f"job:{i}",)) for i in range(2)]
+    threads[0].start()
+    while not transport.sent:
+        time.sleep(0.001)
+    threads[1].start()
+    while http_client._recent[("GET", "http://a.test/x")]["followers"] < 1:
+        time.sleep(0.001)
+    transport.gate["event"].set()
+    for thread in threads:
+        thread.join(5)
+    assert len(transport.sent) == 1
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_window_is_read_from_the_environment():
+    cron_dir = os.path.dirname(http_client.__file__)
+    output = subprocess.run(
+        [sys.executable, "-c", "import http_client; print(http_client.COALESCE_WINDOW)"],
+        cwd=cron_dir, env=dict(os.environ, CRON_COALESCE_WINDOW="0.5"), capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "0.5"
+
+
+class TrickleHandler(http.server.BaseHTTPRequestHandler):
+    # Sends its headers at once, then one body byte every 0.3s
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "100")
+        self.end_headers()
+        try:
+            for _ in range(100):
+                self.wfile.write(b"x")
+                self.wfile.flush()
+                time.sleep(0.3)
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def trickle_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TrickleHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/slow"
+    server.shutdown()
+    server.server_close()
+
+
+def test_deadline_cuts_off_a_trickling_body(trickle_url):
+    start = time.time()
+    with pytest.raises(http_client.DeadlineExceeded):
+        http_client._fetch("GET", trickle_url, 1.5, None)
+    assert time.time() - start < 2.5
+
+
+def test_deadline_never_exceeds_the_callers_timeout(monkeypatch):
+    monkeypatch.setattr(http_client, "_latencies", {})
+    for _ in range(http_client.MIN_SAMPLES):
+        http_client.record_latency("http://a.test/x", 3)
+    connect, read, deadline = http_client.timeouts_for("http://a.test/x", 10)
+    assert (connect, read, deadline) == (http_client.CONNECT_MAX, 10, 10)
+    assert http_client.timeouts_for("http://a.test/y", 10) == (http_client.CONNECT_MAX, 10, 10)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(http_client, "time", clock)
+    return clock
+
+
+def test_limiter_allows_a_burst_then_waits_at_the_rate(clock):
+    limiter = http_client.HostLimiter(rate=2, burst=4, max_concurrent=10)
+    assert [limiter.acquire(30) for _ in range(4)] == [0, 0, 0, 0]
+    assert limiter.acquire(30) == pytest.approx(0.5)
+    assert limiter.acquire(30) == pytest.approx(0.5)
+    clock.sleep(10)
+    assert limiter.state()["tokens"] == 4
+
+
+def test_limiter_gives_up_when_the_rate_wait_is_too_long(clock):
+    limiter = http_client.HostLimiter(rate=1, burst=1, max_concurrent=10)
+    limiter.acquire(30)
+    with pytest.raises(http_client.HostBusy):
+        limiter.acquire(0.5)
+    assert limiter.state()["active"] == 1
+
+
+def test_limiter_caps_requests_in_flight():
+    limiter = http_client.HostLimiter(rate=100, burst=100, max_concurrent=1)
+    limiter.acquire(1)
+    with pytest.raises(http_client.HostBusy):
+        limiter.acquire(0.05)
+    limiter.release()
+    limiter.acquire(1)
+    assert limiter.state()["active"] == 1
+
+
+def test_set_host_limits_updates_existing_and_new_limiters(monkeypatch):
+    monkeypatch.setattr(http_client, "_limiters", {})
+    for name in ("HOST_RATE", "HOST_BURST", "HOST_MAX_CONCURRENT"):
+        monkeypatch.setattr(http_client, name, getattr(http_client, name))
+    existing = http_client.limiter_for("http://a.test/x")
+    assert http_client.set_host_limits(rate=5, max_concurrent=2) == {
+        "rate": 5, "burst": http_client.HOST_BURST, "max_concurrent": 2}
+    new = http_client.limiter_for("http://b.test/x")
+    for limiter in (existing, new):
+        assert (limiter.rate, limiter.max_concurrent) == (5, 2)
+    assert http_client.limiter_for("http://A.test/y") is existing
+
+
+def test_paused_host_is_refused_until_resumed(transport, monkeypatch):
+    monkeypatch.setattr(http_client, "_paused", {})
+    http_client.pause(" A.Test ")
+    assert http_client.is_paused("http://a.test/x") and not http_client.is_paused("http://b.test/x")
+    with pytest.raises(http_client.HostPaused):
+        http_client.fetch("GET", "http://a.test/x", 10)
+    assert transport.sent == []
+    assert http_client.paused_hosts() == {"a.test": transport.clock.now}
+
+    http_client.resume("a.test")
+    http_client.fetch("GET", "http://a.test/x", 10)
+    assert transport.sent == [("GET", "http://a.test/x")]
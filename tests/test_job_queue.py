@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import job_queue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "QUEUE_DATABASE", str(tmp_path / "queue.db"))
+    job_queue.ensure_queue_table()
+    return job_queue
+
+
+def row(queue, item_id):
+    conn = sqlite3.connect(queue.QUEUE_DATABASE)
+    conn.row_factory = sqlite3.Row
+    result = dict(conn.execute("SELECT * FROM job_queue WHERE id = ?", (item_id,)).fetchone())
+    conn.close()
+    return result
+
+
+def test_claim_is_exclusive(queue):
+    item_id = queue.enqueue("cron_job", 7, {"manual": True})
+    item = queue.claim()
+    assert item["id"] == item_id
+    assert item["target_id"] == 7
+    assert item["payload"] == {"manual": True}
+    assert item["attempts"] == 1
+    assert queue.claim() is None
+
+
+def test_delayed_item_is_not_claimed_early(queue):
+    queue.enqueue("cron_job", 1, delay=60)
+    assert queue.claim() is None
+
+
+def test_failure_requeues_with_backoff_then_gives_up(queue):
+    item_id = queue.enqueue("cron_job", 1, max_attempts=2)
+    item = queue.claim()
+    before = time.time()
+    queue.fail(item, "boom")
+    state = row(queue, item_id)
+    assert state["status"] == "queued"
+    assert state["run_at"] >= before + queue.RETRY_BACKOFF[0]
+    assert state["last_error"] == "boom"
+
+    conn = sqlite3.connect(queue.QUEUE_DATABASE)
+    conn.execute("UPDATE job_queue SET run_at = 0")
+    conn.commit()
+    conn.close()
+    item = queue.claim()
+    assert item["attempts"] == 2
+    queue.fail(item, "boom again")
+    assert row(queue, item_id)["status"] == "failed"
+
+
+def test_expired_claim_is_reclaimed_and_stale_worker_is_fenced(queue):
+    item_id = queue.enqueue("cron_job", 1)
+    first = queue.claim()
+    conn = sqlite3.connect(queue.QUEUE_DATABASE)
+    conn.execute("UPDATE job_queue SET claimed_until = 0")
+    conn.commit()
+    conn.close()
+
+    second = queue.claim()
+    assert second["id"] == item_id and second["attempts"] == 2
+    # The first worker finishing late must not touch the new claim
+    assert not queue.renew(first)
+    queue.complete(first)
+    assert row(queue, item_id)["status"] == "running"
+    queue.complete(second)
+    assert row(queue, item_id)["status"] == "done"
+
+
+def test_drain_runs_handlers_and_requeues_failures(queue):
+    ok_id = queue.enqueue("ok", 1)
+    bad_id = queue.enqueue("bad", 2)
+    seen = []
+
+    def bad(item):
+        raise RuntimeError("nope")
+
+    assert queue.drain({"ok": seen.append, "bad": bad}) == 2
+    assert [item["id"] for item in seen] == [ok_id]
+    assert row(queue, ok_id)["status"] == "done"
+    assert row(queue, bad_id)["status"] == "queued"
+    assert row(queue, bad_id)["last_error"] == "nope"
+
+
+def test_lease_is_renewed_while_a_long_handler_runs(queue, monkeypatch):
+    monkeypatch.setattr(queue, "VISIBILITY_TIMEOUT", 0.3)
+    item_id = queue.enqueue("slow", 1)
+    stolen = []
+
+    def slow(item):
+        # Well past the visibility timeout; a second worker keeps trying
+        deadline = time.time() + 1.0
+        while time.time() < deadline:
+            stolen.append(queue.claim())
+            time.sleep(0.05)
+
+    worker = threading.Thread(target=queue.drain, args=({"slow": slow},))
+    worker.start()
+    worker.join(5)
+    assert not any(stolen)
+    state = row(queue, item_id)
+    assert state["status"] == "done" and state["attempts"] == 1
+
+
+def test_admin_enqueues_into_the_runners_queue(admin_module, tmp_path, monkeypatch):
+    # Fresh database: the admin side creates the table the runner claims from
+    monkeypatch.setattr(job_queue, "QUEUE_DATABASE", str(tmp_path / "fresh.db"))
+    client = admin_module.job_queue_client
+    item_id = client.enqueue(job_queue.QUEUE_DATABASE, "cron_job", 7, {"manual": True})
+    assert client.pending(job_queue.QUEUE_DATABASE, "cron_job") == {7: "queued"}
+    item = job_queue.claim()
+    assert item["id"] == item_id and item["payload"] == {"manual": True}
+    assert client.pending(job_queue.QUEUE_DATABASE, "cron_job") == {7: "running"}
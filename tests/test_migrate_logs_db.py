@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+LEGACY_HISTORY_SQL = """
+    CREATE TABLE cron_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id INTEGER,
+        email TEXT,
+        timestamp TEXT,
+        result TEXT
+    )
+"""
+
+
+@pytest.fixture
+def migrate_logs_db(admin_module):
+    # admin/ is on sys.path once the admin app is loaded
+    import migrate_logs_db
+    return migrate_logs_db
+
+
+def legacy_config(databases, rows):
+    conn = sqlite3.connect(databases.config)
+    conn.execute("INSERT INTO users (name, email, password) VALUES ('a', 'a@example.com', 'x')")
+    conn.execute(LEGACY_HISTORY_SQL)
+    conn.execute("CREATE INDEX idx_cron_history_email_ts ON cron_history (email, timestamp)")
+    conn.executemany("INSERT INTO cron_history (id, job_id, email, timestamp, result) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def legacy_rows(count):
+    return [(i, 0, "a@example.com", "2024-01-01 06:00:00",
+             "GET: Order update: 200" if i % 2 else "POST: File update error: Caused by ConnectTimeout(x)")
+            for i in range(1, count + 1)]
+
+
+def tables(path, schema="main"):
+    conn = sqlite3.connect(path)
+    names = {name for name, in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")}
+    conn.close()
+    return names
+
+
+def test_legacy_rows_are_converted_when_the_runner_started_first(migrate_logs_db, databases, runner):
+    # The runner already created the typed table in the log database and wrote to it
+    user = {"id": 1, "email": "a@example.com", "domain": "a.example"}
+    runner.log_history(user, "order", "GET", status_code=200)
+    legacy_config(databases, legacy_rows(180))
+
+    migrate_logs_db.migrate(databases.config, databases.logs)
+
+    assert "cron_history" not in tables(databases.config)
+    conn = sqlite3.connect(databases.logs)
+    assert conn.execute("SELECT COUNT(*) FROM cron_history").fetchone()[0] == 181
+    assert conn.execute("SELECT kind, method, status_code, error_class, ts FROM cron_history WHERE id = 3").fetchone() \
+        == ("order", "GET", 200, None, 1704067200)
+    assert conn.execute("SELECT COUNT(*) FROM cron_history WHERE kind = 'file' AND error_class = 'ConnectTimeout'"
+                        ).fetchone()[0] == 90
+    # id 1 was taken by the runner's row, so that legacy row got a new one
+    assert conn.execute("SELECT email, ts FROM cron_history WHERE id > 180").fetchall() == [("a@example.com", 1704067200)]
+    assert conn.execute("SELECT total FROM cron_history_counts").fetchone()[0] == 181
+    conn.close()
+
+
+def test_table_is_kept_when_rows_do_not_fit(migrate_logs_db, databases):
+    conn = sqlite3.connect(databases.config)
+    conn.execute("CREATE TABLE cron_url_stats (email TEXT, kind TEXT, url TEXT)")
+    conn.execute("INSERT INTO cron_url_stats VALUES ('a@example.com', NULL, 'http://a/')")
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(databases.logs)
+    conn.execute("CREATE TABLE cron_url_stats (email TEXT NOT NULL, kind TEXT NOT NULL, url TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    migrate_logs_db.migrate(databases.config, databases.logs)
+
+    conn = sqlite3.connect(databases.config)
+    assert conn.execute("SELECT COUNT(*) FROM cron_url_stats").fetchone()[0] == 1
+    conn.close()
+
+
+def test_same_layout_tables_are_moved(migrate_logs_db, databases):
+    conn = sqlite3.connect(databases.logs)
+    conn.execute("DROP TABLE updateprice_logs")
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(databases.config)
+    conn.execute("CREATE TABLE updateprice_logs (id INTEGER PRIMARY KEY, cron_job_id INTEGER, result TEXT)")
+    conn.execute("CREATE INDEX idx_updateprice_logs_job ON updateprice_logs (cron_job_id)")
+    conn.executemany("INSERT INTO updateprice_logs VALUES (?, ?, 'ok')", [(i, i % 3) for i in range(1, 11)])
+    conn.commit()
+    conn.close()
+
+    migrate_logs_db.migrate(databases.config, databases.logs)
+
+    assert "updateprice_logs" not in tables(databases.config)
+    conn = sqlite3.connect(databases.logs)
+    assert conn.execute("SELECT COUNT(*) FROM updateprice_logs").fetchone()[0] == 10
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'idx_updateprice_logs_job'").fetchone()
+    conn.close()
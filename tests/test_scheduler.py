@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+import scheduler
+import tick_profiler
+
+
+class SlowSource:
+    # Reloads take longer than the pass budget; its one task records a job
+    name = "slow"
+    refresh_every = 0.1
+    anchor_on_finish = True
+    persist_schedule = False
+
+    def load(self):
+        time.sleep(0.1)
+        return [scheduler.Task((self.name, 1), self.name, 0, 0.05, self.run)]
+
+    def run(self):
+        tick_profiler.record_job("slow job", 0.01)
+
+
+@pytest.fixture
+def reports(monkeypatch):
+    lines = []
+    logger = type("Logger", (), {"info": lambda self, text: lines.append(text)})()
+    monkeypatch.setattr(tick_profiler, "_report_logger", lambda: logger)
+    tick_profiler.enable()
+    yield lines
+    tick_profiler.disable()
+
+
+def test_slow_dispatcher_passes_are_profiled(reports, monkeypatch):
+    monkeypatch.setattr(scheduler, "PASS_BUDGET_SECONDS", 0.05)
+    engine = scheduler.Scheduler([SlowSource()], workers=2)
+    thread = threading.Thread(target=engine.run)
+    thread.start()
+    time.sleep(0.6)
+    engine.stop()
+    thread.join(5)
+    assert reports
+    assert "scheduler pass took" in reports[0]
+    assert any("slow job" in report for report in reports)
+
+
+def task(key, tier="basic", weight=1, tenant=1, priority=0):
+    return scheduler.Task(key, "test", priority, 60, lambda: None, tier=tier, weight=weight, tenant=tenant)
+
+
+def fill(queue, tasks):
+    for seq, item in enumerate(tasks):
+        queue.push(item, 0, seq)
+
+
+def test_tiers_share_workers_by_weight():
+    queue = scheduler.FairQueue()
+    fill(queue, [task(("gold", i), "gold", 3, tenant=i) for i in range(40)]
+         + [task(("basic", i), "basic", 1, tenant=100 + i) for i in range(40)])
+    picks = [queue.pop().tier for _ in range(40)]
+    assert picks.count("gold") == 30 and picks.count("basic") == 10
+    assert "basic" in picks[:4]
+
+
+def test_tenants_take_turns_within_a_tier():
+    queue = scheduler.FairQueue()
+    fill(queue, [task(("a", i), tenant="a") for i in range(5)] + [task(("b", 0), tenant="b"), task(("c", 0), tenant="c")])
+    assert [queue.pop().tenant for _ in range(7)] == ["a", "b", "c", "a", "a", "a", "a"]
+
+
+def test_untiered_tasks_go_first_and_priority_orders_a_tenant():
+    queue = scheduler.FairQueue()
+    fill(queue, [task("file", priority=1), task("order", priority=0), task("queue", tier=None)])
+    assert [queue.pop().key for _ in range(3)] == ["queue", "order", "file"]
+    assert queue.pop() is None and len(queue) == 0
+
+
+def test_idle_tier_does_not_bank_credit():
+    queue = scheduler.FairQueue()
+    fill(queue, [task(("busy", i), "busy", 1, tenant=i) for i in range(20)])
+    for _ in range(10):
+        queue.pop()
+    queue.push(task("late", "late", 1), 0, 100)
+    # Same weight: the returning tier alternates instead of taking the next ten slots
+    assert [queue.pop().tier for _ in range(4)].count("late") == 1
+
+
+def test_remove_takes_a_task_out_of_its_tenant():
+    queue = scheduler.FairQueue()
+    first, second = task("x", tenant="a"), task("y", tenant="a")
+    fill(queue, [first, second])
+    assert queue.remove(second, "basic", "a") == (0, 1)
+    assert queue.remove(second, "basic", "a") is None
+    assert queue.pop() is first and len(queue) == 0 and not queue.tiers["basic"]["tenants"]
+
+
+class TierSource:
+    name = "test"
+    refresh_every = 60
+    anchor_on_finish = True
+    persist_schedule = False
+
+    def __init__(self):
+        self.tier = ("basic", 1, 1)
+
+    def load(self):
+        tier, weight, tenant = self.tier
+        return [scheduler.Task(("test", 1), self.name, 0, 60, lambda: None, next_due=0,
+                               tier=tier, weight=weight, tenant=tenant)]
+
+
+def test_refresh_picks_up_a_package_change():
+    source = TierSource()
+    engine = scheduler.Scheduler([source], workers=1)
+    engine.refresh(source)
+    current = engine.tasks[("test", 1)]
+    # Due and waiting for a worker under its old tier
+    engine.ready.push(current, 0, 0)
+
+    source.tier = ("gold", 5, 2)
+    engine.refresh(source)
+    assert engine.tasks[("test", 1)] is current
+    assert (current.tier, current.weight, current.tenant) == ("gold", 5, 2)
+    assert engine.ready.depth_by_tier() == {"basic": 0, "gold": 1}
+    assert engine.ready.pop() is current
+    engine.pool.shutdown()
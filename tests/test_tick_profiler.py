@@ -0,0 +1,21 @@
+import threading
+
+import event_log
+import tick_profiler
+
+
+def test_toggle_logs_off_the_signal_handlers_thread(monkeypatch):
+    logged = []
+    done = threading.Event()
+
+    def info(event, message, **fields):
+        logged.append((event, fields["state"], threading.current_thread() is threading.main_thread()))
+        done.set()
+
+    monkeypatch.setattr(event_log, "info", info)
+    try:
+        tick_profiler.toggle()
+        assert done.wait(5)
+        assert logged == [("tick_profiler_toggled", "enabled", False)]
+    finally:
+        tick_profiler.disable()
@@ -0,0 +1,48 @@
+USERS = [{"id": 1, "email": "a@example.com", "domain": "a.example"},
+         {"id": 2, "email": "b@example.com", "domain": "b.example"}]
+URL = "https://a.example/api/orders"
+
+# (status_code, latency_ms, error_class) per run, oldest first
+RUNS = [(200, 40, None), (500, 40, None), (500, 40, None), (None, None, "ReadTimeout"),
+        (200, 40, None), (200, 300, None), (200, 2000, None), (200, 40, None),
+        (503, 40, None), (None, None, "ConnectTimeout")]
+
+
+def log_runs(runner):
+    for status_code, latency_ms, error_class in RUNS:
+        runner.log_history(USERS[0], "order", "GET", status_code=status_code, latency_ms=latency_ms,
+                           error_class=error_class, url=URL)
+    runner.log_history(USERS[0], "price", "GET", status_code=200, latency_ms=40, url=URL)
+    runner.log_history(USERS[1], "order", "GET", status_code=200, latency_ms=40, url="https://b.example/api")
+
+
+def stats_for(userpanel, email):
+    with userpanel.client.session_transaction() as session:
+        session["user_id"] = 1
+        session["email"] = email
+    return userpanel.client.get("/stats.json").get_json()["urls"]
+
+
+def test_stats_are_read_from_the_runners_aggregates(runner, userpanel):
+    log_runs(runner)
+    order, price = stats_for(userpanel, "a@example.com")
+    assert (order["kind"], order["url"], price["kind"]) == ("order", URL, "price")
+    assert (order["total"], order["success"], order["success_rate"]) == (10, 5, 50.0)
+    assert (order["fail_streak"], order["max_fail_streak"]) == (2, 3)
+    assert (order["last_status"], order["last_error"]) == (None, "ConnectTimeout")
+    assert order["last_run"] == order["last_failure"]
+    # Latency buckets: 6 runs <= 50 ms, one <= 500 ms, one <= 2500 ms
+    assert (order["p50_ms"], order["p95_ms"], order["p99_ms"]) == (50, 2500, 2500)
+    assert (price["total"], price["success_rate"], price["fail_streak"], price["last_failure"]) == (1, 100.0, 0, None)
+
+
+def test_stats_are_scoped_to_the_customer(runner, userpanel):
+    log_runs(runner)
+    assert [row["url"] for row in stats_for(userpanel, "b@example.com")] == ["https://b.example/api"]
+    page = userpanel.client.get("/stats").data
+    assert b"https://b.example/api" in page and URL.encode() not in page
+    assert stats_for(userpanel, "c@example.com") == []
+
+
+def test_stats_are_empty_before_the_runner_creates_them(userpanel):
+    assert stats_for(userpanel, "a@example.com") == []
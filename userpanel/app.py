@@ -1,18 +1,46 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, jsonify
 import sqlite3
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
+import argparse
+import hashlib
+import hmac
+import re
+import sys
+
+# Modules used by both web apps live in ../shared; event_log (which they log
+# through) and dhru_mirror (the Dhru order mirror's tables) come from the
+# runners in ../cron
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../shared"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../cron"))
+
+import dhru_mirror
+import history_export
+import prefork
+import shared_cache
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE = os.path.join(BASE_DIR, "../cronjobs.db")
+# High-churn log tables (cron_history, updateprice_logs, ...) live in their own
+# file so runner log writes never take the config database's write lock
+LOG_DATABASE = os.path.join(BASE_DIR, "../cronjobs_logs.db")
+# Bangladesh time (no DST), used to display and filter history timestamps
+BD_TZ = timezone(timedelta(hours=6))
+# Browsers/CDNs may reuse the landing page this long before revalidating
+HOME_MAX_AGE = 60
+# Most order IDs one /api/dhru/orders call may register
+DHRU_MAX_ORDERS = 500
+# Rendered landing page: (packages cache version, year, etag, last_modified, body).
+# Re-rendered only when an admin package edit bumps the version, see shared_cache.py
+home_page = None
 
 def init_db():
-    if not os.path.exists(DB_FILE):
-        conn = sqlite3.connect(DB_FILE)
+    if not os.path.exists(DATABASE):
+        conn = sqlite3.connect(DATABASE)
         conn.execute("""
             CREATE TABLE users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -62,16 +90,44 @@ def init_db():
         conn.close()
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
+    # Unqualified log table names resolve to the attached log database
+    if LOG_DATABASE != DATABASE:
+        conn.execute("ATTACH DATABASE ? AS logs", (LOG_DATABASE,))
     return conn
 
 @app.route("/")
 def home():
+    # Same page for every visitor, so it is served from memory with an ETag
+    # and repeat visits get a 304; no DB access until the packages change
+    global home_page
+    now = datetime.now()
+    version = shared_cache.version("packages")
+    page = home_page
+    if page is None or page[0] != version or page[1] != now.year:
+        packages = shared_cache.get("packages", "enabled", load_enabled_packages)
+        body = render_template("Auth/home.html", packages=packages, now=now).encode()
+        page = home_page = (version, now.year, hashlib.md5(body).hexdigest(),
+                            datetime.now(timezone.utc).replace(microsecond=0), body)
+    response = Response(page[4], mimetype="text/html")
+    response.set_etag(page[2])
+    response.last_modified = page[3]
+    response.cache_control.public = True
+    response.cache_control.max_age = HOME_MAX_AGE
+    return response.make_conditional(request)
+
+def load_enabled_packages():
     conn = get_db_connection()
-    packages = conn.execute("SELECT * FROM packages WHERE status = 'enabled'").fetchall()
+    packages = [dict(row) for row in conn.execute("SELECT * FROM packages WHERE status = 'enabled'")]
     conn.close()
-    return render_template("Auth/home.html", packages=packages, now=datetime.now())
+    return packages
+
+def load_user(user_id):
+    conn = get_db_connection()
+    user = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+    conn.close()
+    return dict(user) if user else None
 
 def login_required(f):
     @wraps(f)
@@ -114,6 +170,7 @@ def register():
         )
         conn.commit()
         conn.close()
+        shared_cache.invalidate("dashboard")
         flash("You have registered successfully!", "success")
         return redirect(url_for('login'))
 
@@ -146,9 +203,8 @@ def login():
 @app.route("/u/dashboard")
 @login_required
 def u_dashboard():
-    conn = get_db_connection()
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (session["user_id"],)).fetchone()
-    conn.close()
+    user_id = session["user_id"]
+    user = shared_cache.get("users", user_id, lambda: load_user(user_id))
     return render_template("Auth/u_dashboard.html", user=user)
 
 @app.route("/domain", methods=["GET", "POST"])
@@ -164,6 +220,7 @@ def user_domain():
         new_status = "Disable" if user["status"] == "Enable" else "Enable"
         cursor.execute("UPDATE users SET status = ? WHERE id = ?", (new_status, session["user_id"]))
         conn.commit()
+        shared_cache.invalidate("users", "dashboard")
         cursor.execute("SELECT * FROM users WHERE id = ?", (session["user_id"],))
         user = cursor.fetchone()
         flash(f"Domain status updated to {new_status}.", "success")
@@ -171,27 +228,194 @@ def user_domain():
     conn.close()
     return render_template("Auth/domain.html", user=user)
 
+def to_epoch(value, end_of_day=False):
+    # Accepts "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS" in Bangladesh time
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        if len(value) <= 10:
+            parsed = datetime.strptime(value, "%Y-%m-%d")
+            if end_of_day:
+                parsed += timedelta(days=1, seconds=-1)
+        else:
+            parsed = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+    return int(parsed.replace(tzinfo=BD_TZ).timestamp())
+
+@app.template_filter("bd_time")
+def bd_time(ts):
+    if not ts:
+        return "-"
+    return datetime.fromtimestamp(ts, BD_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+def parse_history_cursor(value):
+    # Cursor format is "<ts>-<id>" taken from the edge row of a page
+    try:
+        ts, row_id = value.split("-", 1)
+        return int(ts), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
 @app.route('/cronjob_history')
 @login_required
 def cronjob_history():
-    page = int(request.args.get('page', 1))
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 10
-    offset = (page - 1) * per_page
+    before = parse_history_cursor(request.args.get('before'))
+    after = parse_history_cursor(request.args.get('after'))
 
     email = session.get("email")
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute("SELECT COUNT(*) FROM cron_history WHERE email = ?", (email,))
-    total_records = cursor.fetchone()[0]
-    total_pages = (total_records + per_page - 1) // per_page
-
-    cursor.execute("SELECT * FROM cron_history WHERE email = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?", (email, per_page, offset))
-    histories = cursor.fetchall()
+    # Row count is kept per user by the cron runner; fall back to an
+    # index-backed count if the counter table has not been created yet.
+    try:
+        cursor.execute("SELECT total FROM cron_history_counts WHERE email = ?", (email,))
+        row = cursor.fetchone()
+        total_records = row[0] if row else 0
+    except sqlite3.OperationalError:
+        cursor.execute("SELECT COUNT(*) FROM cron_history WHERE email = ?", (email,))
+        total_records = cursor.fetchone()[0]
+    total_pages = max((total_records + per_page - 1) // per_page, 1)
+
+    # Keyset pagination over the (email, ts, id) index
+    if before:
+        cursor.execute("""
+            SELECT * FROM cron_history
+            WHERE email = ? AND (ts < ? OR (ts = ? AND id < ?))
+            ORDER BY ts DESC, id DESC LIMIT ?
+        """, (email, before[0], before[0], before[1], per_page))
+        histories = cursor.fetchall()
+    elif after:
+        cursor.execute("""
+            SELECT * FROM cron_history
+            WHERE email = ? AND (ts > ? OR (ts = ? AND id > ?))
+            ORDER BY ts ASC, id ASC LIMIT ?
+        """, (email, after[0], after[0], after[1], per_page))
+        histories = cursor.fetchall()[::-1]
+    else:
+        page = 1
+        cursor.execute("SELECT * FROM cron_history WHERE email = ? ORDER BY ts DESC, id DESC LIMIT ?", (email, per_page))
+        histories = cursor.fetchall()
     conn.close()
 
-    return render_template("Auth/cronjob_history.html", histories=histories, page=page, total_pages=total_pages)
+    prev_cursor = next_cursor = None
+    if histories:
+        if page > 1:
+            prev_cursor = f"{histories[0]['ts']}-{histories[0]['id']}"
+        if len(histories) == per_page and page < total_pages:
+            next_cursor = f"{histories[-1]['ts']}-{histories[-1]['id']}"
+
+    return render_template(
+        "Auth/cronjob_history.html",
+        histories=histories,
+        page=page,
+        total_pages=total_pages,
+        prev_cursor=prev_cursor,
+        next_cursor=next_cursor
+    )
+
+@app.route('/cronjob_history/export')
+@login_required
+def export_cronjob_history():
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in ("csv", "ndjson"):
+        flash("Unsupported export format.", "error")
+        return redirect(url_for("cronjob_history"))
+
+    kind = request.args.get('kind', '').strip().lower()
+    start = to_epoch(request.args.get('from'))
+    end = to_epoch(request.args.get('to'), end_of_day=True)
+    use_gzip = request.args.get('gzip', '') in ("1", "true", "yes")
+
+    # Always scoped to the logged-in customer, never taken from the query string
+    conditions = ["email = ?"]
+    params = [session.get("email")]
+    if kind in ("order", "file", "price", "dhru"):
+        conditions.append("kind = ?")
+        params.append(kind)
+    if start is not None:
+        conditions.append("ts >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("ts <= ?")
+        params.append(end)
+
+    sql = """
+        SELECT id, kind, method, status_code, latency_ms, error_class, ts,
+               datetime(ts, 'unixepoch', '+6 hours') AS time_bd
+        FROM cron_history WHERE """ + " AND ".join(conditions) + " ORDER BY ts DESC, id DESC"
+
+    return history_export.response(get_db_connection, sql, params, fmt, use_gzip, "cronjob_history")
+
+
+def histogram_percentile(buckets, pct):
+    # buckets: sorted list of (upper_bound_ms, count)
+    total = sum(count for _, count in buckets)
+    if not total:
+        return None
+    threshold = total * pct / 100.0
+    running = 0
+    for bound, count in buckets:
+        running += count
+        if running >= threshold:
+            return bound
+    return buckets[-1][0]
+
+def load_user_stats(email):
+    # Served entirely from the aggregates the cron runner maintains:
+    # two indexed lookups per view, whatever the history size.
+    conn = get_db_connection()
+    try:
+        stats = conn.execute("""
+            SELECT * FROM cron_url_stats WHERE email = ? ORDER BY kind, url
+        """, (email,)).fetchall()
+        latency = conn.execute("""
+            SELECT kind, url, bucket_ms, count FROM cron_url_latency
+            WHERE email = ? ORDER BY kind, url, bucket_ms
+        """, (email,)).fetchall()
+    except sqlite3.OperationalError:
+        stats, latency = [], []
+    finally:
+        conn.close()
+
+    buckets = {}
+    for row in latency:
+        buckets.setdefault((row["kind"], row["url"]), []).append((row["bucket_ms"], row["count"]))
+
+    results = []
+    for row in stats:
+        url_buckets = buckets.get((row["kind"], row["url"]), [])
+        results.append({
+            "kind": row["kind"],
+            "url": row["url"],
+            "total": row["total"],
+            "success": row["success"],
+            "success_rate": round(row["success"] * 100.0 / row["total"], 2) if row["total"] else None,
+            "p50_ms": histogram_percentile(url_buckets, 50),
+            "p95_ms": histogram_percentile(url_buckets, 95),
+            "p99_ms": histogram_percentile(url_buckets, 99),
+            "fail_streak": row["fail_streak"],
+            "max_fail_streak": row["max_fail_streak"],
+            "last_status": row["last_status"],
+            "last_error": row["last_error"],
+            "last_run": row["last_run"],
+            "last_failure": row["last_failure"],
+        })
+    return results
+
+@app.route("/stats")
+@login_required
+def stats():
+    return render_template("Auth/stats.html", stats=load_user_stats(session.get("email")))
 
+@app.route("/stats.json")
+@login_required
+def stats_json():
+    return jsonify({"email": session.get("email"), "urls": load_user_stats(session.get("email"))})
 
 @app.route("/profile", methods=["GET", "POST"])
 @login_required
@@ -211,6 +435,7 @@ def profile():
 
         cursor.execute("UPDATE users SET status = ? WHERE id = ?", (new_status, session["user_id"]))
         conn.commit()
+        shared_cache.invalidate("users", "dashboard")
 
         # Refresh user data after update
         cursor.execute("SELECT * FROM users WHERE id = ?", (session["user_id"],))
@@ -254,6 +479,7 @@ def update_password():
     cursor.execute("UPDATE users SET password = ? WHERE id = ?", (hashed_password, session["user_id"]))
     conn.commit()
     conn.close()
+    shared_cache.invalidate("users")
 
     flash("Password updated successfully.", "success")
     return redirect(url_for("profile"))
@@ -312,6 +538,40 @@ def dhru_api_setting():
     conn.close()
     return render_template("Auth/dhru_api_setting.html", dhru_data=dhru_data)
 
+@app.route("/api/dhru/orders", methods=["POST"])
+def dhru_orders():
+    # Called by the customer's site, not a browser session: it registers the
+    # Dhru order IDs it placed (form fields email, api_key, order_ids) so the
+    # runner's Dhru sync can follow them, and gets back their last synced
+    # status (null until the first sync). api_key is the Dhru key saved in
+    # /dhru_fusion_settings.
+    email = request.form.get("email", "").strip()
+    api_key = request.form.get("api_key", "").strip()
+    raw_ids = re.split(r"[\s,]+", request.form.get("order_ids", "").strip())
+    if not email or not api_key:
+        return jsonify({"error": "email and api_key are required"}), 400
+    if not all(value.isdigit() for value in raw_ids if value):
+        return jsonify({"error": "order_ids must be numeric Dhru order IDs"}), 400
+    order_ids = sorted({int(value) for value in raw_ids if value})
+    if len(order_ids) > DHRU_MAX_ORDERS:
+        return jsonify({"error": f"at most {DHRU_MAX_ORDERS} order IDs per call"}), 400
+
+    conn = get_db_connection()
+    settings = conn.execute("""
+        SELECT d.user_id, d.api_key FROM dhru_settings d JOIN users u ON u.id = d.user_id WHERE u.email = ?
+    """, (email,)).fetchone()
+    if not settings or not hmac.compare_digest(settings["api_key"].strip(), api_key):
+        conn.close()
+        return jsonify({"error": "unknown email or api_key"}), 403
+
+    dhru_mirror.ensure_tables(conn, "logs." if LOG_DATABASE != DATABASE else "")
+    registered = dhru_mirror.register(conn, settings["user_id"], order_ids)
+    conn.commit()
+    orders = {str(order_id): {"status": status, "code": code}
+              for order_id, (status, code) in dhru_mirror.statuses(conn, settings["user_id"], order_ids).items()}
+    conn.close()
+    return jsonify({"registered": registered, "orders": orders})
+
 @app.route("/cloudfire_setting")
 @login_required
 def cloudfire_setting():
@@ -325,4 +585,11 @@ def logout():
     return redirect(url_for("home"))
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000)
+    parser = argparse.ArgumentParser(description="User panel")
+    parser.add_argument("--workers", type=int, default=0, help="serve with N worker processes (production)")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    if args.workers:
+        prefork.serve(app, "0.0.0.0", args.port, args.workers)
+    else:
+        app.run(host='0.0.0.0', port=args.port)